@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+MFA extraction micro-benchmark for MFARelay
+Measures prefilter + code extraction throughput over the sample .eml corpus,
+comparing the original per-message pattern loops with the compiled engine.
+
+Usage:
+    python -m benchmarks.bench_extraction --iterations 20000
+"""
+
+import argparse
+import email
+import re
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from src.email.email_monitor import EmailMonitor
+from src.email.mfa_extractor import get_default_extractor
+
+CORPUS_DIR = Path(__file__).parent / 'corpus'
+
+# The original EmailMonitor tables, kept here as the baseline
+LEGACY_PATTERNS = [
+    r'\b(\d{4,8})\b',
+    r'\b([A-Z0-9]{4,8})\b',
+    r'code(?:\s*:?\s*)(\d{4,8})',
+    r'verification(?:\s*:?\s*)(\d{4,8})',
+    r'authenticate(?:\s*:?\s*)(\d{4,8})',
+    r'login(?:\s*:?\s*)(\d{4,8})',
+]
+LEGACY_KEYWORDS = [
+    'verification', 'authenticate', 'login code', 'security code',
+    'two-factor', '2fa', 'mfa', 'access code', 'signin code'
+]
+
+
+def legacy_is_likely(subject: str, sender: str) -> bool:
+    subject_lower = subject.lower()
+    sender_lower = sender.lower()
+    for keyword in LEGACY_KEYWORDS:
+        if keyword in subject_lower:
+            return True
+    mfa_sender_patterns = [
+        'noreply', 'no-reply', 'security', 'auth', 'verify',
+        'google', 'microsoft', 'github', 'aws', 'azure'
+    ]
+    for pattern in mfa_sender_patterns:
+        if pattern in sender_lower:
+            return True
+    return False
+
+
+def legacy_extract(content: str) -> List[str]:
+    contextual = LEGACY_PATTERNS[2:]
+    generic = LEGACY_PATTERNS[:2]
+    for patterns in (contextual, generic):
+        codes = []
+        for pattern in patterns:
+            for match in re.finditer(pattern, content, re.IGNORECASE if patterns is contextual else 0):
+                code = match.group(1)
+                if not any(c.isdigit() for c in code) or code in codes:
+                    continue
+                codes.append(code)
+        if codes:
+            return codes[:1] if patterns is generic else codes
+    return []
+
+
+def load_corpus() -> List[Tuple[str, str, str]]:
+    """Parse the corpus once into (subject, sender, text) tuples."""
+    monitor = EmailMonitor({'name': 'bench', 'host': 'localhost', 'port': 993,
+                            'username': 'bench', 'password': 'bench'})
+    corpus = []
+    for path in sorted(CORPUS_DIR.glob('*.eml')):
+        message = email.message_from_bytes(path.read_bytes())
+        corpus.append((
+            monitor._decode_header(message.get('Subject', '')),
+            monitor._decode_header(message.get('From', '')),
+            monitor._extract_email_content(message),
+        ))
+    return corpus
+
+
+def run(label: str, corpus, is_likely: Callable, extract: Callable, iterations: int) -> List[List[str]]:
+    results = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        results = []
+        for subject, sender, text in corpus:
+            results.append(extract(text) if is_likely(subject, sender) else [])
+    elapsed = time.perf_counter() - started
+    rate = iterations * len(corpus) / elapsed
+    print(f"{label:<10} {rate:>12,.0f} messages/sec")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    extractor = get_default_extractor()
+    print(f"{len(corpus)} messages x {args.iterations} iterations")
+
+    before = run('legacy', corpus, legacy_is_likely, legacy_extract, args.iterations)
+    after = run('compiled', corpus, extractor.is_likely_mfa, extractor.extract_codes, args.iterations)
+    if before != after:
+        print("WARNING: results differ between engines")
+        for (subject, _, _), old, new in zip(corpus, before, after):
+            if old != new:
+                print(f"  {subject!r}: {old} -> {new}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+IMAP engine benchmark for MFARelay
+Compares the native asyncio IMAP engine against the imaplib paths on a fake server.
+
+Usage:
+    python -m benchmarks.bench_imap_engine --mailboxes 200 --messages 2 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+import src.email.email_monitor as email_monitor_module
+from src.email.email_monitor import EmailMonitor
+from src.email.imap_client import ImaplibClient, create_imap_client
+from src.email.sync_state import SyncStateStore
+from benchmarks.fake_imap_server import FakeIMAPServer, make_message
+
+
+class BlockingImaplibClient(ImaplibClient):
+    """imaplib called directly on the event loop, as EmailMonitor originally did."""
+
+    async def _run(self, func, *args):
+        return func(*args)
+
+
+def _client_factory(engine: str):
+    if engine == 'blocking':
+        return lambda _engine, *args, **kwargs: BlockingImaplibClient(*args, **kwargs)
+    return lambda _engine, *args, **kwargs: create_imap_client(engine, *args, **kwargs)
+
+
+async def _loop_lag_probe(stop: asyncio.Event, samples: List[float], interval: float = 0.005):
+    """Record how late the event loop wakes a periodic timer."""
+    loop = asyncio.get_event_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def run_engine(engine: str, server: FakeIMAPServer, mailboxes: int) -> Dict[str, float]:
+    """Connect every mailbox and run one concurrent check with the given engine."""
+    email_monitor_module.create_imap_client = _client_factory(engine)
+    sync_state = SyncStateStore(path=None)
+    monitors = [
+        EmailMonitor({
+            'name': f'bench-{i}', 'host': server.host, 'port': server.port,
+            'username': f'user{i}', 'password': 'secret', 'ssl': False, 'idle': False,
+        }, sync_state=sync_state)
+        for i in range(mailboxes)
+    ]
+    # Start every mailbox from UID 0 so each run processes the seeded messages
+    for monitor in monitors:
+        sync_state.set(monitor.account_key, 1, 0)
+
+    stop = asyncio.Event()
+    lag: List[float] = []
+    probe = asyncio.create_task(_loop_lag_probe(stop, lag))
+
+    started = time.perf_counter()
+    connected = await asyncio.gather(*(m.connect() for m in monitors))
+    connect_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(m.check_for_mfa_codes() for m in monitors))
+    check_time = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    await asyncio.gather(*(m.disconnect() for m in monitors))
+
+    return {
+        'connected': sum(connected),
+        'codes': sum(len(r) for r in results),
+        'connect_s': connect_time,
+        'check_s': check_time,
+        'max_loop_lag_ms': max(lag, default=0.0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mailboxes', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=2, help='MFA messages per mailbox')
+    parser.add_argument('--latency', type=float, default=0.02, help='server RTT per command (s)')
+    parser.add_argument('--engines', default='blocking,imaplib,asyncio')
+    args = parser.parse_args()
+
+    server = FakeIMAPServer(latency=args.latency).start()
+    for i in range(args.mailboxes):
+        for n in range(args.messages):
+            server.deliver(f'user{i}', make_message(
+                'GitHub <noreply@github.com>', 'Your verification code',
+                f'Your verification code: {100000 + n}'
+            ))
+
+    print(f"{args.mailboxes} mailboxes x {args.messages} messages, {args.latency * 1000:.0f} ms latency")
+    print(f"{'engine':<10} {'connected':>9} {'codes':>6} {'connect s':>10} {'check s':>8} {'max lag ms':>11}")
+    try:
+        for engine in args.engines.split(','):
+            result = asyncio.run(run_engine(engine, server, args.mailboxes))
+            print(f"{engine:<10} {result['connected']:>9} {result['codes']:>6} "
+                  f"{result['connect_s']:>10.2f} {result['check_s']:>8.2f} {result['max_loop_lag_ms']:>11.1f}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
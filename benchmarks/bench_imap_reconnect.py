@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+IMAP reconnect benchmark for MFARelay
+Measures EmailMonitor reconnect latency against the fake IMAP server over TLS:
+a full handshake every time, a resumed TLS session, and promotion of a warm
+standby session.
+
+Usage:
+    python -m benchmarks.bench_imap_reconnect --reconnects 50 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from src.email.email_monitor import EmailMonitor
+from src.email.tls import get_session_stats
+from benchmarks.bench_sms_transport import make_tls_contexts
+from benchmarks.fake_imap_server import FakeIMAPServer
+
+
+async def run(label: str, server: FakeIMAPServer, account: Dict[str, Any], reconnects: int):
+    monitor = EmailMonitor(dict(account, name=label))
+    if not await monitor.connect():
+        raise RuntimeError(f"{label}: initial connect failed")
+
+    latencies = []
+    for _ in range(reconnects):
+        await monitor.disconnect(keep_standby=True)
+        if monitor.standby:
+            # Let the background standby session finish opening
+            while monitor._standby_client is None:
+                await asyncio.sleep(0.001)
+        started = time.perf_counter()
+        if not await monitor.connect():
+            raise RuntimeError(f"{label}: reconnect failed")
+        latencies.append(time.perf_counter() - started)
+
+    stats = monitor.get_connection_stats()
+    await monitor.disconnect()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<10} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  "
+          f"tls resumed {stats['tls_resumed']:>4}  standby promotions {stats['standby_promotions']:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reconnects', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake server delay per tagged response')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server_context, _ = make_tls_contexts(Path(workdir))
+        if server_context is None:
+            print("openssl not available, cannot benchmark TLS")
+            return
+        server = FakeIMAPServer(latency=args.latency, capabilities=('IMAP4rev1',),
+                                ssl_context=server_context).start()
+        server.add_mailbox('bench')
+        account = {
+            'host': server.host, 'port': server.port, 'username': 'bench', 'password': 'x',
+            'ssl': True, 'ca_file': str(Path(workdir) / 'cert.pem'), 'idle': False,
+        }
+        try:
+            asyncio.run(run('full', server, dict(account, tls_resumption=False), args.reconnects))
+            asyncio.run(run('resumed', server, account, args.reconnects))
+            asyncio.run(run('standby', server, dict(account, standby=True), args.reconnects))
+        finally:
+            server.stop()
+        print(f"session cache: {get_session_stats()}")
+
+
+if __name__ == '__main__':
+    main()
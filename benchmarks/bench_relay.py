@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+End-to-end relay benchmark for MFARelay
+Drives MFARelay against a fake IMAP server and a stub Twilio server, both in a
+separate fixture process so CPU and memory figures are the relay's own.
+Messages are delivered at a fixed rate across N mailboxes (MFA mail mixed with
+noise) and each code's detection latency is measured from delivery to the SMS
+being accepted by the stub.
+
+Reports latency percentiles, codes/sec, CPU time, RSS and the mean time of the
+hot-path stages. Results can be saved as a baseline and later runs compared
+against it, failing on regressions.
+
+Usage:
+    python -m benchmarks.bench_relay --mailboxes 50 --messages 20 --rate 200
+    python -m benchmarks.bench_relay --save baseline.json
+    python -m benchmarks.bench_relay --compare baseline.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+from src.core.mfa_relay import MFARelay
+from src.email.email_monitor import EmailMonitor
+from src.email.sync_state import SyncStateStore
+from src.sms.twilio_client import TwilioClient
+from src.utils.metrics import REGISTRY
+from benchmarks.fake_imap_server import FakeIMAPServer, make_message
+from benchmarks.stub_twilio_server import StubTwilioServer
+
+# Lower is better for every compared metric
+COMPARED = ('latency_p50_ms', 'latency_p99_ms', 'cpu_ms_per_message', 'process_code_us')
+
+
+def _fixture(pipe, latency: float, idle: bool, twilio_latency: float):
+    """Fixture process: fake IMAP and stub Twilio servers driven over a pipe."""
+    capabilities = ('IMAP4rev1', 'IDLE', 'UIDPLUS') if idle else ('IMAP4rev1', 'UIDPLUS')
+    imap = FakeIMAPServer(latency=latency, capabilities=capabilities).start()
+    twilio = StubTwilioServer(latency=twilio_latency).start()
+    pipe.send((imap.port, twilio.base_url))
+    while True:
+        command, *args = pipe.recv()
+        if command == 'mailboxes':
+            for username in args[0]:
+                imap.add_mailbox(username)
+            pipe.send(None)
+        elif command == 'deliver':
+            username, raw = args
+            delivered_at = time.time()
+            imap.deliver(username, raw)
+            pipe.send(delivered_at)
+        elif command == 'messages':
+            pipe.send([(m['body'], m['received_at']) for m in twilio.messages])
+        elif command == 'stop':
+            break
+    imap.stop()
+    twilio.stop()
+
+
+def _rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _stage_means_ms() -> Dict[str, float]:
+    """Mean duration of instrumented hot-path stages, from the metrics registry."""
+    stages = {
+        'check_for_mfa_codes': 'mfarelay_poll_duration_seconds',
+        'parse': 'mfarelay_parse_seconds',
+        'extract': 'mfarelay_extraction_seconds',
+        'send_sms': 'mfarelay_sms_send_seconds',
+        'queue_wait': 'mfarelay_sms_queue_wait_seconds',
+    }
+    means = {}
+    for label, name in stages.items():
+        metric = REGISTRY._metrics.get(name)
+        children = list(metric._children.values()) if metric else []
+        count = sum(child.count for child in children)
+        if count:
+            means[label] = round(sum(child.sum for child in children) / count * 1000, 3)
+    return means
+
+
+async def _bench_process_code(iterations: int) -> float:
+    """Microseconds per MFARelay._process_mfa_code (dedup, resolve, enqueue)."""
+    async def deliver(item):
+        return True
+
+    relay = MFARelay({'sms_dispatch': {'queue_size': iterations}, 'dedup': {'max_entries': iterations * 2}},
+                     [], None, logging.getLogger('bench'))
+    relay.dispatcher.handler = deliver
+    relay.dispatcher.start()
+    started = time.perf_counter()
+    for i in range(iterations):
+        await relay._process_mfa_code({'code': str(100000 + i), 'sender': 'noreply@github.com',
+                                       'subject': 'Your verification code'}, 'bench')
+    elapsed = time.perf_counter() - started
+    await relay.dispatcher.stop()
+    relay.dedup.close()
+    return elapsed / iterations * 1e6
+
+
+async def run(args, pipe, imap_port: int, twilio_url: str) -> Dict[str, Any]:
+    usernames = [f'user{i}' for i in range(args.mailboxes)]
+    pipe.send(('mailboxes', usernames))
+    pipe.recv()
+
+    sync_state = SyncStateStore(None)
+    monitors = []
+    for username in usernames:
+        monitor = EmailMonitor({
+            'name': username, 'host': '127.0.0.1', 'port': imap_port, 'username': username,
+            'password': 'secret', 'ssl': False, 'idle': args.idle,
+            'check_interval_seconds': args.poll_interval, 'body_fetch': args.body_fetch,
+        }, sync_state=sync_state)
+        await monitor.connect()
+        monitors.append(monitor)
+
+    config = {
+        'email_monitoring': {
+            'max_concurrent_checks': args.concurrency,
+            'adaptive_polling': {'min_interval': args.poll_interval, 'max_interval': args.poll_interval},
+        },
+        'sms_dispatch': {'workers': 4, 'queue_size': 10000},
+        'dedup': {'max_entries': 100000},
+    }
+    twilio_client = TwilioClient('ACbench', 'token', '+15550000000', '+15551111111', base_url=twilio_url)
+    relay = MFARelay(config, monitors, twilio_client, logging.getLogger('bench'))
+    relay_task = asyncio.create_task(relay.start())
+    await asyncio.sleep(0.5)
+
+    # Deliver on a thread so the relay's event loop is not blocked by the pipe
+    loop = asyncio.get_running_loop()
+    delivered: Dict[str, float] = {}
+    total = args.mailboxes * args.messages
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for i in range(total):
+        username = usernames[i % args.mailboxes]
+        # 37 is coprime to 100, so noise is spread evenly instead of front-loaded
+        if i * 37 % 100 < args.noise:
+            raw = make_message('newsletter@example.com', 'Weekly digest', 'Nothing to see here.\n' * 50)
+            code = None
+        else:
+            code = str(100000 + i)
+            html = f"<p>Your code is <b>{code}</b></p>" + '<p>.</p>' * (args.html_size // 8)
+            raw = make_message('noreply@github.com', 'Your verification code',
+                               f"Your verification code: {code}.\n" + 'x' * 1500,
+                               html=html if args.html_size else None, attachment_size=args.attachment_size)
+        delivered_at = await loop.run_in_executor(None, lambda: (pipe.send(('deliver', username, raw)), pipe.recv())[1])
+        if code:
+            delivered[code] = delivered_at
+        next_at = started + (i + 1) / args.rate
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    latencies: List[float] = []
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        messages = await loop.run_in_executor(None, lambda: (pipe.send(('messages',)), pipe.recv())[1])
+        if len(messages) >= len(delivered):
+            break
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    rss = _rss_mb()
+
+    for body, received_at in messages:
+        code = body.rsplit(' ', 1)[-1].strip()
+        if code in delivered:
+            latencies.append(received_at - delivered[code])
+
+    await relay.stop()
+    await asyncio.gather(relay_task, return_exceptions=True)
+    await twilio_client.close()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2) if latencies else None
+
+    return {
+        'mailboxes': args.mailboxes,
+        'messages': total,
+        'codes_expected': len(delivered),
+        'codes_relayed': len(latencies),
+        'mode': 'idle' if args.idle else f'poll {args.poll_interval}s',
+        'body_fetch': args.body_fetch,
+        'latency_p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'latency_p90_ms': percentile(0.90),
+        'latency_p99_ms': percentile(0.99),
+        'latency_max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'messages_per_sec': round(total / elapsed, 1),
+        'cpu_seconds': round(cpu, 3),
+        'cpu_ms_per_message': round(cpu / total * 1000, 3),
+        'rss_mb': round(rss, 1),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'stage_mean_ms': _stage_means_ms(),
+        'process_code_us': round(await _bench_process_code(args.process_code_iterations), 2),
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics that regressed by more than ``tolerance`` (a fraction) against the baseline."""
+    regressions = []
+    for key in ('mode', 'body_fetch', 'mailboxes', 'messages'):
+        if baseline.get(key) != results.get(key):
+            print(f"Warning: baseline {key} {baseline.get(key)!r} differs from this run ({results.get(key)!r})")
+    for key in COMPARED:
+        old, new = baseline.get(key), results.get(key)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mailboxes', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20, help='Messages delivered per mailbox')
+    parser.add_argument('--rate', type=float, default=200, help='Messages delivered per second (all mailboxes)')
+    parser.add_argument('--noise', type=int, default=50, help='Percentage of non-MFA messages')
+    parser.add_argument('--idle', action=argparse.BooleanOptionalAction, default=True,
+                        help='Use IMAP IDLE (--no-idle polls instead)')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Polling interval with --no-idle')
+    parser.add_argument('--body-fetch', choices=('full', 'text_part'), default='full',
+                        help='Download whole messages or only their text part')
+    parser.add_argument('--html-size', type=int, default=0, help='Bytes of branded HTML alternative per MFA mail')
+    parser.add_argument('--attachment-size', type=int, default=0, help='Bytes of inline image per MFA mail')
+    parser.add_argument('--concurrency', type=int, default=10, help='max_concurrent_checks')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake IMAP delay per command (s)')
+    parser.add_argument('--twilio-latency', type=float, default=0.0, help='Stub Twilio delay per request (s)')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for outstanding SMS')
+    parser.add_argument('--process-code-iterations', type=int, default=20000)
+    parser.add_argument('--save', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed regression as a fraction')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger('bench').setLevel(logging.ERROR)
+
+    context = multiprocessing.get_context('spawn')
+    pipe, child_pipe = context.Pipe()
+    fixture = context.Process(target=_fixture, args=(child_pipe, args.latency, args.idle, args.twilio_latency),
+                              daemon=True)
+    fixture.start()
+    imap_port, twilio_url = pipe.recv()
+    try:
+        results = asyncio.run(run(args, pipe, imap_port, twilio_url))
+    finally:
+        pipe.send(('stop',))
+        fixture.join(timeout=5)
+
+    print(json.dumps(results, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
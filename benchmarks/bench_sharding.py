@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Sharding scaling benchmark for MFARelay
+Runs the shard supervisor against fake IMAP servers (each in its own process)
+and measures how long it takes to connect every mailbox and relay every seeded
+MFA code, for an increasing number of worker processes.
+
+Usage:
+    python -m benchmarks.bench_sharding --mailboxes 400 --messages 5 --workers 1,2,4
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import List
+
+from src.core.supervisor import ShardSupervisor
+from src.email.sync_state import SyncStateStore
+from src.sms.twilio_client import TwilioClient
+from benchmarks.fake_imap_server import FakeIMAPServer, make_message
+from benchmarks.stub_twilio_server import StubTwilioServer
+
+
+def _serve_mailboxes(index: int, usernames: List[str], messages: int, port_queue, stop_event):
+    """Fake IMAP server process seeded with MFA mail for each user (unique sender per user, so nothing is deduplicated)."""
+    server = FakeIMAPServer()
+    for username in usernames:
+        for i in range(messages):
+            server.deliver(username, make_message(
+                f'noreply+{username}@github.com', 'Your verification code',
+                f"Hello {username}, your verification code: {100000 + i}.\n" + 'x' * 2000,
+                html=f"<p>Your verification code: <b>{100000 + i}</b></p>" + '<p>filler</p>' * 100
+            ))
+    server.start()
+    port_queue.put((index, server.port))
+    stop_event.wait()
+    server.stop()
+
+
+async def run(workers: int, mailboxes: int, messages: int, ports: List[int], twilio_url: str,
+              twilio: StubTwilioServer) -> float:
+    workdir = tempfile.mkdtemp(prefix='bench-shard-')
+    state_file = os.path.join(workdir, 'state.db')
+    accounts = [
+        {
+            'name': f'bench-{i}', 'host': '127.0.0.1', 'port': ports[i % len(ports)],
+            'username': f'user{i}', 'password': 'secret', 'ssl': False, 'idle': False,
+            'check_interval_seconds': 3600,
+        }
+        for i in range(mailboxes)
+    ]
+    # Start every mailbox from UID 0 so the seeded messages are processed
+    sync_state = SyncStateStore(state_file)
+    for account in accounts:
+        sync_state.set(f"{account['username']}@{account['host']}/INBOX", 1, 0)
+    sync_state.close()
+
+    config = {
+        'email_monitoring': {'state_file': state_file, 'max_concurrent_checks': 20, 'shard_stats_interval': 1},
+        'sms_dispatch': {'workers': 8, 'queue_size': mailboxes * messages},
+        'dedup': {'max_entries': mailboxes * messages * 2},
+        'logging': {'level': 'WARNING'},
+    }
+    logger = logging.getLogger('bench')
+    twilio_client = TwilioClient('ACbench', 'token', '+15550000000', '+15551111111',
+                                 base_url=twilio_url, pool_size=8)
+    supervisor = ShardSupervisor(config, accounts, twilio_client, logger, workers=workers)
+
+    expected = mailboxes * messages
+    sent_before = len(twilio.messages)
+    started = time.perf_counter()
+    task = asyncio.create_task(supervisor.start())
+    while len(twilio.messages) - sent_before < expected:
+        await asyncio.sleep(0.05)
+        if time.perf_counter() - started > 300:
+            print("  timed out")
+            break
+    elapsed = time.perf_counter() - started
+    await supervisor.stop()
+    await asyncio.gather(task, return_exceptions=True)
+    await twilio_client.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mailboxes', type=int, default=400)
+    parser.add_argument('--messages', type=int, default=5, help='MFA messages per mailbox')
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker process counts')
+    parser.add_argument('--servers', type=int, default=4, help='Fake IMAP server processes')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    port_queue, stop_event = context.Queue(), context.Event()
+    servers = []
+    for s in range(args.servers):
+        usernames = [f'user{i}' for i in range(args.mailboxes) if i % args.servers == s]
+        process = context.Process(target=_serve_mailboxes, args=(s, usernames, args.messages, port_queue, stop_event))
+        process.start()
+        servers.append(process)
+    # Account i connects to server i % servers, matching how mailboxes were seeded
+    ports = [port for _, port in sorted(port_queue.get() for _ in servers)]
+    twilio = StubTwilioServer().start()
+
+    print(f"{args.mailboxes} mailboxes x {args.messages} messages, {os.cpu_count()} CPUs, "
+          f"{args.servers} IMAP server processes")
+    try:
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(',')]:
+            elapsed = asyncio.run(run(workers, args.mailboxes, args.messages, ports, twilio.base_url, twilio))
+            baseline = baseline or elapsed
+            rate = args.mailboxes * args.messages / elapsed
+            print(f"workers={workers:<3} {elapsed:7.2f}s  {rate:8.0f} codes/sec  speedup {baseline / elapsed:4.2f}x")
+    finally:
+        stop_event.set()
+        for process in servers:
+            process.join(timeout=5)
+        twilio.stop()
+
+
+if __name__ == '__main__':
+    main()
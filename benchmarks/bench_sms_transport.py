@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+SMS transport benchmark for MFARelay
+Measures per-SMS latency against the stub Twilio server over HTTPS, comparing a
+fresh connection (TCP + TLS handshake) per request with the keep-alive pool.
+
+Usage:
+    python -m benchmarks.bench_sms_transport --requests 200 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import ssl
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from src.sms.http_transport import TwilioMessagesTransport
+from benchmarks.stub_twilio_server import StubTwilioServer
+
+
+def make_tls_contexts(workdir: Path):
+    """Create a self-signed certificate with the openssl CLI; None if unavailable."""
+    cert, key = workdir / 'cert.pem', workdir / 'key.pem'
+    try:
+        subprocess.run(
+            ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+             '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+             '-keyout', str(key), '-out', str(cert)],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(cert, key)
+    client_context = ssl.create_default_context(cafile=str(cert))
+    return server_context, client_context
+
+
+async def run(label: str, base_url: str, client_context: Optional[ssl.SSLContext],
+              requests: int, concurrency: int, keep_alive: bool):
+    transport = TwilioMessagesTransport('ACbench', 'token', base_url=base_url,
+                                        pool_size=concurrency, ssl_context=client_context)
+    transport.pool.keep_alive = keep_alive
+    latencies: List[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            await transport.send_message(f"MFA Code: {i:06d}", '+15550000000', '+15551111111')
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = transport.get_stats()
+    await transport.close()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{label:<12} {requests / elapsed:>8.0f} sms/sec  p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  "
+          f"connections {stats['connections_opened']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.0, help='Stub server processing time per request')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server_context, client_context = make_tls_contexts(Path(workdir))
+        if server_context is None:
+            print("openssl not available, benchmarking over plain HTTP")
+        server = StubTwilioServer(latency=args.latency, ssl_context=server_context).start()
+        try:
+            asyncio.run(run('fresh', server.base_url, client_context, args.requests, args.concurrency, False))
+            asyncio.run(run('keep-alive', server.base_url, client_context, args.requests, args.concurrency, True))
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
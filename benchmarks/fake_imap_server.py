@@ -0,0 +1,541 @@
+"""
+Fake IMAP Server for MFARelay benchmarks
+Scriptable in-process IMAP4rev1 server with per-command latency and IDLE support.
+"""
+
+import asyncio
+import email
+import email.policy
+import re
+import ssl
+import threading
+from dataclasses import dataclass, field
+from email.message import EmailMessage, Message
+from email.utils import format_datetime
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+
+_SECTION_RE = re.compile(r'^BODY(?:\.PEEK)?\[([\d.]+)\](?:<(\d+)\.(\d+)>)?$')
+
+
+@dataclass
+class FakeMessage:
+    """A stored message with its UID and flags."""
+    uid: int
+    raw: bytes
+    flags: Set[str] = field(default_factory=set)
+
+
+class FakeMailbox:
+    """A single-folder mailbox shared by every session logged in as its user."""
+
+    def __init__(self, username: str, uidvalidity: int = 1):
+        self.username = username
+        self.uidvalidity = uidvalidity
+        self.messages: List[FakeMessage] = []
+        self.next_uid = 1
+        self._watchers: Set[asyncio.Queue] = set()
+
+    def append(self, raw: bytes, flags: Optional[Set[str]] = None) -> int:
+        """Append a message and notify IDLE sessions. Must run on the server loop."""
+        message = FakeMessage(uid=self.next_uid, raw=raw, flags=set(flags or ()))
+        self.next_uid += 1
+        self.messages.append(message)
+        for queue in list(self._watchers):
+            queue.put_nowait(len(self.messages))
+        return message.uid
+
+    def reset_flags(self):
+        """Clear all flags so the same messages can be reprocessed."""
+        for message in self.messages:
+            message.flags.clear()
+
+
+def make_message(sender: str, subject: str, body: str, html: Optional[str] = None,
+                 attachment_size: int = 0) -> bytes:
+    """
+    Build an RFC 822 message for seeding mailboxes.
+
+    Args:
+        sender: From header
+        subject: Subject header
+        body: text/plain body
+        html: Optional text/html alternative
+        attachment_size: Size in bytes of a binary attachment to include
+
+    Returns:
+        bytes: Serialized message
+    """
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = 'user@example.com'
+    message['Subject'] = subject
+    message['Date'] = format_datetime(datetime.now(timezone.utc))
+    message['Message-ID'] = f"<{id(message)}.{datetime.now().timestamp()}@example.com>"
+    message.set_content(body)
+    if html:
+        message.add_alternative(html, subtype='html')
+    if attachment_size:
+        message.add_attachment(b'\0' * attachment_size, maintype='application',
+                               subtype='octet-stream', filename='attachment.bin')
+    return message.as_bytes(policy=message.policy.clone(linesep='\r\n'))
+
+
+class FakeIMAPServer:
+    """
+    Asyncio IMAP server running on its own thread and event loop.
+
+    Supports the command subset MFARelay uses: CAPABILITY, LOGIN, SELECT,
+    EXAMINE, SEARCH, FETCH (including BODYSTRUCTURE and partial section
+    fetches), STORE, UID, NOOP, IDLE, CLOSE and LOGOUT.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 capabilities: Tuple[str, ...] = ('IMAP4rev1', 'IDLE', 'UIDPLUS'),
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        """
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            latency: Seconds to delay every tagged response (simulated RTT)
+            capabilities: Advertised capabilities
+            ssl_context: Serve implicit TLS with this server-side context
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.capabilities = capabilities
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self.mailboxes: Dict[str, FakeMailbox] = {}
+        self.command_count = 0
+        self.bytes_sent = 0
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Lifecycle and scripting
+    # ------------------------------------------------------------------
+
+    def start(self) -> 'FakeIMAPServer':
+        """Start serving on a background thread."""
+        self._thread = threading.Thread(target=self._run, name='fake-imap', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        """Stop the server thread."""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, limit=2 ** 24, ssl=self.ssl_context)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            self.loop.close()
+
+    def add_mailbox(self, username: str) -> FakeMailbox:
+        """Create (or return) the mailbox for a user."""
+        return self.mailboxes.setdefault(username, FakeMailbox(username))
+
+    def deliver(self, username: str, raw: bytes) -> int:
+        """Thread-safe delivery of a message; returns the new UID."""
+        mailbox = self.add_mailbox(username)
+        if self.loop is None or threading.current_thread() is self._thread:
+            return mailbox.append(raw)
+        future = asyncio.run_coroutine_threadsafe(self._deliver(mailbox, raw), self.loop)
+        return future.result()
+
+    async def _deliver(self, mailbox: FakeMailbox, raw: bytes) -> int:
+        return mailbox.append(raw)
+
+    def reset_flags(self):
+        """Mark every message unseen again."""
+        for mailbox in self.mailboxes.values():
+            mailbox.reset_flags()
+
+    # ------------------------------------------------------------------
+    # Protocol
+    # ------------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        session = _Session(self, reader, writer)
+        try:
+            await session.run()
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            session.close()
+
+
+class _Session:
+    """Per-connection protocol state."""
+
+    def __init__(self, server: FakeIMAPServer, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.mailbox: Optional[FakeMailbox] = None
+        self.selected = False
+        self.idle_queue: Optional[asyncio.Queue] = None
+
+    def close(self):
+        if self.mailbox and self.idle_queue:
+            self.mailbox._watchers.discard(self.idle_queue)
+        self.writer.close()
+
+    def send(self, data: bytes):
+        self.server.bytes_sent += len(data)
+        self.writer.write(data)
+
+    async def run(self):
+        self.send(b'* OK [CAPABILITY ' + ' '.join(self.server.capabilities).encode() + b'] Fake IMAP ready\r\n')
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            args = await self._read_arguments(line)
+            if len(args) < 2:
+                self.send(b'* BAD missing command\r\n')
+                continue
+            tag, command = args[0], args[1].upper()
+            self.server.command_count += 1
+            if self.server.latency:
+                await asyncio.sleep(self.server.latency)
+            handler = getattr(self, f"cmd_{command.decode().lower()}", None)
+            if handler is None:
+                self.send(tag + b' BAD unknown command\r\n')
+            else:
+                keep_going = await handler(tag, args[2:])
+                if keep_going is False:
+                    await self.writer.drain()
+                    return
+            await self.writer.drain()
+
+    async def _read_arguments(self, line: bytes) -> List[bytes]:
+        """Tokenize a command line, accepting synchronizing literals."""
+        tokens: List[bytes] = []
+        while True:
+            literal = re.search(rb'\{(\d+)\}\r\n$', line)
+            text = line[:literal.start()] if literal else line.rstrip(b'\r\n')
+            tokens.extend(_tokenize(text))
+            if not literal:
+                return tokens
+            self.send(b'+ go ahead\r\n')
+            await self.writer.drain()
+            tokens.append(await self.reader.readexactly(int(literal.group(1))))
+            line = await self.reader.readline()
+
+    # -- commands ------------------------------------------------------
+
+    async def cmd_capability(self, tag, args):
+        self.send(b'* CAPABILITY ' + ' '.join(self.server.capabilities).encode() + b'\r\n')
+        self.send(tag + b' OK CAPABILITY completed\r\n')
+
+    async def cmd_login(self, tag, args):
+        self.mailbox = self.server.add_mailbox(args[0].decode())
+        self.send(tag + b' OK LOGIN completed\r\n')
+
+    async def cmd_select(self, tag, args):
+        if not self.mailbox:
+            self.send(tag + b' NO not authenticated\r\n')
+            return
+        self.selected = True
+        mailbox = self.mailbox
+        unseen = sum(1 for m in mailbox.messages if '\\Seen' not in m.flags)
+        self.send(b'* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)\r\n')
+        self.send(f'* {len(mailbox.messages)} EXISTS\r\n* 0 RECENT\r\n'.encode())
+        self.send(f'* OK [UNSEEN {unseen}] unseen\r\n'.encode())
+        self.send(f'* OK [UIDVALIDITY {mailbox.uidvalidity}] UIDs valid\r\n'.encode())
+        self.send(f'* OK [UIDNEXT {mailbox.next_uid}] next UID\r\n'.encode())
+        self.send(tag + b' OK [READ-WRITE] SELECT completed\r\n')
+
+    cmd_examine = cmd_select
+
+    async def cmd_noop(self, tag, args):
+        self.send(tag + b' OK NOOP completed\r\n')
+
+    async def cmd_close(self, tag, args):
+        self.selected = False
+        self.send(tag + b' OK CLOSE completed\r\n')
+
+    async def cmd_logout(self, tag, args):
+        self.send(b'* BYE logging out\r\n' + tag + b' OK LOGOUT completed\r\n')
+        return False
+
+    async def cmd_search(self, tag, args, use_uid=False):
+        matches = self._search(args)
+        values = [m.uid if use_uid else seq for seq, m in matches]
+        self.send(b'* SEARCH' + b''.join(b' %d' % v for v in values) + b'\r\n')
+        self.send(tag + b' OK SEARCH completed\r\n')
+
+    async def cmd_fetch(self, tag, args, use_uid=False):
+        for seq, message in self._resolve_set(args[0], use_uid):
+            items = _parse_fetch_items(args[1:])
+            if use_uid and 'UID' not in items:
+                items.insert(0, 'UID')
+            self.send(self._fetch_response(seq, message, items))
+        self.send(tag + b' OK FETCH completed\r\n')
+
+    async def cmd_store(self, tag, args, use_uid=False):
+        mode = args[1].upper()
+        flags = {f.decode() for f in _tokenize(args[2].strip(b'()'))} if len(args) > 2 else set()
+        for seq, message in self._resolve_set(args[0], use_uid):
+            if mode.startswith(b'+'):
+                message.flags |= flags
+            elif mode.startswith(b'-'):
+                message.flags -= flags
+            else:
+                message.flags = set(flags)
+            if not mode.endswith(b'.SILENT'):
+                flag_text = ' '.join(sorted(message.flags)).encode()
+                uid_text = b'UID %d ' % message.uid if use_uid else b''
+                self.send(b'* %d FETCH (%sFLAGS (%s))\r\n' % (seq, uid_text, flag_text))
+        self.send(tag + b' OK STORE completed\r\n')
+
+    async def cmd_uid(self, tag, args):
+        command = args[0].upper()
+        handler = {b'FETCH': self.cmd_fetch, b'SEARCH': self.cmd_search,
+                   b'STORE': self.cmd_store}.get(command)
+        if handler is None:
+            self.send(tag + b' BAD unsupported UID command\r\n')
+            return
+        await handler(tag, args[1:], use_uid=True)
+
+    async def cmd_idle(self, tag, args):
+        if 'IDLE' not in self.server.capabilities:
+            self.send(tag + b' BAD IDLE not supported\r\n')
+            return
+        self.idle_queue = asyncio.Queue()
+        self.mailbox._watchers.add(self.idle_queue)
+        self.send(b'+ idling\r\n')
+        await self.writer.drain()
+
+        done = asyncio.ensure_future(self.reader.readline())
+        try:
+            while True:
+                notify = asyncio.ensure_future(self.idle_queue.get())
+                finished, _ = await asyncio.wait({done, notify}, return_when=asyncio.FIRST_COMPLETED)
+                if notify in finished:
+                    self.send(b'* %d EXISTS\r\n' % notify.result())
+                    await self.writer.drain()
+                else:
+                    notify.cancel()
+                if done in finished:
+                    break
+        finally:
+            self.mailbox._watchers.discard(self.idle_queue)
+            self.idle_queue = None
+        if done.result().strip().upper() != b'DONE':
+            self.send(tag + b' BAD expected DONE\r\n')
+            return
+        self.send(tag + b' OK IDLE terminated\r\n')
+
+    # -- helpers -------------------------------------------------------
+
+    def _search(self, args: List[bytes]) -> List[Tuple[int, FakeMessage]]:
+        criteria = b' '.join(args).upper()
+        results = []
+        uid_range = re.search(rb'UID (\S+)', criteria)
+        allowed = None
+        if uid_range:
+            allowed = {m.uid for _, m in self._resolve_set(uid_range.group(1), True)}
+        for seq, message in enumerate(self.mailbox.messages, start=1):
+            if b'UNSEEN' in criteria and '\\Seen' in message.flags:
+                continue
+            if allowed is not None and message.uid not in allowed:
+                continue
+            results.append((seq, message))
+        return results
+
+    def _resolve_set(self, message_set: bytes, use_uid: bool) -> List[Tuple[int, FakeMessage]]:
+        messages = self.mailbox.messages
+        if not messages:
+            return []
+        highest = messages[-1].uid if use_uid else len(messages)
+        wanted: Set[int] = set()
+        for part in message_set.decode().split(','):
+            if ':' in part:
+                start, end = part.split(':')
+                start = highest if start == '*' else int(start)
+                end = highest if end == '*' else int(end)
+                low, high = min(start, end), max(start, end)
+                wanted.update(range(low, high + 1))
+            else:
+                wanted.add(highest if part == '*' else int(part))
+        return [(seq, m) for seq, m in enumerate(messages, start=1)
+                if (m.uid if use_uid else seq) in wanted]
+
+    def _fetch_response(self, seq: int, message: FakeMessage, items: List[str]) -> bytes:
+        out = b'* %d FETCH (' % seq
+        pieces: List[bytes] = []
+        for item in items:
+            name = item.upper()
+            if name == 'UID':
+                pieces.append(b'UID %d' % message.uid)
+            elif name == 'FLAGS':
+                pieces.append(b'FLAGS (' + ' '.join(sorted(message.flags)).encode() + b')')
+            elif name == 'RFC822.SIZE':
+                pieces.append(b'RFC822.SIZE %d' % len(message.raw))
+            elif name.startswith(('BODY[HEADER.FIELDS', 'BODY.PEEK[HEADER.FIELDS')):
+                fields = re.search(r'\((.*)\)', name).group(1).split()
+                headers = _header_fields(message.raw, fields)
+                label = b'BODY[HEADER.FIELDS (' + ' '.join(fields).encode() + b')]'
+                pieces.append(label + b' {%d}\r\n' % len(headers) + headers)
+            elif name == 'BODYSTRUCTURE':
+                parsed = email.message_from_bytes(message.raw, policy=email.policy.compat32)
+                pieces.append(b'BODYSTRUCTURE ' + _bodystructure(parsed))
+            elif _SECTION_RE.match(name):
+                section, offset, length = _SECTION_RE.match(name).groups()
+                data = _section_bytes(message.raw, section)
+                label = b'BODY[' + section.encode() + b']'
+                if offset is not None:
+                    data = data[int(offset):int(offset) + int(length)]
+                    label += b'<' + offset.encode() + b'>'
+                pieces.append(label + b' {%d}\r\n' % len(data) + data)
+            elif name in ('RFC822', 'BODY[]', 'BODY.PEEK[]'):
+                if not name.startswith('BODY.PEEK'):
+                    message.flags.add('\\Seen')
+                label = b'RFC822' if name == 'RFC822' else b'BODY[]'
+                pieces.append(label + b' {%d}\r\n' % len(message.raw) + message.raw)
+        return out + b' '.join(pieces) + b')\r\n'
+
+
+def _quote(value: Optional[str]) -> bytes:
+    if value is None:
+        return b'NIL'
+    return b'"' + str(value).replace('\\', '\\\\').replace('"', '\\"').encode() + b'"'
+
+
+def _bodystructure(part: Message) -> bytes:
+    """BODYSTRUCTURE of a parsed message (the fields MFARelay reads, NIL for the rest)."""
+    if part.is_multipart():
+        children = b''.join(_bodystructure(child) for child in part.get_payload())
+        return b'(' + children + b' ' + _quote(part.get_content_subtype()) + b')'
+    params = part.get_params() or []
+    params = [(k, v) for k, v in params[1:]] if params else []
+    param_list = (b'(' + b' '.join(_quote(k) + b' ' + _quote(v) for k, v in params) + b')'
+                  if params else b'NIL')
+    body = _section_body(part)
+    fields = [_quote(part.get_content_maintype()), _quote(part.get_content_subtype()), param_list,
+              b'NIL', b'NIL', _quote(part.get('Content-Transfer-Encoding', '7bit')), b'%d' % len(body)]
+    if part.get_content_maintype() == 'text':
+        fields.append(b'%d' % body.count(b'\n'))
+    disposition = part.get_content_disposition()
+    fields += [b'NIL', b'(' + _quote(disposition) + b' NIL)' if disposition else b'NIL']
+    return b'(' + b' '.join(fields) + b')'
+
+
+def _section_body(part: Message) -> bytes:
+    payload = part.get_payload()
+    if isinstance(payload, str):
+        return payload.encode('ascii', 'surrogateescape')
+    return part.as_bytes()
+
+
+def _section_bytes(raw: bytes, section: str) -> bytes:
+    """Transfer-encoded body of a part addressed like "1.2"."""
+    part = email.message_from_bytes(raw, policy=email.policy.compat32)
+    for number in section.split('.'):
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+    return _section_body(part)
+
+
+def _header_fields(raw: bytes, fields: List[str]) -> bytes:
+    """Return the requested header lines (unfolded continuation kept) plus the blank line."""
+    header_block = raw.split(b'\r\n\r\n', 1)[0]
+    wanted = {f.upper().encode() for f in fields}
+    lines: List[bytes] = []
+    keep = False
+    for line in header_block.split(b'\r\n'):
+        if line[:1] in (b' ', b'\t'):
+            if keep:
+                lines.append(line)
+            continue
+        keep = line.split(b':', 1)[0].strip().upper() in wanted
+        if keep:
+            lines.append(line)
+    return b''.join(line + b'\r\n' for line in lines) + b'\r\n'
+
+
+def _tokenize(text: bytes) -> List[bytes]:
+    """Split a command line into atoms, quoted strings and parenthesized groups."""
+    tokens: List[bytes] = []
+    i = 0
+    while i < len(text):
+        char = text[i:i + 1]
+        if char == b' ':
+            i += 1
+        elif char == b'"':
+            j = i + 1
+            value = b''
+            while j < len(text) and text[j:j + 1] != b'"':
+                if text[j:j + 1] == b'\\':
+                    j += 1
+                value += text[j:j + 1]
+                j += 1
+            tokens.append(value)
+            i = j + 1
+        elif char in (b'(', b'['):
+            depth, j = 0, i
+            while j < len(text):
+                c = text[j:j + 1]
+                if c in (b'(', b'['):
+                    depth += 1
+                elif c in (b')', b']'):
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            # Keep trailing section text like BODY.PEEK[...]<0.100> attached
+            while j + 1 < len(text) and text[j + 1:j + 2] not in (b' ',):
+                j += 1
+            tokens.append(text[i:j + 1])
+            i = j + 1
+        else:
+            j = i
+            depth = 0
+            while j < len(text):
+                c = text[j:j + 1]
+                if c == b'[':
+                    depth += 1
+                elif c == b']':
+                    depth -= 1
+                elif c == b' ' and depth == 0:
+                    break
+                j += 1
+            tokens.append(text[i:j])
+            i = j
+    return tokens
+
+
+def _parse_fetch_items(args: List[bytes]) -> List[str]:
+    """Expand FETCH item arguments, including macros and parenthesized lists."""
+    text = b' '.join(args).decode()
+    if text.startswith('(') and text.endswith(')'):
+        text = text[1:-1]
+    macros = {'ALL': ['FLAGS', 'RFC822.SIZE'], 'FAST': ['FLAGS', 'RFC822.SIZE'],
+              'FULL': ['FLAGS', 'RFC822.SIZE']}
+    items: List[str] = []
+    for token in _tokenize(text.encode()):
+        token = token.decode()
+        items.extend(macros.get(token.upper(), [token]))
+    return items
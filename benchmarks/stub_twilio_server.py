@@ -0,0 +1,166 @@
+"""
+Stub Twilio API Server for MFARelay benchmarks
+In-process HTTP/1.1 server implementing the Twilio endpoints MFARelay calls, with keep-alive.
+"""
+
+import asyncio
+import json
+import ssl
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubTwilioServer:
+    """
+    Asyncio HTTP server on its own thread and event loop.
+
+    Serves Messages.json (POST), the account resource and Usage/Records.json.
+    Every created message is recorded in ``messages``; ``connections`` counts
+    accepted TCP connections, so tests can check keep-alive reuse.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 ssl_context: Optional[ssl.SSLContext] = None, fail_status: Optional[int] = None):
+        """
+        Args:
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            latency: Seconds to delay every response (simulated provider time)
+            ssl_context: Serve HTTPS with this server-side context
+            fail_status: Answer every request with this HTTP error status
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.ssl_context = ssl_context
+        self.fail_status = fail_status
+
+        self.messages: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.requests = 0
+        self._writers = set()
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        scheme = 'https' if self.ssl_context else 'http'
+        return f"{scheme}://{self.host}:{self.port}"
+
+    def start(self) -> 'StubTwilioServer':
+        """Start serving on a background thread."""
+        self._thread = threading.Thread(target=self._run, name='stub-twilio', daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        """Stop the server thread."""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, ssl=self.ssl_context)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            # Closing the sockets lets every handler finish on its own
+            for writer in list(self._writers):
+                writer.close()
+            pending = asyncio.all_tasks(self.loop)
+            if pending:
+                self.loop.run_until_complete(asyncio.wait(pending, timeout=1))
+            self.loop.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+
+                status, payload = self._route(method, target, body)
+                data = json.dumps(payload).encode('utf-8')
+                close = headers.get('connection', '').lower() == 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode('latin-1') + data
+                )
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+        return method, target, headers, body
+
+    def _route(self, method: str, target: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if self.fail_status:
+            return self.fail_status, {'code': 20500, 'message': 'Stub failure', 'status': self.fail_status}
+
+        parts = urlsplit(target)
+        path = parts.path
+        if method == 'POST' and path.endswith('/Messages.json'):
+            form = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+            if not form.get('To') or not form.get('Body'):
+                return 400, {'code': 21604, 'message': "A 'To' phone number is required.", 'status': 400}
+            message = {
+                'sid': 'SM' + uuid.uuid4().hex,
+                'body': form['Body'],
+                'from': form.get('From'),
+                'to': form['To'],
+                'status': 'queued',
+                'date_created': time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime()),
+                'received_at': time.time(),
+            }
+            self.messages.append(message)
+            return 201, message
+        if method == 'GET' and path.endswith('/Usage/Records.json'):
+            return 200, {'usage_records': [
+                {'category': 'sms', 'count': str(len(self.messages)),
+                 'price': f"{0.0079 * len(self.messages):.4f}", 'price_unit': 'usd'}
+            ]}
+        if method == 'GET' and path.endswith('.json') and '/Accounts/' in path:
+            sid = path.rsplit('/', 1)[1][:-len('.json')]
+            return 200, {'sid': sid, 'friendly_name': 'Stub Account', 'status': 'active', 'type': 'Full'}
+        return 404, {'code': 20404, 'message': 'The requested resource was not found', 'status': 404}
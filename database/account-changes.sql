@@ -0,0 +1,50 @@
+-- Account change feed for the relay's database account source
+-- Run this script in Supabase SQL Editor before setting `account_source.type: database`
+
+-- ============================================================================
+-- MFA EMAIL ACCOUNT CHANGES
+-- ============================================================================
+
+-- The relay follows mfa_email_accounts by polling updated_at, so every update
+-- must move it forward, whoever makes it
+CREATE OR REPLACE FUNCTION touch_mfa_email_account()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mfa_email_accounts_touch ON mfa_email_accounts;
+CREATE TRIGGER mfa_email_accounts_touch
+    BEFORE UPDATE ON mfa_email_accounts
+    FOR EACH ROW EXECUTE FUNCTION touch_mfa_email_account();
+
+-- Keyset paging over (updated_at, id) for the change poll
+CREATE INDEX IF NOT EXISTS idx_mfa_email_accounts_updated ON mfa_email_accounts(updated_at, id);
+
+-- Deleted rows leave no updated_at behind; record them here instead
+CREATE TABLE IF NOT EXISTS mfa_email_account_deletions (
+    account_id TEXT NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_mfa_email_account_deletions_deleted ON mfa_email_account_deletions(deleted_at);
+
+CREATE OR REPLACE FUNCTION record_mfa_email_account_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO mfa_email_account_deletions (account_id) VALUES (OLD.id::TEXT);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+DROP TRIGGER IF EXISTS mfa_email_accounts_deleted ON mfa_email_accounts;
+CREATE TRIGGER mfa_email_accounts_deleted
+    AFTER DELETE ON mfa_email_accounts
+    FOR EACH ROW EXECUTE FUNCTION record_mfa_email_account_deletion();
+
+-- Only the relay (service role) reads deletions; no policies for authenticated users.
+-- Old rows can be pruned once every relay has polled past them, e.g.:
+--   DELETE FROM mfa_email_account_deletions WHERE deleted_at < NOW() - INTERVAL '7 days';
+ALTER TABLE mfa_email_account_deletions ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,24 @@
+-- Account leases for multi-node relay deployments
+-- Run this script in Supabase SQL Editor before enabling `leases` with a postgresql:// URL
+
+-- ============================================================================
+-- MFA ACCOUNT LEASES
+-- ============================================================================
+
+-- One row per monitored account while a relay node owns it. A node renews its
+-- leases every heartbeat; rows whose lease_expires_at has passed are orphaned
+-- and can be claimed by any node.
+CREATE TABLE IF NOT EXISTS mfa_account_leases (
+    -- mfa_email_accounts.id, or the relay's own account id for config-file accounts
+    account_id TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL, -- relay node identity (leases.node_id)
+    lease_expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    acquired_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    renewed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_mfa_account_leases_owner ON mfa_account_leases(owner_id);
+CREATE INDEX IF NOT EXISTS idx_mfa_account_leases_expires ON mfa_account_leases(lease_expires_at);
+
+-- Only the relay (service role) touches leases; no policies for authenticated users
+ALTER TABLE mfa_account_leases ENABLE ROW LEVEL SECURITY;
@@ -70,6 +70,32 @@ class ConfigManager:
             self.logger.error(f"Error loading configuration: {e}")
             return False
     
+    async def reload_config(self) -> bool:
+        """
+        Re-read the configuration file for a hot reload.
+        
+        Returns:
+            bool: True if the new configuration is in effect; on failure the
+            previous configuration is kept
+        """
+        previous = self.config
+        if await self.load_config():
+            return True
+        self.config = previous
+        return False
+    
+    def get_mtime(self) -> Optional[float]:
+        """
+        Get the configuration file's modification time.
+        
+        Returns:
+            Optional[float]: mtime, or None if the file is missing
+        """
+        try:
+            return self.config_path.stat().st_mtime
+        except OSError:
+            return None
+    
     def get_config(self) -> Dict[str, Any]:
         """
         Get the complete configuration dictionary.
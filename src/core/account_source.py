@@ -0,0 +1,298 @@
+"""
+Account Source for MFARelay
+Loads email accounts from the mfa_email_accounts table and follows changes to it.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.utils.db import Database
+
+# IMAP servers for accounts added without manual IMAP settings
+PROVIDER_HOSTS = {
+    'gmail': 'imap.gmail.com',
+    'outlook': 'outlook.office365.com',
+    'yahoo': 'imap.mail.yahoo.com',
+    'icloud': 'imap.mail.me.com',
+}
+
+# Selected for every account; credentials are only read on connect (see password())
+_ACCOUNT_COLUMNS = (
+    'id, user_id, project_id, name, email_address, provider, imap_host, imap_port, use_ssl, '
+    'folder_name, check_interval_seconds, is_active, app_password_encrypted IS NOT NULL, updated_at'
+)
+
+# Local stand-in for the Supabase tables (see database/account-changes.sql for PostgreSQL)
+_SQLITE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS mfa_email_accounts (
+        id TEXT PRIMARY KEY,
+        project_id TEXT,
+        user_id TEXT,
+        name TEXT NOT NULL,
+        email_address TEXT NOT NULL,
+        provider TEXT NOT NULL DEFAULT 'imap',
+        oauth_token_encrypted TEXT,
+        app_password_encrypted TEXT,
+        imap_host TEXT,
+        imap_port INTEGER,
+        use_ssl BOOLEAN DEFAULT 1,
+        folder_name TEXT DEFAULT 'INBOX',
+        is_active BOOLEAN DEFAULT 1,
+        check_interval_seconds INTEGER DEFAULT 30,
+        created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+        updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_mfa_email_accounts_updated
+        ON mfa_email_accounts(updated_at, id)
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mfa_email_accounts_touch AFTER UPDATE ON mfa_email_accounts
+    WHEN NEW.updated_at = OLD.updated_at
+    BEGIN
+        UPDATE mfa_email_accounts SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+    END
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS mfa_email_account_deletions (
+        account_id TEXT NOT NULL,
+        deleted_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS mfa_email_accounts_deleted AFTER DELETE ON mfa_email_accounts
+    BEGIN
+        INSERT INTO mfa_email_account_deletions (account_id) VALUES (OLD.id);
+    END
+    """,
+)
+
+
+class DatabaseAccountSource:
+    """
+    Email accounts stored per tenant in the database.
+
+    Accounts are bulk-loaded in keyset pages, then followed by polling
+    ``updated_at`` (and a deletions table fed by a trigger), so a change
+    costs one small query instead of a reload. Account configs carry no
+    credentials: each password is read and decrypted when its monitor first
+    connects, so a node only ever holds secrets for accounts it monitors;
+    ``credential_version`` in each config changes whenever the row does.
+    """
+
+    def __init__(self, db: Database, page_size: int = 1000, project_id: Optional[str] = None,
+                 encryption_key: Optional[str] = None, lookback: float = 5.0,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Initialize the account source.
+
+        Args:
+            db: Database holding mfa_email_accounts
+            page_size: Rows per query when loading or reading changes
+            project_id: Only load accounts of this project (all projects if unset)
+            encryption_key: Fernet key the stored app passwords are encrypted with
+                (stored as plain text if unset)
+            lookback: Seconds of already-seen history re-read by each change poll,
+                to catch transactions that committed with an earlier updated_at
+            logger: Logger instance
+        """
+        self.db = db
+        self.page_size = page_size
+        self.project_id = project_id
+        self.lookback = timedelta(seconds=lookback)
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._fernet = None
+        if encryption_key:
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(encryption_key.encode() if isinstance(encryption_key, str) else encryption_key)
+
+        # Version (updated_at) of every account handed out, to skip re-read rows
+        self._versions: Dict[str, Any] = {}
+        self._updated_cursor: Any = None
+        self._deleted_cursor: Any = None
+        self.credential_loads = 0
+
+        if db.dialect == 'sqlite':
+            for statement in _SQLITE_SCHEMA:
+                db.execute(statement)
+
+    def _scope(self) -> Tuple[str, List[Any]]:
+        if self.project_id:
+            return "project_id = ?", [self.project_id]
+        return "1 = 1", []
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        Load every active account, page by page.
+
+        Returns:
+            List[Dict[str, Any]]: Account configs (without passwords)
+        """
+        # Changes made while loading are picked up by the first changes() call
+        self._updated_cursor = self.db.fetchone("SELECT MAX(updated_at) FROM mfa_email_accounts")[0]
+        self._deleted_cursor = self.db.fetchone("SELECT MAX(deleted_at) FROM mfa_email_account_deletions")[0]
+
+        where, params = self._scope()
+        accounts: List[Dict[str, Any]] = []
+        after: List[Any] = []
+        while True:
+            rows = self.db.fetchall(
+                f"SELECT {_ACCOUNT_COLUMNS} FROM mfa_email_accounts WHERE {where} AND is_active "
+                f"AND app_password_encrypted IS NOT NULL{' AND id > ?' if after else ''} ORDER BY id LIMIT ?",
+                params + after + [self.page_size]
+            )
+            for row in rows:
+                account = self._account_config(row)
+                if account:
+                    self._versions[account['id']] = row[-1]
+                    accounts.append(account)
+            if len(rows) < self.page_size:
+                break
+            after = [rows[-1][0]]
+        self.logger.info(f"Loaded {len(accounts)} email accounts from the database")
+        return accounts
+
+    def changes(self) -> Tuple[List[Dict[str, Any]], Set[str]]:
+        """
+        Read account changes since the previous call (or load()).
+
+        Returns:
+            (added or changed account configs, ids of removed or deactivated accounts)
+        """
+        upserts: Dict[str, Dict[str, Any]] = {}
+        removed: Set[str] = set()
+        where, params = self._scope()
+
+        # Keyset pages over (updated_at, id), starting a lookback window before the cursor
+        keyset = ("updated_at > ?", [self._since(self._updated_cursor)])
+        while True:
+            rows = self.db.fetchall(
+                f"SELECT {_ACCOUNT_COLUMNS} FROM mfa_email_accounts WHERE {where} AND {keyset[0]} "
+                f"ORDER BY updated_at, id LIMIT ?",
+                params + keyset[1] + [self.page_size]
+            )
+            for row in rows:
+                key, active, has_password, updated_at = str(row[0]), row[11], row[12], row[-1]
+                if self._versions.get(key) == updated_at:
+                    continue
+                account = self._account_config(row) if active and has_password else None
+                if account:
+                    self._versions[key] = updated_at
+                    upserts[key] = account
+                    removed.discard(key)
+                elif self._versions.pop(key, None) is not None:
+                    upserts.pop(key, None)
+                    removed.add(key)
+                if self._updated_cursor is None or updated_at > self._updated_cursor:
+                    self._updated_cursor = updated_at
+            if len(rows) < self.page_size:
+                break
+            keyset = ("(updated_at, id) > (?, ?)", [rows[-1][-1], rows[-1][0]])
+
+        # Hard deletes, recorded by the deletion trigger
+        for account_key, deleted_at in self.db.fetchall(
+            "SELECT account_id, deleted_at FROM mfa_email_account_deletions WHERE deleted_at > ?",
+            [self._since(self._deleted_cursor)]
+        ):
+            account_key = str(account_key)
+            if self._versions.pop(account_key, None) is not None:
+                upserts.pop(account_key, None)
+                removed.add(account_key)
+            if self._deleted_cursor is None or deleted_at > self._deleted_cursor:
+                self._deleted_cursor = deleted_at
+
+        return list(upserts.values()), removed
+
+    def _since(self, cursor: Any) -> Any:
+        """Lower bound for a change query: the cursor moved back by the lookback window."""
+        if cursor is None:
+            return '' if self.db.dialect == 'sqlite' else datetime(1970, 1, 1, tzinfo=timezone.utc)
+        if isinstance(cursor, datetime):
+            return cursor - self.lookback
+        # SQLite stores timestamps as text
+        moved = datetime.fromisoformat(str(cursor)) - self.lookback
+        return moved.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+    def _account_config(self, row: Tuple) -> Optional[Dict[str, Any]]:
+        """Relay account config for a row (None if it has no usable IMAP server)."""
+        (key, user_id, project_id, name, email_address, provider, imap_host, imap_port,
+         use_ssl, folder, check_interval, _active, _has_password, updated_at) = row
+        host = imap_host or PROVIDER_HOSTS.get((provider or '').lower())
+        if not host:
+            self.logger.warning(f"Skipping account {name}: no IMAP host for provider {provider!r}")
+            return None
+        account = {
+            'id': str(key),
+            'user_id': str(user_id) if user_id is not None else None,
+            'project_id': str(project_id) if project_id is not None else None,
+            'name': name,
+            'username': email_address,
+            'host': host,
+            'port': int(imap_port or 993),
+            'ssl': bool(use_ssl) if use_ssl is not None else True,
+            'folder': folder or 'INBOX',
+            # Any row update (e.g. a rotated password) changes the config, so
+            # the account is restarted and reads its credentials again
+            'credential_version': str(updated_at),
+        }
+        if check_interval:
+            account['check_interval_seconds'] = int(check_interval)
+        return account
+
+    def get_password(self, account_id: str) -> str:
+        """
+        Read and decrypt one account's app password.
+
+        Raises:
+            KeyError: If the account no longer exists
+        """
+        row = self.db.fetchone(
+            "SELECT app_password_encrypted FROM mfa_email_accounts WHERE id = ?", [account_id]
+        )
+        if row is None or row[0] is None:
+            raise KeyError(f"No credentials stored for account {account_id}")
+        self.credential_loads += 1
+        if self._fernet is None:
+            return row[0]
+        return self._fernet.decrypt(row[0].encode()).decode()
+
+    async def password(self, account_config: Dict[str, Any]) -> str:
+        """Credential callback for EmailMonitor: the account's password, read on demand."""
+        return await asyncio.to_thread(self.get_password, account_config['id'])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get source statistics.
+
+        Returns:
+            Dict[str, Any]: Tracked accounts and credential reads
+        """
+        return {
+            "accounts": len(self._versions),
+            "credential_loads": self.credential_loads,
+        }
+
+
+def create_account_source(config: Dict[str, Any], logger: Optional[logging.Logger] = None
+                          ) -> Optional[DatabaseAccountSource]:
+    """
+    Create the account source from the ``account_source`` config section.
+
+    Returns:
+        DatabaseAccountSource, or None when accounts come from the config file
+    """
+    if config.get('type', 'config') != 'database':
+        return None
+    return DatabaseAccountSource(
+        Database(config.get('database_url', 'sqlite:///data/accounts.db')),
+        page_size=config.get('page_size', 1000),
+        project_id=config.get('project_id'),
+        encryption_key=config.get('encryption_key') or os.getenv('MFARELAY_ENCRYPTION_KEY'),
+        logger=logger
+    )
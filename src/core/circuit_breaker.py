@@ -0,0 +1,121 @@
+"""
+Circuit Breaker for MFARelay
+Per-account reconnect backoff with jitter and closed/open/half-open states.
+"""
+
+import random
+import time
+from typing import Any, Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class AccountBackoff(Exception):
+    """A check was refused or failed; the account should be retried later."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure tracking for one email account.
+
+    Every failure schedules the next attempt after an exponentially growing,
+    jittered delay, so accounts failing together (a provider outage) spread
+    their reconnects out instead of retrying in lockstep. After
+    ``failure_threshold`` consecutive failures the circuit opens: checks are
+    refused without touching the network until the delay passes, then a
+    single half-open probe decides between closing and re-opening.
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_delay: float = 1.0,
+                 max_delay: float = 300.0, jitter: float = 0.5):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            base_delay: Delay after the first failure, in seconds
+            max_delay: Upper bound for the delay
+            jitter: Fraction of each delay that is randomized (0 disables jitter)
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = min(max(jitter, 0.0), 1.0)
+
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.opened = 0
+        self.last_error: Optional[str] = None
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Whether a check may run now.
+
+        An open circuit whose delay has passed moves to half-open and lets
+        exactly this one probe through.
+        """
+        now = time.monotonic() if now is None else now
+        if now < self.retry_at:
+            return False
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+            return True
+        # A half-open probe is already running
+        return self.state != HALF_OPEN
+
+    def retry_in(self, now: Optional[float] = None) -> float:
+        """Seconds until the next attempt is allowed."""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.retry_at - now)
+
+    def record_success(self):
+        """Close the circuit after a successful check."""
+        self.state = CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+
+    def record_failure(self, error: Optional[BaseException] = None, now: Optional[float] = None) -> float:
+        """
+        Record a failed check and return the delay before the next attempt.
+
+        Args:
+            error: The failure, kept for status reporting
+            now: Current monotonic time
+        """
+        now = time.monotonic() if now is None else now
+        self.failures += 1
+        if error is not None:
+            self.last_error = str(error) or type(error).__name__
+
+        delay = min(self.max_delay, self.base_delay * 2 ** min(self.failures - 1, 32))
+        delay *= 1 - self.jitter * random.random()
+        self.retry_at = now + delay
+
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+        return delay
+
+    def get_stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Get breaker state.
+
+        Returns:
+            Dict[str, Any]: State, consecutive failures, seconds until retry, times opened, last error
+        """
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in(now), 1),
+            "opened": self.opened,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,274 @@
+"""
+Code Log for MFARelay
+Write-behind persistence of detected codes and SMS outcomes to mfa_codes_log.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+from src.utils.db import Database
+from src.utils.metrics import REGISTRY
+
+CODE_LOG_ROWS = REGISTRY.counter(
+    'mfarelay_code_log_rows_total', 'mfa_codes_log rows by outcome', ('result',)
+)
+CODE_LOG_FLUSH_SECONDS = REGISTRY.histogram(
+    'mfarelay_code_log_flush_seconds', 'Time to write one batch to mfa_codes_log'
+)
+
+_COLUMNS = (
+    'id', 'project_id', 'user_id', 'email_account_id', 'mfa_code', 'sender_email', 'email_subject',
+    'detected_service', 'status', 'sms_sent_at', 'error_message', 'email_received_at', 'processed_at',
+)
+
+# Local stand-in for the Supabase table (database/schema.sql)
+_SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS mfa_codes_log (
+        id TEXT PRIMARY KEY,
+        project_id TEXT,
+        user_id TEXT,
+        email_account_id TEXT,
+        mfa_code TEXT NOT NULL,
+        sender_email TEXT,
+        email_subject TEXT,
+        detected_service TEXT,
+        status TEXT NOT NULL DEFAULT 'detected',
+        sms_sent_at TEXT,
+        error_message TEXT,
+        email_received_at TEXT,
+        processed_at TEXT,
+        created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+    )
+"""
+
+
+class CodeLogWriter:
+    """
+    Buffers code log rows in memory and writes them in batches.
+
+    The relay only appends to a dict, so recording costs no database round
+    trip. A background task writes multi-row INSERTs once ``batch_size``
+    rows are pending or every ``flush_interval`` seconds. An SMS outcome
+    that arrives before its detection row is written is merged into that
+    row, so most codes cost a single inserted row; later outcomes become
+    batched UPDATEs. At most ``max_pending`` rows are held (the oldest are
+    dropped), and everything pending is written on stop().
+    """
+
+    def __init__(self, db: Database, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_pending: int = 10000, project_id: Optional[str] = None,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Initialize the writer.
+
+        Args:
+            db: Database holding mfa_codes_log
+            batch_size: Rows per INSERT, and the pending count that triggers a flush
+            flush_interval: Longest time a row waits before being written
+            max_pending: Rows held in memory while the database is slow or down
+            project_id: Project for codes from accounts without one (config-file accounts)
+            logger: Logger instance
+        """
+        self.db = db
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.project_id = project_id
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._pending: Dict[str, Dict[str, Any]] = {}  # Rows not yet inserted, by id
+        self._updates: Dict[str, Dict[str, Any]] = {}  # Outcomes for rows already inserted
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.failed_flushes = 0
+
+        if db.dialect == 'sqlite':
+            db.execute(_SQLITE_SCHEMA)
+
+    def record_detected(self, code: str, sender: str = '', subject: str = '', service: Optional[str] = None,
+                        date_received: Optional[str] = None, user_id: Optional[str] = None,
+                        account_id: Optional[str] = None, project_id: Optional[str] = None) -> Optional[str]:
+        """
+        Buffer a row for a code about to be sent.
+
+        Returns:
+            Optional[str]: Row id to pass to record_outcome(), or None if the
+            row cannot be stored (PostgreSQL requires a user and project)
+        """
+        project_id = project_id or self.project_id
+        if self.db.dialect == 'postgres' and not (user_id and project_id):
+            self.skipped += 1
+            return None
+        if len(self._pending) >= self.max_pending:
+            del self._pending[next(iter(self._pending))]
+            self.dropped += 1
+            CODE_LOG_ROWS.labels('dropped').inc()
+
+        row_id = str(uuid.uuid4())
+        self._pending[row_id] = {
+            'id': row_id,
+            'project_id': project_id,
+            'user_id': user_id,
+            'email_account_id': account_id,
+            'mfa_code': code,
+            'sender_email': sender,
+            'email_subject': subject,
+            'detected_service': service,
+            'status': 'detected',
+            'sms_sent_at': None,
+            'error_message': None,
+            'email_received_at': date_received,  # Parsed when written, off the relay path
+            'processed_at': time.time(),
+        }
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return row_id
+
+    def record_outcome(self, row_id: str, sent: bool, error: Optional[str] = None):
+        """Record whether a code's SMS was sent."""
+        outcome = {
+            'status': 'sent' if sent else 'failed',
+            'sms_sent_at': time.time() if sent else None,
+            'error_message': error,
+        }
+        row = self._pending.get(row_id)
+        if row is not None:
+            row.update(outcome)
+        elif len(self._updates) < self.max_pending:
+            self._updates[row_id] = outcome
+        else:
+            self.dropped += 1
+            CODE_LOG_ROWS.labels('dropped').inc()
+
+    def start(self):
+        """Start the background flush task."""
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Write everything pending and stop."""
+        self._closed = True
+        self._wake.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write pending rows and outcomes in one batch (on a worker thread)."""
+        async with self._flush_lock:
+            if not self._pending and not self._updates:
+                return
+            rows, self._pending = list(self._pending.values()), {}
+            updates, self._updates = self._updates, {}
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, rows, updates)
+            except Exception as e:
+                self.failed_flushes += 1
+                self.logger.error(f"Failed to write {len(rows)} code log rows: {e}")
+                self._requeue(rows, updates)
+                return
+            CODE_LOG_FLUSH_SECONDS.observe(time.perf_counter() - started)
+            self.written += len(rows)
+            CODE_LOG_ROWS.labels('written').inc(len(rows))
+
+    def _requeue(self, rows: List[Dict[str, Any]], updates: Dict[str, Dict[str, Any]]):
+        """Put a failed batch back in front of newer rows, within the memory bound."""
+        room = max(0, self.max_pending - len(self._pending))
+        kept = rows[-room:] if room else []
+        self.dropped += len(rows) - len(kept)
+        CODE_LOG_ROWS.labels('dropped').inc(len(rows) - len(kept))
+        self._pending = {**{row['id']: row for row in kept}, **self._pending}
+        for row_id, outcome in updates.items():
+            self._updates.setdefault(row_id, outcome)
+
+    def _write(self, rows: List[Dict[str, Any]], updates: Dict[str, Dict[str, Any]]):
+        placeholders = '(' + ', '.join('?' for _ in _COLUMNS) + ')'
+        with self.db.transaction():
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                params: List[Any] = []
+                for row in batch:
+                    params.extend(self._value(column, row[column]) for column in _COLUMNS)
+                self.db.execute(
+                    f"INSERT INTO mfa_codes_log ({', '.join(_COLUMNS)}) VALUES "
+                    + ', '.join(placeholders for _ in batch),
+                    params
+                )
+            if updates:
+                self.db.executemany(
+                    "UPDATE mfa_codes_log SET status = ?, sms_sent_at = ?, error_message = ? WHERE id = ?",
+                    [(outcome['status'], self._value('sms_sent_at', outcome['sms_sent_at']),
+                      outcome['error_message'], row_id) for row_id, outcome in updates.items()]
+                )
+
+    def _value(self, column: str, value: Any) -> Any:
+        """Convert buffered values to column values (timestamps as text on SQLite)."""
+        if value is None:
+            return None
+        if column == 'email_received_at':
+            try:
+                value = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+        elif column in ('sms_sent_at', 'processed_at'):
+            value = datetime.fromtimestamp(value, timezone.utc)
+        else:
+            return value
+        return value.isoformat() if self.db.dialect == 'sqlite' else value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get writer statistics.
+
+        Returns:
+            Dict[str, Any]: Pending, written, dropped and skipped rows, failed flushes
+        """
+        return {
+            "pending": len(self._pending) + len(self._updates),
+            "written": self.written,
+            "dropped": self.dropped,
+            "skipped": self.skipped,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+def create_code_log(config: Dict[str, Any], logger: Optional[logging.Logger] = None) -> Optional[CodeLogWriter]:
+    """
+    Create the code log writer from the ``code_log`` config section.
+
+    Returns:
+        CodeLogWriter, or None when code logging is disabled
+    """
+    if not config.get('enabled', False):
+        return None
+    return CodeLogWriter(
+        Database(config.get('database_url', 'sqlite:///data/codes.db')),
+        batch_size=config.get('batch_size', 200),
+        flush_interval=config.get('flush_interval', 1.0),
+        max_pending=config.get('max_pending', 10000),
+        project_id=config.get('project_id'),
+        logger=logger
+    )
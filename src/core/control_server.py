@@ -0,0 +1,156 @@
+"""
+Control Server for MFARelay
+Minimal HTTP listener inside the relay process for metrics scrapes and relay commands.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Largest request body accepted (commands are small JSON documents)
+MAX_BODY_BYTES = 64 * 1024
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Tuple[int, Any]]]
+
+
+class ControlServer:
+    """
+    HTTP/1.1 listener serving the relay's own state.
+
+    The relay and the public API run as separate processes, so anything
+    that needs the live relay (the metrics registry, burst mode) is served
+    here. ``GET /metrics`` and ``GET /health`` are open for scrapers and
+    probes; command routes require the shared bearer token when one is
+    configured. One request per connection, no keep-alive.
+    """
+
+    def __init__(self, relay, host: str = '127.0.0.1', port: int = 9464, token: Optional[str] = None,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Initialize the server (it listens after start()).
+
+        Args:
+            relay: MFARelay or ShardSupervisor to serve
+            host: Interface to listen on
+            port: TCP port (0 picks a free one)
+            token: Bearer token required by command routes (open if None)
+            logger: Logger instance
+        """
+        self.relay = relay
+        self.host = host
+        self.port = port
+        self.token = token
+        self.logger = logger or logging.getLogger(__name__)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._commands: Dict[str, Handler] = {}
+
+    def command(self, path: str, handler: Handler):
+        """Register a POST route taking a JSON body and returning (status, JSON payload)."""
+        self._commands[path] = handler
+
+    async def start(self):
+        """Start listening."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.logger.info(f"Control server listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop listening."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            status, content_type, body = await asyncio.wait_for(self._respond(reader), timeout=10)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            writer.close()
+            return
+        except Exception as e:
+            self.logger.error(f"Control request failed: {e}")
+            status, content_type, body = 500, 'application/json', b'{"detail": "internal error"}'
+
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, reader: asyncio.StreamReader) -> Tuple[int, str, bytes]:
+        request_line = (await reader.readuntil(b'\r\n')).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise ValueError("Malformed request line")
+        method, target, _ = request_line
+        path = target.split('?', 1)[0]
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            if line == b'\r\n':
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if path == '/metrics' and method == 'GET':
+            return 200, PROMETHEUS_CONTENT_TYPE, self.relay.metrics.render().encode('utf-8')
+        if path == '/health' and method == 'GET':
+            return self._json(200, {"status": "healthy"})
+
+        handler = self._commands.get(path)
+        if handler is None:
+            return self._json(404, {"detail": "Not found"})
+        if method != 'POST':
+            return self._json(405, {"detail": "Method not allowed"})
+        if self.token and not hmac.compare_digest(
+                headers.get('authorization', ''), f"Bearer {self.token}"):
+            return self._json(401, {"detail": "Invalid control token"})
+
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            return self._json(413, {"detail": "Request body too large"})
+        try:
+            payload = json.loads(await reader.readexactly(length) or b'{}')
+        except json.JSONDecodeError:
+            return self._json(400, {"detail": "Body must be JSON"})
+        if not isinstance(payload, dict):
+            return self._json(400, {"detail": "Body must be a JSON object"})
+        return self._json(*await handler(payload))
+
+    @staticmethod
+    def _json(status: int, payload: Any) -> Tuple[int, str, bytes]:
+        return status, 'application/json', json.dumps(payload).encode('utf-8')
+
+
+def create_control_server(config: Dict[str, Any], relay, logger: Optional[logging.Logger] = None
+                          ) -> Optional[ControlServer]:
+    """
+    Create the control server from the ``control`` config section.
+
+    Returns:
+        ControlServer, or None when disabled
+    """
+    if not config.get('enabled', True):
+        return None
+    return ControlServer(
+        relay,
+        host=config.get('host', '127.0.0.1'),
+        port=config.get('port', 9464),
+        token=config.get('token') or os.getenv('MFARELAY_CONTROL_TOKEN'),
+        logger=logger
+    )
@@ -0,0 +1,215 @@
+"""
+Duplicate Code Suppression for MFARelay
+TTL-bounded stores that remember recently relayed codes, in memory or in SQLite.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class DedupStore:
+    """
+    In-memory TTL map with amortized O(1) insert and expiry.
+
+    Every entry has the same TTL, so insertion order is expiry order: keys
+    live in an OrderedDict oldest-first and expiry only ever pops from the
+    front. A hard entry cap evicts the oldest keys when exceeded.
+    """
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 10000):
+        """
+        Create an empty store.
+
+        Args:
+            ttl_seconds: How long a key suppresses duplicates
+            max_entries: Hard cap on remembered keys
+        """
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self.evicted = 0
+
+    def check_and_add(self, key: str) -> bool:
+        """
+        Record a key unless it was seen within the TTL.
+
+        Args:
+            key: Dedup key (code and sender)
+
+        Returns:
+            bool: True if the key is new, False if it is a duplicate
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._seen:
+            return False
+
+        self._seen[key] = now
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+            self.evicted += 1
+        return True
+
+    async def check_and_add_async(self, key: str) -> bool:
+        """check_and_add() for the event loop (in memory, so it runs inline)."""
+        return self.check_and_add(key)
+
+    def _expire(self, now: float):
+        """Drop expired keys from the front of the map."""
+        cutoff = now - self.ttl
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                break
+            self._seen.popitem(last=False)
+
+    def __len__(self) -> int:
+        self._expire(time.monotonic())
+        return len(self._seen)
+
+    def close(self):
+        """Release resources (nothing to do for the in-memory store)."""
+
+
+class SQLiteDedupStore:
+    """
+    SQLite-backed dedup store that survives restarts.
+
+    The check-and-insert is one atomic upsert, so several relay processes on
+    the same host can share a database file without sending a code twice.
+    Expired rows are purged every ``purge_every`` inserts rather than per call.
+    """
+
+    def __init__(self, path: str = "data/dedup.db", ttl_seconds: float = 30,
+                 max_entries: int = 10000, purge_every: int = 100):
+        """
+        Open (or create) the dedup database.
+
+        Args:
+            path: SQLite file path
+            ttl_seconds: How long a key suppresses duplicates
+            max_entries: Hard cap on stored keys, enforced at purge time
+            purge_every: Inserts between purges of expired rows
+        """
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS relay_dedup (
+                dedup_key TEXT PRIMARY KEY,
+                seen_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS relay_dedup_seen_at ON relay_dedup (seen_at)")
+
+    def check_and_add(self, key: str) -> bool:
+        """
+        Record a key unless it was seen within the TTL.
+
+        Args:
+            key: Dedup key (code and sender)
+
+        Returns:
+            bool: True if the key is new, False if it is a duplicate
+        """
+        # Wall-clock time, since the file is shared between processes
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO relay_dedup (dedup_key, seen_at) VALUES (?, ?)
+                ON CONFLICT(dedup_key) DO UPDATE SET seen_at = excluded.seen_at
+                WHERE relay_dedup.seen_at <= ?
+                """,
+                (key, now, now - self.ttl)
+            )
+            is_new = cursor.rowcount == 1
+            if is_new:
+                self._inserts += 1
+                if self._inserts % self.purge_every == 0:
+                    self._purge(now)
+            return is_new
+
+    async def check_and_add_async(self, key: str) -> bool:
+        """
+        check_and_add() on a worker thread, so waiting on another process's
+        lock never stalls the event loop.
+
+        Fails open: if the database cannot be used the key counts as new,
+        since a repeated SMS is better than a lost code.
+        """
+        try:
+            return await asyncio.to_thread(self.check_and_add, key)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Dedup store unavailable, relaying without it: {e}")
+            return True
+
+    def _purge(self, now: float):
+        """Delete expired rows and enforce the entry cap."""
+        try:
+            self._conn.execute("DELETE FROM relay_dedup WHERE seen_at <= ?", (now - self.ttl,))
+            self._conn.execute(
+                """
+                DELETE FROM relay_dedup WHERE dedup_key IN (
+                    SELECT dedup_key FROM relay_dedup ORDER BY seen_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+        except sqlite3.Error as e:
+            self.logger.warning(f"Error purging dedup store: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM relay_dedup WHERE seen_at > ?", (time.time() - self.ttl,)
+            ).fetchone()
+            return row[0]
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing dedup store: {e}")
+
+
+def create_dedup_store(config: Optional[Dict[str, Any]] = None):
+    """
+    Create a dedup store from the ``dedup`` config section.
+
+    Args:
+        config: Dedup settings (backend, window_seconds, max_entries, path)
+
+    Returns:
+        DedupStore or SQLiteDedupStore
+    """
+    config = config or {}
+    ttl = config.get('window_seconds', 30)
+    max_entries = config.get('max_entries', 10000)
+
+    if config.get('backend', 'memory') == 'sqlite':
+        return SQLiteDedupStore(
+            path=config.get('path', 'data/dedup.db'),
+            ttl_seconds=ttl,
+            max_entries=max_entries
+        )
+    return DedupStore(ttl_seconds=ttl, max_entries=max_entries)
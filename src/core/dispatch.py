@@ -0,0 +1,182 @@
+"""
+SMS Dispatch Queue for MFARelay
+Decouples MFA code detection from SMS delivery with a bounded queue and worker pool.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.utils.metrics import REGISTRY
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'mfarelay_sms_queue_wait_seconds', 'Time codes wait in the SMS queue before a worker picks them up'
+)
+QUEUE_DROPPED = REGISTRY.counter(
+    'mfarelay_sms_queue_dropped_total', 'Codes dropped undelivered (SMS queue full, or still queued at shutdown)'
+)
+
+
+class SMSDispatcher:
+    """
+    Bounded asyncio queue drained by a pool of delivery workers.
+
+    Monitors call submit(), which never awaits; workers call the delivery
+    handler. When the queue is full the oldest pending item is dropped,
+    since a newer MFA code is more useful than a stale one.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 workers: int = 2, queue_size: int = 100,
+                 logger: Optional[logging.Logger] = None,
+                 on_drop: Optional[Callable[[Dict[str, Any], str], None]] = None):
+        """
+        Create the dispatcher (workers start with start()).
+
+        Args:
+            handler: Coroutine function delivering one item
+            workers: Number of concurrent delivery workers
+            queue_size: Maximum number of pending items
+            logger: Logger instance
+            on_drop: Called with an item and the reason when it is dropped undelivered
+        """
+        self.handler = handler
+        self.on_drop = on_drop
+        self.worker_count = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+        # Metrics
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    @property
+    def running(self) -> bool:
+        """Whether the worker pool is running."""
+        return bool(self._workers)
+
+    def start(self):
+        """Start the worker pool on the running event loop."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.worker_count)
+        ]
+        self.logger.info(f"Started {self.worker_count} SMS dispatch workers")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """
+        Stop the worker pool, first giving pending and in-progress items a
+        chance to send.
+
+        Args:
+            drain_timeout: Seconds to wait for the queue to drain
+        """
+        if not self._workers:
+            return
+
+        # join() also waits for items a worker has taken but not finished
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Dropping {self._queue.qsize()} undelivered SMS on shutdown")
+            while not self._queue.empty():
+                _, item = self._queue.get_nowait()
+                self._queue.task_done()
+                self._dropped(item, "not sent before shutdown")
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def submit(self, item: Dict[str, Any]) -> bool:
+        """
+        Queue an item for delivery without waiting.
+
+        Args:
+            item: Payload passed to the handler
+
+        Returns:
+            bool: False if the dispatcher is not running
+        """
+        if not self._workers:
+            self.logger.error("SMS dispatcher not running")
+            return False
+
+        if self._queue.full():
+            _, stale = self._queue.get_nowait()
+            self._queue.task_done()
+            self.logger.warning(f"SMS queue full, dropped oldest item for {stale.get('account')}")
+            self._dropped(stale, "dropped: SMS queue full")
+
+        self._queue.put_nowait((time.monotonic(), item))
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _dropped(self, item: Dict[str, Any], reason: str):
+        self.dropped += 1
+        QUEUE_DROPPED.inc()
+        if self.on_drop:
+            try:
+                self.on_drop(item, reason)
+            except Exception as e:
+                self.logger.error(f"Drop callback failed: {e}")
+
+    async def _worker(self, index: int):
+        """Deliver queued items until cancelled."""
+        while True:
+            enqueued_at, item = await self._queue.get()
+            try:
+                wait = time.monotonic() - enqueued_at
+                self.last_wait = wait
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                QUEUE_WAIT_SECONDS.observe(wait)
+
+                if await self.handler(item) is False:
+                    self.failed += 1
+                else:
+                    self.delivered += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"SMS worker {index} failed to deliver item: {e}")
+            finally:
+                self._queue.task_done()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get queue metrics.
+
+        Returns:
+            Dict[str, Any]: Depth, throughput counters and wait times (seconds)
+        """
+        processed = self.delivered + self.failed
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "avg_wait": round(self.total_wait / processed, 4) if processed else 0.0,
+            "max_wait": round(self.max_wait, 4),
+            "last_wait": round(self.last_wait, 4),
+        }
@@ -0,0 +1,275 @@
+"""
+Account Leases for MFARelay
+Lease-based account ownership so several relay nodes share one account list
+without two of them monitoring the same mailbox.
+"""
+
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from src.utils.db import Database
+
+# SQLite stand-in for database/account-leases.sql (expiry as a julianday value)
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mfa_account_leases (
+    account_id TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL,
+    lease_expires_at REAL NOT NULL,
+    acquired_at REAL NOT NULL,
+    renewed_at REAL NOT NULL
+)
+"""
+
+
+class LeaseManager:
+    """
+    Claims, renews and releases per-account leases.
+
+    Expiry is computed with the database clock, so nodes with skewed clocks
+    agree on when a lease is orphaned. A claim is one conditional upsert:
+    it succeeds only if the row is missing, expired or already ours.
+    """
+
+    def __init__(self, db: Database, owner_id: Optional[str] = None, lease_seconds: float = 15.0):
+        """
+        Initialize the manager.
+
+        Args:
+            db: Database holding mfa_account_leases
+            owner_id: This node's identity (defaults to hostname plus a random suffix)
+            lease_seconds: How long a lease lasts without renewal
+        """
+        self.db = db
+        self.owner_id = owner_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.logger = logging.getLogger(__name__)
+
+        if db.dialect == 'postgres':
+            self._now = "now()"
+            self._expiry = "now() + make_interval(secs => ?)"
+        else:
+            self._now = "julianday('now')"
+            self._expiry = "julianday('now') + ? / 86400.0"
+            self.db.execute(_SQLITE_SCHEMA)
+
+    def claim(self, account_ids: List[str]) -> List[str]:
+        """
+        Try to take (or keep) leases on accounts.
+
+        Args:
+            account_ids: Candidate account ids
+
+        Returns:
+            List[str]: Ids now leased by this node
+        """
+        claimed = []
+        with self.db.transaction():
+            for account_id in account_ids:
+                rows = self.db.execute(
+                    f"""
+                    INSERT INTO mfa_account_leases
+                        (account_id, owner_id, lease_expires_at, acquired_at, renewed_at)
+                    VALUES (?, ?, {self._expiry}, {self._now}, {self._now})
+                    ON CONFLICT (account_id) DO UPDATE SET
+                        owner_id = excluded.owner_id,
+                        lease_expires_at = excluded.lease_expires_at,
+                        acquired_at = CASE WHEN mfa_account_leases.owner_id = excluded.owner_id
+                                           THEN mfa_account_leases.acquired_at
+                                           ELSE excluded.acquired_at END,
+                        renewed_at = excluded.renewed_at
+                    WHERE mfa_account_leases.lease_expires_at < {self._now}
+                       OR mfa_account_leases.owner_id = excluded.owner_id
+                    """,
+                    (account_id, self.owner_id, self.lease_seconds)
+                )
+                if rows == 1:
+                    claimed.append(account_id)
+        return claimed
+
+    def renew(self) -> Set[str]:
+        """
+        Extend every lease this node still holds.
+
+        Returns:
+            Set[str]: Ids still leased by this node (leases that already
+            expired and were taken over are missing)
+        """
+        with self.db.transaction():
+            self.db.execute(
+                f"""
+                UPDATE mfa_account_leases
+                SET lease_expires_at = {self._expiry}, renewed_at = {self._now}
+                WHERE owner_id = ? AND lease_expires_at >= {self._now}
+                """,
+                (self.lease_seconds, self.owner_id)
+            )
+            rows = self.db.fetchall(
+                f"SELECT account_id FROM mfa_account_leases WHERE owner_id = ? AND lease_expires_at >= {self._now}",
+                (self.owner_id,)
+            )
+        return {str(row[0]) for row in rows}
+
+    def release(self, account_ids: Optional[List[str]] = None):
+        """
+        Give up leases so other nodes can claim them immediately.
+
+        Args:
+            account_ids: Ids to release (all of this node's leases if omitted)
+        """
+        if account_ids is None:
+            self.db.execute("DELETE FROM mfa_account_leases WHERE owner_id = ?", (self.owner_id,))
+            return
+        self.db.executemany(
+            "DELETE FROM mfa_account_leases WHERE owner_id = ? AND account_id = ?",
+            [(self.owner_id, account_id) for account_id in account_ids]
+        )
+
+    def owners(self) -> Dict[str, str]:
+        """Current unexpired lease owners by account id."""
+        rows = self.db.fetchall(
+            f"SELECT account_id, owner_id FROM mfa_account_leases WHERE lease_expires_at >= {self._now}"
+        )
+        return {str(account_id): owner for account_id, owner in rows}
+
+
+class LeaseCoordinator:
+    """
+    Keeps this node's monitored accounts in line with the leases it holds.
+
+    Every heartbeat it renews held leases, drops accounts whose lease was
+    lost, and claims unowned or orphaned accounts (up to ``max_accounts``,
+    ``batch_size`` per heartbeat). If the database stays unreachable past the
+    lease length, every account is dropped, since other nodes may already
+    have taken them over.
+    """
+
+    def __init__(self, manager: LeaseManager, accounts: List[Dict[str, Any]],
+                 account_id: Callable[[Dict[str, Any]], str],
+                 add_account: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 remove_account: Callable[[str], Awaitable[Any]],
+                 heartbeat_interval: float = 5.0, batch_size: int = 100,
+                 max_accounts: Optional[int] = None, logger: Optional[logging.Logger] = None):
+        """
+        Initialize the coordinator.
+
+        Args:
+            manager: Lease manager for this node
+            accounts: Every account config the cluster should monitor
+            account_id: Function returning an account config's id
+            add_account: Coroutine starting to monitor an account config
+            remove_account: Coroutine stopping an account by id
+            heartbeat_interval: Seconds between renew/claim rounds
+            batch_size: Maximum new claims per round
+            max_accounts: Maximum accounts this node owns (unlimited if None)
+            logger: Logger instance
+        """
+        self.manager = manager
+        self.account_id = account_id
+        self.add_account = add_account
+        self.remove_account = remove_account
+        self.heartbeat_interval = heartbeat_interval
+        self.batch_size = batch_size
+        self.max_accounts = max_accounts
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        self.set_accounts(accounts)
+        self.owned: Set[str] = set()
+        self._lease_deadline = 0.0
+        self._running = False
+
+        self.claims = 0
+        self.losses = 0
+
+    def set_accounts(self, accounts: List[Dict[str, Any]]):
+        """Replace the cluster account list (picked up on the next heartbeat)."""
+        self.accounts = {self.account_id(account): account for account in accounts}
+
+    async def run(self):
+        """Heartbeat until cancelled, then release this node's leases."""
+        self._running = True
+        try:
+            while self._running:
+                await self.heartbeat()
+                await asyncio.sleep(self.heartbeat_interval)
+        finally:
+            await self.shutdown()
+
+    async def heartbeat(self):
+        """One renew-and-claim round."""
+        try:
+            still_owned = await asyncio.to_thread(self.manager.renew)
+            self._lease_deadline = time.monotonic() + self.manager.lease_seconds
+        except Exception as e:
+            self.logger.error(f"Lease renewal failed: {e}")
+            if self.owned and time.monotonic() > self._lease_deadline:
+                self.logger.error("Leases expired without renewal, releasing all accounts")
+                await self._drop(set(self.owned))
+            return
+
+        # Lost (taken over after we missed a renewal) or removed from the account list
+        removed = (self.owned & still_owned) - self.accounts.keys()
+        await self._drop((self.owned - still_owned) | removed)
+        if removed:
+            await asyncio.to_thread(self.manager.release, list(removed))
+
+        capacity = self.batch_size
+        if self.max_accounts is not None:
+            capacity = min(capacity, self.max_accounts - len(self.owned))
+        candidates = [key for key in self.accounts if key not in self.owned][:max(0, capacity)]
+        if not candidates:
+            return
+
+        try:
+            claimed = await asyncio.to_thread(self.manager.claim, candidates)
+        except Exception as e:
+            self.logger.error(f"Lease claim failed: {e}")
+            return
+
+        for key in claimed:
+            self.owned.add(key)
+            self.claims += 1
+            try:
+                await self.add_account(self.accounts[key])
+            except Exception as e:
+                self.logger.error(f"Failed to start account {key}: {e}")
+        if claimed:
+            self.logger.info(f"Claimed {len(claimed)} accounts (now owning {len(self.owned)})")
+
+    async def _drop(self, keys: Set[str]):
+        for key in keys:
+            self.owned.discard(key)
+            self.losses += 1
+            try:
+                await self.remove_account(key)
+            except Exception as e:
+                self.logger.error(f"Failed to stop account {key}: {e}")
+        if keys:
+            self.logger.warning(f"Dropped {len(keys)} accounts no longer leased by this node")
+
+    async def shutdown(self):
+        """Release all leases so other nodes take over immediately."""
+        self._running = False
+        try:
+            await asyncio.to_thread(self.manager.release)
+        except Exception as e:
+            self.logger.error(f"Failed to release leases: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get lease statistics.
+
+        Returns:
+            Dict[str, Any]: Owner id, owned/known account counts, claims and losses
+        """
+        return {
+            "owner_id": self.manager.owner_id,
+            "owned_accounts": len(self.owned),
+            "known_accounts": len(self.accounts),
+            "claims": self.claims,
+            "losses": self.losses,
+        }
@@ -5,16 +5,55 @@ Orchestrates email monitoring and SMS forwarding with multi-user support.
 
 import asyncio
 import logging
+import time
+from email.utils import parsedate_to_datetime
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
-
+from datetime import datetime
+
+from src.core.circuit_breaker import CLOSED, AccountBackoff, CircuitBreaker
+from src.core.code_log import create_code_log
+from src.core.dedup import create_dedup_store
+from src.core.dispatch import SMSDispatcher
+from src.core.scheduler import PollScheduler
+from src.core.service_resolver import ServiceResolver
 from src.email.email_monitor import EmailMonitor
+from src.email.tls import get_session_stats
+from src.sms.quota import SMSQuotaExceeded
 from src.sms.twilio_client import TwilioClient
+from src.utils.logger import log_context
+from src.utils.metrics import END_TO_END_BUCKETS, REGISTRY
+from src.utils.tracing import get_tracer
+
+POLL_SECONDS = REGISTRY.histogram(
+    'mfarelay_poll_duration_seconds', 'Duration of one mailbox check (fetch, parse, extract)', ('account',)
+)
+POLL_ERRORS = REGISTRY.counter(
+    'mfarelay_poll_errors_total', 'Failed mailbox checks', ('account',)
+)
+CODES = REGISTRY.counter(
+    'mfarelay_codes_total', 'MFA codes detected, by outcome', ('result',)
+)
+SMS_SECONDS = REGISTRY.histogram(
+    'mfarelay_sms_send_seconds', 'Twilio API time per SMS', ('result',)
+)
+DETECT_TO_SENT_SECONDS = REGISTRY.histogram(
+    'mfarelay_detect_to_sent_seconds', 'Code extracted to SMS accepted by Twilio'
+)
+END_TO_END_SECONDS = REGISTRY.histogram(
+    'mfarelay_end_to_end_seconds', 'Email Date header to SMS accepted by Twilio',
+    ('account',), buckets=END_TO_END_BUCKETS
+)
+START_TIME = REGISTRY.gauge(
+    'mfarelay_start_time_seconds', 'Unix time the relay started'
+)
 
 
 class MFARelay:
     """Core MFA Relay service that orchestrates email monitoring and SMS forwarding."""
 
+    # Whether this relay writes mfa_codes_log (shard workers leave it to the supervisor)
+    records_codes = True
+
     def __init__(self, config: Dict[str, Any], email_monitors: List[EmailMonitor],
                  twilio_client: TwilioClient, logger: logging.Logger):
         """
@@ -32,15 +71,69 @@ class MFARelay:
         self.logger = logger
 
         self.running = False
-        self.monitoring_tasks: List[asyncio.Task] = []
+        self.started_at: Optional[float] = None
+        self.codes_relayed = 0
+        self.metrics = REGISTRY
+        self.monitoring_tasks: Dict[str, asyncio.Task] = {}  # IDLE tasks by account key
+        self.scheduler_task: Optional[asyncio.Task] = None
+        self.keepalive_task: Optional[asyncio.Task] = None
 
         # Configuration
         self.check_interval = config.get('email_monitoring', {}).get('check_interval', 30)
         self.max_concurrent_checks = config.get('email_monitoring', {}).get('max_concurrent_checks', 5)
-
-        # Rate limiting
-        self.last_code_times: Dict[str, datetime] = {}
-        self.min_code_interval = timedelta(seconds=30)  # Prevent duplicate codes
+        self.check_semaphore = asyncio.Semaphore(self.max_concurrent_checks)
+        self.keepalive_check = config.get('email_monitoring', {}).get('keepalive_check', 10)
+
+        # Accounts without IDLE are polled by one shared scheduler whose
+        # per-account intervals adapt to MFA traffic
+        adaptive_config = config.get('email_monitoring', {}).get('adaptive_polling', {})
+        self.scheduler = PollScheduler(
+            self._poll_account,
+            workers=self.max_concurrent_checks,
+            min_interval=adaptive_config.get('min_interval', 5),
+            max_interval=adaptive_config.get('max_interval', 300),
+            backoff=adaptive_config.get('backoff', 1.5),
+            hot_window=adaptive_config.get('hot_window', 300),
+            logger=logger
+        )
+
+        # "Expect a code" burst mode: fast polling (or frequent IDLE re-checks)
+        # for a short window after a user requests a code
+        burst_config = config.get('email_monitoring', {}).get('burst', {})
+        self.burst_window = burst_config.get('window', 120)
+        self.burst_max_window = burst_config.get('max_window', 600)
+        self.burst_interval = burst_config.get('interval', 1.5)
+        self.burst_idle_recheck = burst_config.get('idle_recheck', 10)
+        self._idle_burst_until: Dict[str, float] = {}
+
+        # Per-account circuit breakers: failing accounts back off (with jitter)
+        # without holding a check slot while they wait or reconnect
+        self.reconnect_config = config.get('email_monitoring', {}).get('reconnect', {})
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+        # Sender -> service name resolution, extendable from config
+        detection_config = config.get('mfa_detection', {})
+        self.service_resolver = ServiceResolver(
+            extra_domains=detection_config.get('service_domains', {}),
+            cache_size=detection_config.get('service_cache_size', 4096)
+        )
+
+        # Rate limiting: codes seen within the dedup window are not resent
+        self.dedup = create_dedup_store(config.get('dedup', {}))
+
+        # SMS delivery runs on its own workers so monitors never wait on Twilio
+        dispatch_config = config.get('sms_dispatch', {})
+        self.dispatcher = SMSDispatcher(
+            self._deliver_mfa_code,
+            workers=dispatch_config.get('workers', 2),
+            queue_size=dispatch_config.get('queue_size', 100),
+            logger=logger,
+            on_drop=lambda item, reason: self._record_outcome(item, False, reason)
+        )
+
+        # Detected codes and SMS outcomes are written to mfa_codes_log in
+        # batches, off the relay path
+        self.code_log = create_code_log(config.get('code_log', {}), logger) if self.records_codes else None
 
     async def start(self):
         """Start the MFA relay service."""
@@ -49,19 +142,24 @@ class MFARelay:
             return
 
         self.running = True
+        self.started_at = time.monotonic()
+        START_TIME.set(time.time())
         self.logger.info("Starting MFA Relay core service")
 
         try:
-            # Start monitoring tasks for each email account
-            semaphore = asyncio.Semaphore(self.max_concurrent_checks)
+            self.dispatcher.start()
+            if self.code_log:
+                self.code_log.start()
+            self.scheduler_task = asyncio.create_task(self.scheduler.run())
+            self.keepalive_task = asyncio.create_task(self._keepalive_loop())
 
             for monitor in self.email_monitors:
-                task = asyncio.create_task(
-                    self._monitor_email_account(monitor, semaphore)
-                )
-                self.monitoring_tasks.append(task)
+                self._start_monitoring(monitor)
 
-            self.logger.info(f"Started {len(self.monitoring_tasks)} email monitoring tasks")
+            self.logger.info(
+                f"Started {len(self.monitoring_tasks)} IDLE monitoring tasks, "
+                f"{len(self.scheduler)} accounts on the polling scheduler"
+            )
 
             # Keep service running
             while self.running:
@@ -81,63 +179,278 @@ class MFARelay:
         self.logger.info("Stopping MFA Relay core service...")
         self.running = False
 
-        # Cancel all monitoring tasks
-        for task in self.monitoring_tasks:
+        # Cancel all monitoring tasks and the polling scheduler
+        tasks = list(self.monitoring_tasks.values())
+        tasks += [task for task in (self.scheduler_task, self.keepalive_task) if task]
+        for task in tasks:
             if not task.done():
                 task.cancel()
 
         # Wait for tasks to complete
-        if self.monitoring_tasks:
-            await asyncio.gather(*self.monitoring_tasks, return_exceptions=True)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Deliver codes already queued before shutting down
+        await self.dispatcher.stop()
+
+        # Write the outcomes of those deliveries and anything still buffered
+        if self.code_log:
+            await self.code_log.stop()
 
         # Disconnect all email monitors
         for monitor in self.email_monitors:
             await monitor.disconnect()
 
         self.monitoring_tasks.clear()
+        self.scheduler_task = None
+        self.keepalive_task = None
+        self.dedup.close()
         self.logger.info("MFA Relay core service stopped")
 
-    async def _monitor_email_account(self, monitor: EmailMonitor, semaphore: asyncio.Semaphore):
+    def _start_monitoring(self, monitor: EmailMonitor):
+        """IDLE accounts get a dedicated task; the rest share the scheduler."""
+        if monitor.idle_supported:
+            self.monitoring_tasks[monitor.account_key] = asyncio.create_task(
+                self._monitor_email_account(monitor)
+            )
+        else:
+            self.scheduler.add(monitor, self._account_interval(monitor))
+
+    async def add_monitor(self, monitor: EmailMonitor):
+        """
+        Add an email account, starting to monitor it if the relay is running.
+        An account with the same key is replaced.
+
+        Args:
+            monitor: Email monitor (connected, or connected on its first check)
+        """
+        await self.remove_monitor(monitor.account_key)
+        self.email_monitors.append(monitor)
+        if self.running:
+            self._start_monitoring(monitor)
+        self.logger.info(f"Added email account: {monitor.name}")
+
+    async def remove_monitor(self, account_key: str) -> bool:
         """
-        Monitor a single email account for MFA codes.
+        Stop monitoring an email account and close its connection.
+
+        Args:
+            account_key: The monitor's account key
+
+        Returns:
+            bool: False if no such account was monitored
+        """
+        monitor = self._detach_monitor(account_key)
+        if monitor is None:
+            return False
+        task = self.monitoring_tasks.pop(account_key, None)
+        if task and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await monitor.disconnect()
+        self.logger.info(f"Removed email account: {monitor.name}")
+        return True
+
+    def _detach_monitor(self, account_key: str) -> Optional[EmailMonitor]:
+        """Detach an account from the relay and scheduler without closing it."""
+        for index, monitor in enumerate(self.email_monitors):
+            if monitor.account_key == account_key:
+                del self.email_monitors[index]
+                self.scheduler.remove(monitor)
+                self._idle_burst_until.pop(account_key, None)
+                self.breakers.pop(account_key, None)
+                return monitor
+        return None
+
+    def _account_interval(self, monitor: EmailMonitor) -> float:
+        """Base polling interval for an account (its own setting, else the global one)."""
+        return monitor.check_interval or self.check_interval
+
+    def _breaker(self, monitor: EmailMonitor) -> CircuitBreaker:
+        """The account's circuit breaker, created on first use."""
+        breaker = self.breakers.get(monitor.account_key)
+        if breaker is None:
+            breaker = self.breakers[monitor.account_key] = CircuitBreaker(
+                failure_threshold=self.reconnect_config.get('failure_threshold', 3),
+                base_delay=self.reconnect_config.get('base_delay', 1.0),
+                max_delay=self.reconnect_config.get('max_delay', 300.0),
+                jitter=self.reconnect_config.get('jitter', 0.5)
+            )
+        return breaker
+
+    async def _monitor_email_account(self, monitor: EmailMonitor):
+        """
+        Monitor a single IDLE-capable email account for MFA codes.
+
+        If the account's server stops offering IDLE it is handed to the
+        polling scheduler; a dropped connection is just reconnected.
 
         Args:
             monitor: Email monitor instance
-            semaphore: Semaphore for limiting concurrent checks
         """
         self.logger.info(f"Starting monitoring for email account: {monitor.name}")
 
         while self.running:
-            async with semaphore:
+            try:
+                await self._check_account(monitor)
+
+                # Wait for a server push, or fall back to scheduled polling.
+                # In burst mode IDLE is re-armed often, so a silently dropped
+                # connection is noticed within seconds.
+                if monitor.idle_supported:
+                    burst_left = self._idle_burst_until.get(monitor.account_key, 0) - asyncio.get_event_loop().time()
+                    if burst_left > 0:
+                        await monitor.wait_for_new_mail(timeout=min(burst_left, self.burst_idle_recheck))
+                    else:
+                        self._idle_burst_until.pop(monitor.account_key, None)
+                        await monitor.wait_for_new_mail()
+                elif not (monitor.imap_client and monitor.imap_client.connected):
+                    # Disconnected (e.g. IDLE dropped); the next check reconnects
+                    # and finds out whether IDLE is still available
+                    continue
+                else:
+                    self.logger.info(f"{monitor.name} lost IDLE support, moving to the polling scheduler")
+                    self.monitoring_tasks.pop(monitor.account_key, None)
+                    self.scheduler.add(monitor, self._account_interval(monitor),
+                                       delay=self._account_interval(monitor))
+                    return
+
+            except AccountBackoff as e:
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                # Anything the check does not handle itself must not end the task
+                delay = self._breaker(monitor).record_failure(e)
+                self.logger.error(f"Unexpected error monitoring {monitor.name}: {e} (retry in {delay:.1f}s)")
+                await asyncio.sleep(delay)
+
+        self.logger.info(f"Stopped monitoring for email account: {monitor.name}")
+
+    async def _poll_account(self, monitor: EmailMonitor) -> int:
+        """
+        Scheduled poll of an account without IDLE.
+
+        Accounts whose (re)connect found IDLE support, e.g. after being
+        unreachable at startup, leave the scheduler for an IDLE task.
+        """
+        found = await self._check_account(monitor)
+        if (monitor.idle_supported and self.running and monitor in self.email_monitors
+                and monitor.account_key not in self.monitoring_tasks):
+            self.logger.info(f"{monitor.name} supports IDLE, moving it off the polling scheduler")
+            self.scheduler.remove(monitor)
+            self._start_monitoring(monitor)
+        return found
+
+    async def _keepalive_loop(self):
+        """NOOP idle polled sessions and standby sessions before they time out."""
+        while self.running:
+            await asyncio.sleep(self.keepalive_check)
+            monitors = [m for m in self.email_monitors if m.keepalive_interval > 0]
+            if monitors:
+                await asyncio.gather(*(m.keepalive() for m in monitors), return_exceptions=True)
+
+    async def _check_account(self, monitor: EmailMonitor) -> int:
+        """
+        Run one check for an account and queue any codes found.
+
+        Reconnects and disconnects happen outside the check semaphore, so a
+        broken server never holds a slot that healthy accounts could use.
+
+        Args:
+            monitor: Email monitor instance
+
+        Returns:
+            int: Number of codes found
+
+        Raises:
+            AccountBackoff: If the circuit is open or the check failed; carries
+                the jittered delay before the next attempt
+        """
+        breaker = self._breaker(monitor)
+        if not breaker.allow():
+            raise AccountBackoff(
+                f"Circuit open for {monitor.name}",
+                max(breaker.retry_in(), breaker.base_delay)
+            )
+
+        tracer = get_tracer()
+        try:
+            with log_context(account=monitor.name), tracer.span('poll', account=monitor.name) as poll_span:
+                if not (monitor.imap_client and monitor.imap_client.connected):
+                    with tracer.span('imap.connect'):
+                        if not await monitor.connect():
+                            raise ConnectionError(f"Failed to reconnect to {monitor.name}")
+                    self.logger.info(f"Reconnected to {monitor.name}")
+
+                with tracer.span('check_slot.wait'):
+                    await self.check_semaphore.acquire()
                 try:
-                    # Check for MFA codes
+                    started = time.perf_counter()
                     mfa_codes = await monitor.check_for_mfa_codes()
+                    POLL_SECONDS.labels(monitor.name).observe(time.perf_counter() - started)
+                finally:
+                    self.check_semaphore.release()
+                poll_span.set_attribute('codes', len(mfa_codes))
 
-                    for code_data in mfa_codes:
-                        await self._process_mfa_code(code_data, monitor.name)
+        except Exception as e:
+            POLL_ERRORS.labels(monitor.name).inc()
+            delay = breaker.record_failure(e)
+            self.logger.error(
+                f"Error monitoring {monitor.name}: {e} "
+                f"(circuit {breaker.state}, retry in {delay:.1f}s)"
+            )
+
+            # Drop the connection; the next allowed check reconnects (or
+            # promotes the standby session)
+            try:
+                await monitor.disconnect(keep_standby=True)
+            except Exception as disconnect_error:
+                self.logger.error(f"Disconnect failed for {monitor.name}: {disconnect_error}")
+            raise AccountBackoff(str(e), delay) from e
+
+        if breaker.state != CLOSED:
+            self.logger.info(f"{monitor.name} recovered, closing circuit")
+        breaker.record_success()
+
+        for code_data in mfa_codes:
+            await self._process_mfa_code(code_data, monitor.name)
+        return len(mfa_codes)
+
+    def expect_code(self, user_id: Optional[str] = None, window: Optional[float] = None) -> int:
+        """
+        Put a user's accounts into burst mode while they wait for a code.
 
-                except Exception as e:
-                    self.logger.error(f"Error monitoring {monitor.name}: {e}")
+        Accounts are checked immediately: polled ones then every burst
+        interval, IDLE ones keep IDLE open and re-check every few seconds. Both
+        revert automatically when the window ends.
 
-                    # Try to reconnect if connection lost
-                    try:
-                        await monitor.disconnect()
-                        await asyncio.sleep(5)
-                        if await monitor.connect():
-                            self.logger.info(f"Reconnected to {monitor.name}")
-                        else:
-                            self.logger.error(f"Failed to reconnect to {monitor.name}")
-                    except Exception as reconnect_error:
-                        self.logger.error(f"Reconnection failed for {monitor.name}: {reconnect_error}")
+        Args:
+            user_id: Owner of the accounts (None for every account)
+            window: Burst duration in seconds (defaults to the configured window)
 
-            # Wait before next check
-            await asyncio.sleep(self.check_interval)
+        Returns:
+            int: Number of accounts put into burst mode
+        """
+        window = min(window or self.burst_window, self.burst_max_window)
+        deadline = asyncio.get_event_loop().time() + window
+        count = 0
 
-        self.logger.info(f"Stopped monitoring for email account: {monitor.name}")
+        for monitor in self.email_monitors:
+            if user_id is not None and monitor.user_id != user_id:
+                continue
+            if self.scheduler.burst(monitor, self.burst_interval, window):
+                count += 1
+            elif monitor.idle_supported:
+                self._idle_burst_until[monitor.account_key] = deadline
+                # Check now instead of when the current IDLE wait ends
+                monitor.interrupt_wait()
+                count += 1
+
+        self.logger.info(f"Burst mode for {window:.0f}s on {count} accounts (user {user_id or 'all'})")
+        return count
 
     async def _process_mfa_code(self, code_data: Dict[str, str], account_name: str):
         """
-        Process detected MFA code and send via SMS.
+        Process detected MFA code and queue it for SMS delivery.
 
         Args:
             code_data: Dictionary containing MFA code and metadata
@@ -151,41 +464,106 @@ class MFARelay:
             self.logger.warning(f"Empty MFA code from {account_name}")
             return
 
-        # Rate limiting: prevent duplicate codes
-        code_key = f"{code}:{sender}"
-        now = datetime.now()
-
-        if code_key in self.last_code_times:
-            time_diff = now - self.last_code_times[code_key]
-            if time_diff < self.min_code_interval:
-                self.logger.debug(f"Skipping duplicate code {code} (sent {time_diff.seconds}s ago)")
+        with log_context(account=account_name), \
+                get_tracer().span('relay.process_code', parent=code_data.get('trace'), account=account_name) as span:
+            # Rate limiting: prevent duplicate codes
+            if not await self.dedup.check_and_add_async(f"{code}:{sender}"):
+                CODES.labels('duplicate').inc()
+                span.set_attribute('duplicate', True)
+                self.logger.debug(f"Skipping duplicate code {code} from {sender}")
                 return
+            CODES.labels('relayed').inc()
+            self.codes_relayed += 1
 
-        self.last_code_times[code_key] = now
-
-        # Clean up old entries (keep only last hour)
-        cutoff_time = now - timedelta(hours=1)
-        self.last_code_times = {
-            k: v for k, v in self.last_code_times.items()
-            if v > cutoff_time
-        }
-
-        self.logger.info(f"Processing MFA code: {code} from {sender} via {account_name}")
+            trace = span.context or code_data.get('trace')
+            self.logger.info(
+                f"Processing MFA code: {code} from {sender} via {account_name}"
+                + (f" (trace {trace[0]})" if trace else "")
+            )
 
-        try:
             # Determine service name from sender or subject
             service_name = self._extract_service_name(sender, subject)
+            span.set_attribute('service', service_name or '')
+
+            log_id = self.code_log.record_detected(
+                code, sender, subject, service_name,
+                date_received=code_data.get('date_received'),
+                user_id=code_data.get('user_id'),
+                account_id=code_data.get('account_id'),
+                project_id=code_data.get('project_id')
+            ) if self.code_log else None
+
+            self.dispatcher.submit({
+                "code": code,
+                "service": service_name,
+                "account": account_name,
+                "user_id": code_data.get('user_id'),
+                "project_id": code_data.get('project_id'),
+                "date_received": code_data.get('date_received'),
+                "detected_at": code_data.get('timestamp'),
+                "queued_at": time.time(),
+                "trace": trace,
+                "log_id": log_id,
+            })
+
+    async def _deliver_mfa_code(self, item: Dict[str, Any]) -> bool:
+        """
+        Send a queued MFA code via SMS (runs on a dispatch worker).
 
-            # Send SMS
-            success = await self.twilio_client.send_mfa_code(code, service_name)
+        Args:
+            item: Queued code with service and account name
+
+        Returns:
+            bool: True if the SMS was sent
+        """
+        code = item["code"]
+        tracer = get_tracer()
+        if item.get("trace") and item.get("queued_at"):
+            tracer.record('sms.queue_wait', item["queued_at"], time.time(), parent=item.get("trace"))
+        try:
+            started = time.perf_counter()
+            with log_context(account=item.get("account")), \
+                    tracer.span('sms.send', parent=item.get("trace"), service=item.get("service") or '') as span:
+                success = await self.twilio_client.send_mfa_code(
+                    code, item.get("service"), item.get("user_id"), item.get("project_id")
+                )
+                span.set_attribute('sent', bool(success))
+            SMS_SECONDS.labels('sent' if success else 'failed').observe(time.perf_counter() - started)
 
             if success:
+                self._record_latency(item)
                 self.logger.info(f"Successfully sent MFA code {code} via SMS")
             else:
                 self.logger.error(f"Failed to send MFA code {code} via SMS")
+            self._record_outcome(item, success, None if success else "SMS send failed")
+            return success
 
+        except SMSQuotaExceeded as e:
+            self.logger.warning(f"Not sending MFA code {code}: {e}")
+            self._record_outcome(item, False, str(e))
+            return False
         except Exception as e:
-            self.logger.error(f"Error processing MFA code {code}: {e}")
+            self.logger.error(f"Error sending MFA code {code}: {e}")
+            self._record_outcome(item, False, str(e))
+            return False
+
+    def _record_outcome(self, item: Dict[str, Any], sent: bool, error: Optional[str]):
+        """Note a delivery result on the code's mfa_codes_log row."""
+        if self.code_log and item.get("log_id"):
+            self.code_log.record_outcome(item["log_id"], sent, error)
+
+    def _record_latency(self, item: Dict[str, Any]):
+        """Observe detection-to-SMS and email-to-SMS latency for a sent code."""
+        now = time.time()
+        try:
+            if item.get("detected_at"):
+                DETECT_TO_SENT_SECONDS.observe(max(0.0, now - datetime.fromisoformat(item["detected_at"]).timestamp()))
+            if item.get("date_received"):
+                # Date headers have one-second resolution and the sender's clock
+                received = parsedate_to_datetime(item["date_received"]).timestamp()
+                END_TO_END_SECONDS.labels(item.get("account", "")).observe(max(0.0, now - received))
+        except (TypeError, ValueError) as e:
+            self.logger.debug(f"Unparseable timestamp for latency metrics: {e}")
 
     def _extract_service_name(self, sender: str, subject: str) -> Optional[str]:
         """
@@ -198,45 +576,7 @@ class MFARelay:
         Returns:
             Service name or None
         """
-        # Common service patterns
-        service_patterns = {
-            'google': ['google', 'gmail', 'accounts.google'],
-            'microsoft': ['microsoft', 'outlook', 'live.com', 'hotmail'],
-            'github': ['github', 'noreply@github'],
-            'aws': ['aws', 'amazon', 'no-reply@aws'],
-            'azure': ['azure', 'microsoft.com'],
-            'apple': ['apple', 'icloud', 'appleid'],
-            'facebook': ['facebook', 'meta'],
-            'twitter': ['twitter', 'x.com'],
-            'linkedin': ['linkedin'],
-            'discord': ['discord'],
-            'slack': ['slack'],
-            'dropbox': ['dropbox'],
-            'spotify': ['spotify'],
-            'netflix': ['netflix'],
-            'paypal': ['paypal'],
-            'coinbase': ['coinbase'],
-            'binance': ['binance'],
-        }
-
-        # Check sender domain
-        sender_lower = sender.lower()
-        subject_lower = subject.lower()
-
-        for service, patterns in service_patterns.items():
-            for pattern in patterns:
-                if pattern in sender_lower or pattern in subject_lower:
-                    return service.title()
-
-        # Extract domain from sender
-        if '@' in sender:
-            domain = sender.split('@')[1].lower()
-            # Remove common email suffixes
-            domain = domain.replace('.com', '').replace('.org', '').replace('.net', '')
-            if domain and len(domain) > 2:
-                return domain.title()
-
-        return None
+        return self.service_resolver.resolve(sender, subject)
 
     async def get_status(self) -> Dict[str, Any]:
         """
@@ -245,14 +585,32 @@ class MFARelay:
         Returns:
             Dictionary containing service status
         """
-        active_monitors = sum(1 for task in self.monitoring_tasks if not task.done())
+        # Live IDLE tasks plus accounts on the running scheduler
+        active_monitors = sum(1 for task in self.monitoring_tasks.values() if not task.done())
+        if self.scheduler_task and not self.scheduler_task.done():
+            active_monitors += len(self.scheduler)
 
         return {
             "running": self.running,
             "email_accounts": len(self.email_monitors),
             "active_monitors": active_monitors,
             "check_interval": self.check_interval,
-            "total_codes_processed": len(self.last_code_times),
-            "uptime": "N/A",  # Would track actual uptime
+            "scheduler": self.scheduler.get_stats(),
+            "poll_intervals": self.scheduler.get_intervals(),
+            "circuit_breakers": {
+                monitor.name: self.breakers[monitor.account_key].get_stats()
+                for monitor in self.email_monitors if monitor.account_key in self.breakers
+            },
+            "total_codes_processed": self.codes_relayed,
+            "dedup_entries": len(self.dedup),
+            "fetch_stats": {monitor.name: monitor.get_fetch_stats() for monitor in self.email_monitors},
+            "connection_stats": {monitor.name: monitor.get_connection_stats() for monitor in self.email_monitors},
+            "tls_sessions": get_session_stats(),
+            "service_cache": self.service_resolver.get_stats(),
+            "sms_queue": self.dispatcher.get_stats(),
+            "sms_transport": self.twilio_client.get_transport_stats(),
+            "sms_quota": self.twilio_client.quota.get_stats() if self.twilio_client.quota else None,
+            "code_log": self.code_log.get_stats() if self.code_log else None,
+            "uptime": round(time.monotonic() - self.started_at, 1) if self.started_at else None,
             "last_check": datetime.now().isoformat()
         }
\ No newline at end of file
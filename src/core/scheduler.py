@@ -0,0 +1,261 @@
+"""
+Polling Scheduler for MFARelay
+One heap-ordered timer dispatching due account polls to a bounded worker pool,
+with per-account intervals that adapt to MFA traffic.
+"""
+
+import asyncio
+import heapq
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.email.email_monitor import EmailMonitor
+
+
+@dataclass
+class AdaptiveInterval:
+    """
+    Polling interval for one account.
+
+    A poll that finds codes drops the interval to ``min_interval`` and keeps
+    it there for ``hot_window`` seconds, since MFA mail tends to arrive in
+    bursts (resends, several logins). Quiet polls then back off
+    geometrically from the account's base interval up to ``max_interval``.
+    """
+    base: float
+    min_interval: float
+    max_interval: float
+    backoff: float = 1.5
+    hot_window: float = 300.0
+    current: float = 0.0
+    hot_until: float = 0.0
+    burst_interval: float = 0.0
+    burst_until: float = 0.0
+
+    def __post_init__(self):
+        self.min_interval = min(self.min_interval, self.base)
+        self.max_interval = max(self.max_interval, self.base)
+        self.current = self.base
+
+    def burst(self, interval: float, until: float):
+        """Poll every ``interval`` seconds until ``until`` (loop time), then revert."""
+        self.burst_interval = interval
+        self.burst_until = until
+        self.current = interval
+
+    def record(self, codes_found: int, now: float) -> float:
+        """Update the interval after a successful poll and return it."""
+        if codes_found:
+            self.hot_until = now + self.hot_window
+        if now < self.burst_until:
+            self.current = self.burst_interval
+        elif now < self.hot_until:
+            self.current = self.min_interval
+        else:
+            self.current = min(self.max_interval, max(self.base, self.current * self.backoff))
+        return self.current
+
+    def record_error(self) -> float:
+        """Back off after a failed poll and return the new interval."""
+        self.current = min(self.max_interval, max(self.base, self.current * self.backoff))
+        return self.current
+
+
+@dataclass
+class _ScheduledAccount:
+    monitor: EmailMonitor
+    interval: AdaptiveInterval
+    generation: int = 0
+    polls: int = 0
+    errors: int = 0
+    in_flight: bool = False
+
+
+class PollScheduler:
+    """
+    Central scheduler for polling accounts.
+
+    Replaces one sleeping task per account with a single heap of due times.
+    Due accounts go to a queue drained by ``workers`` tasks, so thousands of
+    accounts cost one timer and a fixed number of coroutines.
+    """
+
+    def __init__(self, poll: Callable[[EmailMonitor], Awaitable[int]], workers: int = 5,
+                 min_interval: float = 5.0, max_interval: float = 300.0, backoff: float = 1.5,
+                 hot_window: float = 300.0, logger: Optional[logging.Logger] = None):
+        """
+        Create the scheduler (it runs inside run()).
+
+        Args:
+            poll: Coroutine polling one account, returning the number of codes found;
+                an exception with a ``retry_after`` attribute sets the retry delay
+            workers: Maximum concurrent polls
+            min_interval: Interval used right after MFA traffic
+            max_interval: Upper bound for quiet accounts
+            backoff: Interval multiplier per quiet poll
+            hot_window: Seconds to keep polling fast after codes are found
+            logger: Logger instance
+        """
+        self.poll = poll
+        self.worker_count = max(1, workers)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.hot_window = hot_window
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._accounts: Dict[str, _ScheduledAccount] = {}
+        self._heap: List[Tuple[float, int, str, int]] = []
+        self._sequence = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.polls = 0
+        self.errors = 0
+
+    def add(self, monitor: EmailMonitor, base_interval: float, delay: float = 0.0):
+        """
+        Schedule an account for polling.
+
+        Args:
+            monitor: Connected email monitor
+            base_interval: The account's configured check interval
+            delay: Seconds until the first poll
+        """
+        key = monitor.account_key
+        previous = self._accounts.get(key)
+        self._accounts[key] = _ScheduledAccount(
+            monitor=monitor,
+            interval=AdaptiveInterval(
+                base=base_interval,
+                min_interval=self.min_interval,
+                max_interval=self.max_interval,
+                backoff=self.backoff,
+                hot_window=self.hot_window
+            ),
+            generation=previous.generation + 1 if previous else 0
+        )
+        self._schedule(key, delay)
+
+    def burst(self, monitor: EmailMonitor, interval: float, window: float) -> bool:
+        """
+        Poll an account every ``interval`` seconds for the next ``window`` seconds.
+
+        The account is polled immediately unless a poll is already running,
+        in which case the burst interval applies as soon as it finishes.
+
+        Args:
+            monitor: Scheduled email monitor
+            interval: Burst polling interval in seconds
+            window: Burst duration in seconds
+
+        Returns:
+            bool: False if the account is not on the scheduler
+        """
+        account = self._accounts.get(monitor.account_key)
+        if account is None:
+            return False
+        account.interval.burst(interval, asyncio.get_event_loop().time() + window)
+        if not account.in_flight:
+            # Invalidate the pending entry and poll now
+            account.generation += 1
+            self._schedule(monitor.account_key, 0)
+        return True
+
+    def remove(self, monitor: EmailMonitor):
+        """Stop polling an account; its pending heap entry is discarded lazily."""
+        self._accounts.pop(monitor.account_key, None)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def _schedule(self, key: str, delay: float):
+        account = self._accounts.get(key)
+        if account is None:
+            return
+        due = asyncio.get_event_loop().time() + delay
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, key, account.generation))
+        if self._wakeup and self._heap[0][1] == self._sequence:
+            self._wakeup.set()
+
+    async def run(self):
+        """Dispatch due polls until cancelled."""
+        loop = asyncio.get_event_loop()
+        self._queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self.logger.info(f"Polling scheduler started with {self.worker_count} workers")
+
+        try:
+            while True:
+                now = loop.time()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, key, generation = heapq.heappop(self._heap)
+                    account = self._accounts.get(key)
+                    if account is not None and account.generation == generation:
+                        self._queue.put_nowait((key, generation))
+
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - now if self._heap else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            key, generation = await self._queue.get()
+            account = self._accounts.get(key)
+            if account is None or account.generation != generation:
+                continue
+
+            account.polls += 1
+            account.in_flight = True
+            self.polls += 1
+            try:
+                found = await self.poll(account.monitor)
+                interval = account.interval.record(found, loop.time())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                account.errors += 1
+                self.errors += 1
+                # The poll may dictate its own retry delay (circuit breaker
+                # backoff); otherwise back off the polling interval
+                retry_after = getattr(e, 'retry_after', None)
+                interval = retry_after if retry_after is not None else account.interval.record_error()
+                self.logger.debug(f"Poll failed for {account.monitor.name}, retrying in {interval:.1f}s: {e}")
+            finally:
+                account.in_flight = False
+
+            # The account may have been removed or re-added while polling
+            if self._accounts.get(key) is account:
+                self._schedule(key, interval)
+
+    def get_intervals(self) -> Dict[str, float]:
+        """Current polling interval (seconds) for each account, keyed by account name."""
+        return {account.monitor.name: account.interval.current for account in self._accounts.values()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics.
+
+        Returns:
+            Dict[str, Any]: Account count, queue depth, poll/error totals and interval range
+        """
+        intervals = [account.interval.current for account in self._accounts.values()]
+        return {
+            "accounts": len(self._accounts),
+            "due": self._queue.qsize() if self._queue else 0,
+            "polls": self.polls,
+            "errors": self.errors,
+            "min_interval": min(intervals) if intervals else None,
+            "max_interval": max(intervals) if intervals else None,
+        }
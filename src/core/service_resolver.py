@@ -0,0 +1,178 @@
+"""
+Service Resolver for MFARelay
+Maps email senders to service names via a reversed-label domain trie with an LRU cache.
+"""
+
+import logging
+from collections import OrderedDict
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+from src.email.mfa_extractor import get_default_extractor, service_display_name
+
+# Sender domains (and all their subdomains) that identify a service
+DEFAULT_SERVICE_DOMAINS: Dict[str, str] = {
+    'google.com': 'google',
+    'gmail.com': 'google',
+    'microsoft.com': 'microsoft',
+    'outlook.com': 'microsoft',
+    'live.com': 'microsoft',
+    'hotmail.com': 'microsoft',
+    'azure.com': 'azure',
+    'github.com': 'github',
+    'aws': 'aws',
+    'amazonaws.com': 'aws',
+    'amazon.com': 'aws',
+    'apple.com': 'apple',
+    'icloud.com': 'apple',
+    'facebook.com': 'facebook',
+    'facebookmail.com': 'facebook',
+    'meta.com': 'facebook',
+    'twitter.com': 'twitter',
+    'x.com': 'twitter',
+    'linkedin.com': 'linkedin',
+    'discord.com': 'discord',
+    'slack.com': 'slack',
+    'dropbox.com': 'dropbox',
+    'spotify.com': 'spotify',
+    'netflix.com': 'netflix',
+    'paypal.com': 'paypal',
+    'coinbase.com': 'coinbase',
+    'binance.com': 'binance',
+}
+
+# Multi-label public suffixes, so "mail.shop.co.uk" resolves to "Shop"
+MULTI_LABEL_SUFFIXES = frozenset({
+    'co.uk', 'org.uk', 'ac.uk', 'gov.uk', 'com.au', 'net.au', 'org.au',
+    'co.nz', 'co.jp', 'ne.jp', 'com.br', 'com.mx', 'co.in', 'co.za',
+    'com.cn', 'com.sg', 'com.hk', 'com.tr', 'co.kr',
+})
+
+_SERVICE_KEY = '$'
+
+
+class ServiceResolver:
+    """
+    Resolves a sender/subject pair to a display service name.
+
+    Resolution order: the most specific matching domain suffix in the trie,
+    then service aliases in the sender, then in the subject, and finally the
+    sender's registrable domain name. Sender-only results are cached, so
+    repeat senders cost a single dictionary lookup.
+    """
+
+    def __init__(self, extra_domains: Optional[Dict[str, str]] = None, cache_size: int = 4096):
+        """
+        Build the domain index.
+
+        Args:
+            extra_domains: Additional domain -> service name entries (from config)
+            cache_size: Maximum number of distinct senders kept in the LRU cache
+        """
+        self.logger = logging.getLogger(__name__)
+        self.extractor = get_default_extractor()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[Optional[str], Optional[str]]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._trie: Dict[str, dict] = {}
+        for domain, service in DEFAULT_SERVICE_DOMAINS.items():
+            self.add_domain(domain, service_display_name(service))
+        for domain, service in (extra_domains or {}).items():
+            self.add_domain(domain, service)
+
+    def add_domain(self, domain: str, service: str):
+        """
+        Map a domain and its subdomains to a service.
+
+        Args:
+            domain: Domain suffix such as "github.com"
+            service: Display name returned for matching senders
+        """
+        node = self._trie
+        for label in reversed(domain.lower().strip('.').split('.')):
+            node = node.setdefault(label, {})
+        node[_SERVICE_KEY] = service
+        self._cache.clear()
+
+    def resolve(self, sender: str, subject: str = '') -> Optional[str]:
+        """
+        Resolve the service name for an email.
+
+        Args:
+            sender: Email sender (address or "Name <address>")
+            subject: Email subject line
+
+        Returns:
+            Service name or None
+        """
+        service, fallback = self._resolve_sender(sender)
+        if service:
+            return service
+        return self.extractor.match_service(subject) or fallback
+
+    def _resolve_sender(self, sender: str) -> Tuple[Optional[str], Optional[str]]:
+        """Cached sender lookup returning (service, registrable-domain fallback)."""
+        key = sender.lower()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached
+
+        self.cache_misses += 1
+        labels = self._domain_labels(key)
+        result = (
+            self._lookup_trie(labels) or self.extractor.match_service(key),
+            self._registrable_name(labels),
+        )
+
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _domain_labels(sender: str) -> List[str]:
+        """Return the sender's domain labels, most significant (TLD) first."""
+        address = parseaddr(sender)[1] or sender
+        if '@' not in address:
+            return []
+        domain = address.rsplit('@', 1)[1].strip().strip('.>')
+        return list(reversed(domain.split('.'))) if domain else []
+
+    def _lookup_trie(self, labels: List[str]) -> Optional[str]:
+        """Walk the trie and return the service of the longest matching suffix."""
+        node = self._trie
+        found = None
+        for label in labels:
+            node = node.get(label)
+            if node is None:
+                break
+            found = node.get(_SERVICE_KEY, found)
+        return found
+
+    @staticmethod
+    def _registrable_name(labels: List[str]) -> Optional[str]:
+        """Name part of the registrable domain, e.g. "Company" for mail.company.co.uk."""
+        if len(labels) < 2:
+            return None
+        index = 2 if len(labels) > 2 and f"{labels[1]}.{labels[0]}" in MULTI_LABEL_SUFFIXES else 1
+        name = labels[index] if index < len(labels) else None
+        if name and len(name) > 2:
+            return name.title()
+        return None
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, int]: Cache size, hits and misses
+        """
+        return {
+            "cached_senders": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
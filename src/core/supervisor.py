@@ -0,0 +1,405 @@
+"""
+Shard Supervisor for MFARelay
+Runs email monitoring in N worker processes, sharded by a stable hash of the
+account id, and funnels every detection back to one SMS dispatch stage.
+"""
+
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from src.core.account_source import create_account_source
+from src.core.circuit_breaker import CLOSED
+from src.core.mfa_relay import MFARelay
+from src.email.email_monitor import EmailMonitor
+from src.email.sync_state import SyncStateStore
+from src.sms.twilio_client import TwilioClient
+from src.utils.logger import setup_logger, shutdown_logging
+from src.utils.tracing import configure_tracing, get_tracer
+
+
+def account_id(account_config: Dict[str, Any]) -> str:
+    """
+    Stable identifier for an account config.
+
+    Uses the database id when present, else the same user@host/folder key
+    EmailMonitor checkpoints under.
+    """
+    if account_config.get('id'):
+        return str(account_config['id'])
+    return f"{account_config['username']}@{account_config['host']}/{account_config.get('folder', 'INBOX')}"
+
+
+def shard_for(key: str, shards: int) -> int:
+    """
+    Pick the shard for an account with rendezvous (highest random weight) hashing.
+
+    Every account independently ranks the shards, so adding or removing an
+    account never moves any other account, and a hash of the id (not
+    Python's randomized hash()) keeps assignments stable across restarts.
+
+    Args:
+        key: Account id
+        shards: Number of worker processes
+
+    Returns:
+        int: Shard index in [0, shards)
+    """
+    def weight(shard: int) -> bytes:
+        return hashlib.blake2b(f"{shard}:{key}".encode('utf-8'), digest_size=8).digest()
+
+    return max(range(shards), key=weight)
+
+
+class _ShardRelay(MFARelay):
+    """MFARelay inside a worker process: detections go to the supervisor instead of SMS."""
+
+    records_codes = False
+
+    def __init__(self, config: Dict[str, Any], shard: int, events, logger: logging.Logger):
+        super().__init__(config, [], None, logger)
+        self.shard = shard
+        self.events = events
+        self.codes_found = 0
+
+    async def _process_mfa_code(self, code_data: Dict[str, str], account_name: str):
+        self.codes_found += 1
+        self.events.put(('code', self.shard, dict(code_data), account_name))
+
+    def shard_stats(self) -> Dict[str, Any]:
+        return {
+            "accounts": len(self.email_monitors),
+            "idle_accounts": sum(1 for task in self.monitoring_tasks.values() if not task.done()),
+            "codes_found": self.codes_found,
+            "scheduler": self.scheduler.get_stats(),
+            "open_circuits": sum(1 for breaker in self.breakers.values() if breaker.state != CLOSED),
+        }
+
+
+def _shard_main(shard: int, config: Dict[str, Any], accounts: List[Dict[str, Any]], events, control):
+    """Worker process entry point."""
+    # The supervisor owns shutdown; ignore the terminal's Ctrl-C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Workers log to their own stdout (the supervisor owns the rotating file)
+    log_config = config.get('logging', {})
+    setup_logger(
+        name='',
+        level=log_config.get('level', 'INFO'),
+        json_format=log_config.get('format', 'text') == 'json',
+        use_queue=log_config.get('queue', False),
+        queue_size=log_config.get('queue_size', 10000),
+        debug_rate_limit=log_config.get('debug_rate_limit', 0),
+        fmt=f'%(asctime)s - shard{shard} - %(name)s - %(levelname)s - %(message)s',
+        fields={'shard': shard}
+    )
+    configure_tracing(config.get('tracing', {}))
+    try:
+        asyncio.run(_run_shard(shard, config, accounts, events, control))
+    finally:
+        get_tracer().close()
+        shutdown_logging()
+
+
+async def _run_shard(shard: int, config: Dict[str, Any], accounts: List[Dict[str, Any]], events, control):
+    logger = logging.getLogger(f"mfarelay.shard{shard}")
+    loop = asyncio.get_running_loop()
+    monitoring_config = config.get('email_monitoring', {})
+    sync_state = SyncStateStore(monitoring_config.get('state_file', 'data/imap_state.db'))
+    relay = _ShardRelay(config, shard, events, logger)
+    account_keys: Dict[str, str] = {}  # account id -> monitor account key
+    # Database accounts arrive without passwords; each worker reads its own on connect
+    account_source = create_account_source(config.get('account_source', {}), logger)
+    credentials = account_source.password if account_source else None
+    connect_slots = asyncio.Semaphore(monitoring_config.get('max_concurrent_connects', 20))
+
+    async def add_account(account_config: Dict[str, Any]):
+        monitor = EmailMonitor(config=account_config, sync_state=sync_state, credentials=credentials)
+        # Database accounts connect (and read their password) on their first check
+        if account_source is None:
+            async with connect_slots:
+                connected = await monitor.connect()
+            if not connected:
+                logger.error(f"Failed to connect to {monitor.name}; will retry on its next check")
+        account_keys[account_id(account_config)] = monitor.account_key
+        await relay.add_monitor(monitor)
+
+    async def handle(message):
+        command = message[0]
+        if command == 'add':
+            await add_account(message[1])
+        elif command == 'remove':
+            key = account_keys.pop(account_id(message[1]), None)
+            if key:
+                await relay.remove_monitor(key)
+        elif command == 'expect_code':
+            relay.expect_code(message[1], message[2])
+        elif command == 'stop':
+            await relay.stop()
+
+    def read_control():
+        # Blocking reads on a thread; commands run on the event loop
+        while True:
+            message = control.get()
+            asyncio.run_coroutine_threadsafe(handle(message), loop)
+            if message[0] == 'stop':
+                return
+
+    async def report_stats():
+        while True:
+            events.put(('stats', shard, relay.shard_stats()))
+            await asyncio.sleep(monitoring_config.get('shard_stats_interval', 10))
+
+    await asyncio.gather(*(add_account(account) for account in accounts))
+    events.put(('ready', shard, len(relay.email_monitors)))
+    threading.Thread(target=read_control, name=f'shard{shard}-control', daemon=True).start()
+    reporter = asyncio.create_task(report_stats())
+    try:
+        await relay.start()
+    finally:
+        reporter.cancel()
+        sync_state.close()
+        if account_source:
+            account_source.db.close()
+
+
+class _Shard:
+    """Supervisor-side handle for one worker process."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.control = None
+        self.accounts: Dict[str, Dict[str, Any]] = {}
+        self.restarts = 0
+        self.next_restart = 0.0
+        self.ready = False
+        self.stats: Dict[str, Any] = {}
+
+
+class ShardSupervisor:
+    """
+    Supervisor running email monitors in worker processes.
+
+    The parent keeps one MFARelay with no monitors of its own: its dedup
+    store, service resolver and SMS dispatcher handle every detection the
+    workers report, so duplicate suppression stays global.
+    """
+
+    def __init__(self, config: Dict[str, Any], accounts: List[Dict[str, Any]],
+                 twilio_client: TwilioClient, logger: logging.Logger, workers: int = 2):
+        """
+        Initialize the supervisor.
+
+        Args:
+            config: Application configuration (passed to every worker)
+            accounts: Email account configs to shard
+            twilio_client: Twilio SMS client used by the dispatch stage
+            logger: Logger instance
+            workers: Number of worker processes
+        """
+        self.config = config
+        self.logger = logger
+        self.worker_count = max(1, workers)
+        self.relay = MFARelay(config, [], twilio_client, logger)
+        self.metrics = self.relay.metrics
+        self.accounts: Dict[str, Dict[str, Any]] = {account_id(a): a for a in accounts}
+        self.shards = [_Shard(index) for index in range(self.worker_count)]
+        for key, account in self.accounts.items():
+            self.shards[shard_for(key, self.worker_count)].accounts[key] = account
+
+        self._mp = multiprocessing.get_context('spawn')
+        self._events = self._mp.Queue()
+        self._running = False
+        self._reader: Optional[threading.Thread] = None
+        self._relay_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._code_tasks: Set[asyncio.Task] = set()  # Detections awaiting dedup and enqueue
+
+        self.burst_window = self.relay.burst_window
+        self.burst_max_window = self.relay.burst_max_window
+
+        self.detections = 0
+        self.restart_backoff = config.get('email_monitoring', {}).get('shard_restart_backoff', 1.0)
+
+    async def start(self):
+        """Start the dispatch stage and worker processes, then supervise until stopped."""
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self._relay_task = asyncio.create_task(self.relay.start())
+        self._reader = threading.Thread(target=self._read_events, name='shard-events', daemon=True)
+        self._reader.start()
+
+        for shard in self.shards:
+            self._spawn(shard)
+        self.logger.info(f"Started {self.worker_count} monitor workers for {len(self.accounts)} accounts")
+
+        try:
+            while self._running:
+                self._restart_dead_workers()
+                await asyncio.sleep(1)
+        finally:
+            await self.stop()
+
+    async def stop(self, timeout: float = 10.0):
+        """Stop workers (gracefully, then forcibly) and the dispatch stage."""
+        if not self._running:
+            return
+        self._running = False
+
+        for shard in self.shards:
+            if shard.process and shard.process.is_alive():
+                shard.control.put(('stop',))
+        deadline = time.monotonic() + timeout
+        for shard in self.shards:
+            if shard.process:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, shard.process.join, max(0.0, deadline - time.monotonic())
+                )
+                if shard.process.is_alive():
+                    self.logger.warning(f"Worker {shard.index} did not stop, terminating")
+                    shard.process.terminate()
+                    shard.process.join(1)
+
+        self._events.put(('exit',))
+        if self._code_tasks:
+            # Detections still being deduplicated reach the queue before it drains
+            await asyncio.gather(*self._code_tasks, return_exceptions=True)
+        await self.relay.stop()
+        if self._relay_task:
+            await asyncio.gather(self._relay_task, return_exceptions=True)
+        self.logger.info("Shard supervisor stopped")
+
+    async def set_accounts(self, accounts: List[Dict[str, Any]]):
+        """
+        Rebalance onto a new account list.
+
+        Only added and removed accounts are sent to their shards; every other
+        account keeps its worker and connection.
+
+        Args:
+            accounts: Complete list of account configs
+        """
+        wanted = {account_id(a): a for a in accounts}
+        for key in self.accounts.keys() - wanted.keys():
+            await self.remove_account(key)
+        for key, account in wanted.items():
+            if self.accounts.get(key) != account:
+                await self.add_account(account)
+
+    async def add_account(self, account: Dict[str, Any]):
+        """Assign an account (new or changed) to its shard."""
+        key = account_id(account)
+        shard = self.shards[shard_for(key, self.worker_count)]
+        self.accounts[key] = account
+        shard.accounts[key] = account
+        if shard.process and shard.process.is_alive():
+            shard.control.put(('add', account))
+
+    async def remove_account(self, key: str):
+        """Stop monitoring an account by id."""
+        account = self.accounts.pop(key, None)
+        if account is None:
+            return
+        shard = self.shards[shard_for(key, self.worker_count)]
+        shard.accounts.pop(key, None)
+        if shard.process and shard.process.is_alive():
+            shard.control.put(('remove', account))
+
+    def expect_code(self, user_id: Optional[str] = None, window: Optional[float] = None) -> int:
+        """Forward burst mode to every worker; returns the number of matching accounts."""
+        for shard in self.shards:
+            if shard.process and shard.process.is_alive():
+                shard.control.put(('expect_code', user_id, window))
+        return sum(
+            1 for account in self.accounts.values()
+            if user_id is None or account.get('user_id') == user_id
+        )
+
+    def _spawn(self, shard: _Shard):
+        shard.control = self._mp.Queue()
+        shard.ready = False
+        shard.process = self._mp.Process(
+            target=_shard_main,
+            args=(shard.index, self.config, list(shard.accounts.values()), self._events, shard.control),
+            name=f'mfarelay-shard{shard.index}',
+            daemon=True
+        )
+        shard.process.start()
+
+    def _restart_dead_workers(self):
+        now = time.monotonic()
+        for shard in self.shards:
+            if shard.process is None or shard.process.is_alive():
+                continue
+            if shard.next_restart == 0.0:
+                # Back off exponentially if a worker keeps crashing
+                delay = min(60.0, self.restart_backoff * (2 ** min(shard.restarts, 6)))
+                shard.next_restart = now + delay
+                self.logger.error(
+                    f"Worker {shard.index} exited with code {shard.process.exitcode}, restarting in {delay:.1f}s"
+                )
+            elif now >= shard.next_restart:
+                shard.restarts += 1
+                shard.next_restart = 0.0
+                self._spawn(shard)
+
+    def _read_events(self):
+        """Forward worker events to the event loop (runs on a thread)."""
+        while True:
+            try:
+                event = self._events.get(timeout=1)
+            except queue.Empty:
+                if not self._running:
+                    return
+                continue
+            if event[0] == 'exit':
+                return
+            self._loop.call_soon_threadsafe(self._handle_event, event)
+
+    def _handle_event(self, event):
+        kind, index = event[0], event[1]
+        shard = self.shards[index]
+        if kind == 'code':
+            self.detections += 1
+            task = asyncio.create_task(self.relay._process_mfa_code(event[2], event[3]))
+            self._code_tasks.add(task)
+            task.add_done_callback(self._code_tasks.discard)
+        elif kind == 'stats':
+            shard.stats = event[2]
+        elif kind == 'ready':
+            shard.ready = True
+            self.logger.info(f"Worker {index} monitoring {event[2]} accounts")
+
+    async def get_status(self) -> Dict[str, Any]:
+        """
+        Get supervisor status: the dispatch stage plus per-worker state.
+
+        Returns:
+            Dictionary containing service status
+        """
+        status = await self.relay.get_status()
+        status.update({
+            "email_accounts": len(self.accounts),
+            "active_monitors": sum(shard.stats.get("accounts", 0) for shard in self.shards
+                                   if shard.process and shard.process.is_alive()),
+            "detections": self.detections,
+            "workers": [
+                {
+                    "index": shard.index,
+                    "pid": shard.process.pid if shard.process else None,
+                    "alive": bool(shard.process and shard.process.is_alive()),
+                    "ready": shard.ready,
+                    "accounts": len(shard.accounts),
+                    "restarts": shard.restarts,
+                    "stats": shard.stats,
+                }
+                for shard in self.shards
+            ],
+        })
+        return status
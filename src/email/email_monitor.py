@@ -1,110 +1,436 @@
 """
 Email Monitor for MFARelay
-Lightweight IMAP-based email monitoring using message flags for state tracking.
+Lightweight IMAP-based email monitoring using UID checkpoints for state tracking.
 """
 
-import imaplib
 import email
+from email.header import decode_header, make_header
+from email.message import Message
 import re
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from datetime import datetime
+from html import unescape
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Tuple, Union
 import asyncio
 import ssl
+import time
+
+from src.email.imap_client import AsyncIMAPClient, ImaplibClient, IMAPAbort, IMAPError, create_imap_client
+from src.email.mfa_extractor import get_default_extractor
+from src.email.imap_parser import (
+    decode_text_part, find_section, find_text_part, format_sequence_set, parse_fetch_response
+)
+from src.email.sync_state import SyncStateStore
+from src.email.tls import get_session_context
+from src.utils.metrics import REGISTRY, SIZE_BUCKETS
+from src.utils.tracing import current_context, get_tracer
+
+# Headers fetched in the prefilter stage, before any body is downloaded
+PREFILTER_HEADERS = 'FROM SUBJECT DATE MESSAGE-ID'
+
+FETCH_BYTES = REGISTRY.counter(
+    'mfarelay_fetch_bytes_total', 'Bytes fetched from IMAP by stage', ('account', 'stage')
+)
+MESSAGE_BYTES = REGISTRY.histogram(
+    'mfarelay_message_body_bytes', 'Size of fetched candidate message bodies', buckets=SIZE_BUCKETS
+)
+PARSE_SECONDS = REGISTRY.histogram(
+    'mfarelay_parse_seconds', 'MIME parsing and text extraction time per message'
+)
+EXTRACTION_SECONDS = REGISTRY.histogram(
+    'mfarelay_extraction_seconds', 'MFA code extraction time per message'
+)
+
+_SCRIPT_STYLE_RE = re.compile(r'(?is)<(script|style)\b.*?</\1>')
+_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 
 class EmailMonitor:
-    """Lightweight email monitor that uses IMAP flags instead of database for state tracking."""
+    """Lightweight email monitor that tracks processed mail with UID checkpoints."""
     
-    def __init__(self, config: Dict[str, str]):
+    def __init__(self, config: Dict[str, str], sync_state: Optional[SyncStateStore] = None,
+                 credentials: Optional[Callable[[Dict[str, Any]], Awaitable[str]]] = None):
         """
         Initialize email monitor with account configuration.
         
         Args:
             config: Dictionary containing email account configuration
+            sync_state: Shared checkpoint store (in-memory checkpoints if omitted)
+            credentials: Coroutine returning the password for a config without
+                one, called on first connect (e.g. DatabaseAccountSource.password)
         """
         self.config = config
         self.name = config.get('name', 'Unknown')
+        self.user_id = config.get('user_id')  # Owning user (multi-tenant deployments)
         self.host = config['host']
         self.port = int(config['port'])
         self.username = config['username']
-        self.password = config['password']
+        self.password = config.get('password')
+        self.credentials = credentials
         self.use_ssl = config.get('ssl', True)
         self.folder = config.get('folder', 'INBOX')
         
-        self.imap_client: Optional[imaplib.IMAP4] = None
-        self.logger = logging.getLogger(f"{__name__}.{self.name}")
+        # IMAP IDLE (RFC 2177) push mode; servers drop IDLE after ~29 minutes,
+        # so the command is re-issued well before that
+        self.use_idle = config.get('idle', True)
+        self.idle_timeout = int(config.get('idle_timeout', 25 * 60))
+        self.idle_supported = False
+        self._idle_wake = asyncio.Event()  # Ends the current IDLE wait early (burst mode)
         
-        # MFA code patterns - optimized for speed
-        self.mfa_patterns = [
-            # Standard numeric codes (most common)
-            r'\b(\d{4,8})\b',
-            # Alphanumeric codes
-            r'\b([A-Z0-9]{4,8})\b',
-            # Specific service patterns for better accuracy
-            r'code(?:\s*:?\s*)(\d{4,8})',
-            r'verification(?:\s*:?\s*)(\d{4,8})',
-            r'authenticate(?:\s*:?\s*)(\d{4,8})',
-            r'login(?:\s*:?\s*)(\d{4,8})',
-        ]
+        # Base polling interval for this account when IDLE is unavailable
+        # (falls back to email_monitoring.check_interval when unset)
+        check_interval = config.get('check_interval_seconds')
+        self.check_interval = float(check_interval) if check_interval else None
         
-        # Service keywords that indicate MFA emails
-        self.mfa_keywords = [
-            'verification', 'authenticate', 'login code', 'security code',
-            'two-factor', '2fa', 'mfa', 'access code', 'signin code'
-        ]
+        # IMAP engine: native asyncio streams by default, threaded imaplib as fallback
+        self.engine = config.get('engine', 'asyncio')
+        self.timeout = float(config.get('timeout', 30))
+        
+        # Warm connections: TLS sessions are resumed on reconnect, idle sessions
+        # get a NOOP before NAT or server timeouts drop them, and high-priority
+        # accounts can keep a logged-in standby session to fail over to
+        self.tls_resumption = config.get('tls_resumption', True)
+        self.ca_file = config.get('ca_file')
+        self.keepalive_interval = float(config.get('keepalive_interval', 240))
+        self.standby = config.get('standby', False)
+        self.last_activity = 0.0
+        self._standby_client: Optional[Union[AsyncIMAPClient, ImaplibClient]] = None
+        self._standby_activity = 0.0
+        self._standby_task: Optional[asyncio.Task] = None
+        self._session_lock = asyncio.Lock()
+        self.connection_stats = {
+            'connects': 0,
+            'tls_resumed': 0,
+            'standby_promotions': 0,
+            'keepalives': 0,
+            'last_connect_ms': None,
+        }
+        
+        # Incremental sync: only UIDs above the checkpoint are fetched each poll.
+        # Flags are left untouched unless mark_seen is explicitly enabled.
+        self.sync_state = sync_state or SyncStateStore(path=None)
+        self.account_key = f"{self.username}@{self.host}/{self.folder}"
+        self.mark_seen = config.get('mark_seen', False)
+        self.fetch_batch_size = int(config.get('fetch_batch_size', 50))
+        
+        # Body download: "full" fetches the whole message; "text_part" fetches
+        # BODYSTRUCTURE with the headers and then only the text/plain (or
+        # text/html) part, capped at max_part_bytes (0 for no cap)
+        self.body_fetch = config.get('body_fetch', 'full')
+        if self.body_fetch not in ('full', 'text_part'):
+            raise ValueError(f"Unknown body_fetch mode for {self.name}: {self.body_fetch}")
+        self.max_part_bytes = int(config.get('max_part_bytes', 32768))
+        self.uidvalidity: Optional[int] = None
+        self.last_uid = 0
+        
+        # Two-stage fetch counters (headers for every new message, bodies for candidates)
+        self.fetch_stats = {
+            'messages_scanned': 0,
+            'bodies_fetched': 0,
+            'header_bytes': 0,
+            'body_bytes': 0,
+            'bytes_saved': 0,
+            'text_parts_fetched': 0,
+        }
+        self._header_bytes_metric = FETCH_BYTES.labels(self.name, 'header')
+        self._body_bytes_metric = FETCH_BYTES.labels(self.name, 'body')
+        
+        self.imap_client: Optional[Union[AsyncIMAPClient, ImaplibClient]] = None
+        self.logger = logging.getLogger(f"{__name__}.{self.name}")
+        
+        # Compiled extraction engine shared by all monitors
+        self.extractor = get_default_extractor()
     
     async def connect(self) -> bool:
         """
         Establish connection to email server.
         
+        A warm standby session is promoted if one is available; otherwise a
+        new session is opened, resuming the host's cached TLS session.
+        
         Returns:
             bool: True if connection successful, False otherwise
         """
+        started = time.monotonic()
         try:
-            # Create IMAP connection
-            if self.use_ssl:
-                self.imap_client = imaplib.IMAP4_SSL(self.host, self.port)
-            else:
-                self.imap_client = imaplib.IMAP4(self.host, self.port)
+            self.imap_client = await self._promote_standby() or await self._open_session()
             
-            # Login to account
-            self.imap_client.login(self.username, self.password)
+            await self._load_checkpoint()
             
-            # Select folder
-            status, messages = self.imap_client.select(self.folder)
-            if status != 'OK':
-                self.logger.error(f"Failed to select folder {self.folder}")
-                return False
+            # Capabilities may change after authentication, so re-query them
+            self.idle_supported = False
+            if self.use_idle:
+                await self.imap_client.capability()
+                self.idle_supported = 'IDLE' in self.imap_client.capabilities
+                if not self.idle_supported:
+                    self.logger.info(f"{self.name} does not support IDLE, falling back to polling")
             
+            self.last_activity = time.monotonic()
+            self.connection_stats['connects'] += 1
+            self.connection_stats['last_connect_ms'] = round((self.last_activity - started) * 1000, 1)
             self.logger.info(f"Connected to {self.name} successfully")
+            self._warm_standby()
             return True
             
         except Exception as e:
             self.logger.error(f"Failed to connect to {self.name}: {e}")
             if self.imap_client:
                 try:
-                    self.imap_client.logout()
+                    await self.imap_client.logout()
                 except:
                     pass
                 self.imap_client = None
             return False
     
-    async def disconnect(self):
-        """Close connection to email server."""
+    def _ssl_context(self) -> Optional[ssl.SSLContext]:
+        if not self.use_ssl:
+            return None
+        if self.tls_resumption:
+            return get_session_context(self.ca_file)
+        return ssl.create_default_context(cafile=self.ca_file) if self.ca_file else None
+    
+    async def _open_session(self) -> Union[AsyncIMAPClient, ImaplibClient]:
+        """Connect, log in and select the folder on a new IMAP session."""
+        ssl_context = self._ssl_context()
+        client = create_imap_client(
+            self.engine, self.host, self.port, use_ssl=self.use_ssl,
+            ssl_context=ssl_context, timeout=self.timeout
+        )
+        try:
+            await client.connect()
+            if hasattr(ssl_context, 'remember') and client.ssl_object is not None:
+                if ssl_context.remember(self.host, client.ssl_object):
+                    self.connection_stats['tls_resumed'] += 1
+            
+            if self.password is None and self.credentials is not None:
+                self.password = await self.credentials(self.config)
+            try:
+                await client.login(self.username, self.password)
+            except IMAPAbort:
+                raise
+            except IMAPError:
+                if self.credentials is not None:
+                    # The stored password may have been rotated; read it again next time
+                    self.password = None
+                raise
+            
+            status, _ = await client.select(self.folder)
+            if status != 'OK':
+                raise IMAPError(f"Failed to select folder {self.folder}")
+        except BaseException:
+            try:
+                await client.logout()
+            except Exception:
+                pass
+            raise
+        return client
+    
+    async def _promote_standby(self) -> Optional[Union[AsyncIMAPClient, ImaplibClient]]:
+        """Take over the standby session, re-selecting to confirm it is alive."""
+        client, self._standby_client = self._standby_client, None
+        if client is None or not client.connected:
+            return None
+        try:
+            # Also refreshes UIDVALIDITY/UIDNEXT for the checkpoint
+            status, _ = await client.select(self.folder)
+            if status == 'OK':
+                self.connection_stats['standby_promotions'] += 1
+                self.logger.info(f"Promoted standby connection for {self.name}")
+                return client
+        except Exception as e:
+            self.logger.debug(f"Standby connection for {self.name} is dead: {e}")
+        try:
+            await client.logout()
+        except Exception:
+            pass
+        return None
+    
+    def _warm_standby(self):
+        """Open a standby session in the background if this account keeps one."""
+        if not self.standby or self._standby_client is not None:
+            return
+        if self._standby_task and not self._standby_task.done():
+            return
+        self._standby_task = asyncio.create_task(self._open_standby())
+    
+    async def _open_standby(self):
+        try:
+            self._standby_client = await self._open_session()
+            self._standby_activity = time.monotonic()
+            self.logger.debug(f"Standby connection ready for {self.name}")
+        except Exception as e:
+            self.logger.warning(f"Could not open standby connection for {self.name}: {e}")
+    
+    async def keepalive(self) -> bool:
+        """
+        Send NOOP on sessions idle for longer than keepalive_interval.
+        
+        The main session is only touched when it is polled (IDLE sessions are
+        re-issued often enough instead) and never while a check is running.
+        
+        Returns:
+            bool: False if the main session failed and was dropped
+        """
+        if self.keepalive_interval <= 0:
+            return True
+        now = time.monotonic()
+        
+        if self._standby_client and now - self._standby_activity >= self.keepalive_interval:
+            try:
+                await self._standby_client.noop()
+                self._standby_activity = now
+                self.connection_stats['keepalives'] += 1
+            except Exception as e:
+                self.logger.debug(f"Standby keepalive failed for {self.name}, reopening: {e}")
+                client, self._standby_client = self._standby_client, None
+                try:
+                    await client.logout()
+                except Exception:
+                    pass
+                self._warm_standby()
+        
+        if (self.idle_supported or self._session_lock.locked()
+                or not (self.imap_client and self.imap_client.connected)
+                or now - self.last_activity < self.keepalive_interval):
+            return True
+        async with self._session_lock:
+            try:
+                await self.imap_client.noop()
+                self.last_activity = time.monotonic()
+                self.connection_stats['keepalives'] += 1
+                return True
+            except Exception as e:
+                self.logger.warning(f"Keepalive failed for {self.name}: {e}")
+                await self.disconnect(keep_standby=True)
+                return False
+    
+    async def disconnect(self, keep_standby: bool = False):
+        """
+        Close connection to email server.
+        
+        Args:
+            keep_standby: Leave the standby session open for the next connect()
+        """
+        self.idle_supported = False
         if self.imap_client:
             try:
-                self.imap_client.close()
-                self.imap_client.logout()
+                if self.imap_client.connected:
+                    await self.imap_client.close()
+                await self.imap_client.logout()
             except Exception as e:
                 self.logger.warning(f"Error during disconnect: {e}")
             finally:
                 self.imap_client = None
+        
+        if keep_standby:
+            return
+        if self._standby_task and not self._standby_task.done():
+            self._standby_task.cancel()
+            await asyncio.gather(self._standby_task, return_exceptions=True)
+        if self._standby_client:
+            client, self._standby_client = self._standby_client, None
+            try:
+                await client.logout()
+            except Exception:
+                pass
+    
+    async def test_connection(self) -> bool:
+        """
+        Verify the account by connecting; the session is kept open for monitoring.
+        
+        Returns:
+            bool: True if connection successful, False otherwise
+        """
+        if self.imap_client and self.imap_client.connected:
+            return True
+        return await self.connect()
+    
+    def interrupt_wait(self):
+        """End the current (or next) wait_for_new_mail() early, keeping the session."""
+        self._idle_wake.set()
+    
+    async def wait_for_new_mail(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the server announces new mail via IDLE, the timeout
+        expires or interrupt_wait() is called.
+        
+        Args:
+            timeout: Maximum seconds to stay in IDLE (defaults to idle_timeout)
+            
+        Returns:
+            bool: True if the server reported new messages, False otherwise
+        """
+        if not self.imap_client or not self.idle_supported:
+            return False
+        if self._idle_wake.is_set():
+            self._idle_wake.clear()
+            return False
+        
+        # Re-issuing IDLE doubles as the keepalive for IDLE sessions
+        idle_timeout = self.idle_timeout
+        if self.keepalive_interval > 0:
+            idle_timeout = min(idle_timeout, self.keepalive_interval)
+        timeout = idle_timeout if timeout is None else min(timeout, idle_timeout)
+        try:
+            return await self.imap_client.idle(timeout, stop=self._idle_wake)
+        except IMAPAbort as e:
+            # The connection dropped, which says nothing about IDLE support;
+            # the next check reconnects and re-detects it
+            self.logger.warning(f"IDLE connection lost for {self.name}: {e}")
+            await self.disconnect(keep_standby=True)
+            return False
+        except IMAPError as e:
+            # Fall back to polling until the next reconnect re-detects IDLE
+            self.logger.warning(f"IDLE failed for {self.name}, falling back to polling: {e}")
+            self.idle_supported = False
+            return False
+        finally:
+            self._idle_wake.clear()
+    
+    async def _load_checkpoint(self):
+        """Resume from the stored checkpoint, or baseline at the current UIDNEXT."""
+        _, uidvalidity = await self.imap_client.response('UIDVALIDITY')
+        _, uidnext = await self.imap_client.response('UIDNEXT')
+        self.uidvalidity = int(uidvalidity[-1]) if uidvalidity and uidvalidity[-1] else 0
+        
+        checkpoint = self.sync_state.get(self.account_key)
+        if checkpoint and checkpoint[0] == self.uidvalidity:
+            self.last_uid = checkpoint[1]
+            self.logger.debug(f"Resuming {self.name} after UID {self.last_uid}")
+            return
+        
+        if checkpoint:
+            self.logger.warning(f"UIDVALIDITY changed for {self.name}, resetting checkpoint")
+        
+        # No usable checkpoint: start with mail that arrives from now on
+        if uidnext and uidnext[-1]:
+            self.last_uid = int(uidnext[-1]) - 1
+        else:
+            status, data = await self.imap_client.uid('SEARCH', 'ALL')
+            uids = data[0].split() if status == 'OK' and data and data[0] else []
+            self.last_uid = int(uids[-1]) if uids else 0
+        self.sync_state.set(self.account_key, self.uidvalidity, self.last_uid)
     
     async def check_for_mfa_codes(self) -> List[Dict[str, str]]:
+        """
+        Check for new MFA codes in email (serialized with keepalives).
+        
+        Returns:
+            List[Dict[str, str]]: List of found MFA codes with metadata
+        """
+        async with self._session_lock:
+            try:
+                return await self._check_for_mfa_codes()
+            finally:
+                self.last_activity = time.monotonic()
+    
+    async def _check_for_mfa_codes(self) -> List[Dict[str, str]]:
         """
         Check for new MFA codes in email.
-        Uses IMAP flags to track processed messages - no database needed.
+        Only messages with a UID above the account checkpoint are examined.
+        Headers are fetched first and bodies are downloaded only for messages
+        passing the prefilter, always with BODY.PEEK so user flags stay untouched.
         
         Returns:
             List[Dict[str, str]]: List of found MFA codes with metadata
@@ -114,89 +440,304 @@ class EmailMonitor:
             return []
         
         try:
-            # Search for recent unread messages (last 30 minutes)
-            cutoff_time = datetime.now() - timedelta(minutes=30)
-            date_str = cutoff_time.strftime("%d-%b-%Y")
+            tracer = get_tracer()
             
-            # Search for unseen messages from today
-            search_criteria = f'(UNSEEN SINCE "{date_str}")'
-            status, message_ids = self.imap_client.search(None, search_criteria)
+            # Stage one: headers (and size) of every message newer than the checkpoint
+            structure = ' BODYSTRUCTURE' if self.body_fetch == 'text_part' else ''
+            with tracer.span('imap.fetch_headers', after_uid=self.last_uid):
+                status, data = await self.imap_client.uid(
+                    'FETCH', f'{self.last_uid + 1}:*',
+                    f'(UID RFC822.SIZE{structure} BODY.PEEK[HEADER.FIELDS ({PREFILTER_HEADERS})])'
+                )
             
             if status != 'OK':
-                self.logger.warning("Failed to search for messages")
+                self.logger.warning("Failed to fetch message headers")
                 return []
             
-            message_ids = message_ids[0].split()
-            if not message_ids:
+            # "n:*" always matches the highest UID, so filter out already-processed ones
+            headers = [m for m in parse_fetch_response(data) if m.get('UID', 0) > self.last_uid]
+            if not headers:
                 return []  # No new messages
             
-            self.logger.debug(f"Found {len(message_ids)} unread messages in {self.name}")
+            self.logger.debug(f"Found {len(headers)} new messages in {self.name}")
             
+            all_uids = sorted(m['UID'] for m in headers)
+            with tracer.span('prefilter', messages=len(headers)) as span:
+                candidates = self._prefilter(headers)
+                span.set_attribute('candidates', len(candidates))
+            handled = set(all_uids) - set(candidates)
             mfa_codes = []
+            seen_uids = []
             
-            for msg_id in message_ids:
-                try:
-                    # Fetch message
-                    status, msg_data = self.imap_client.fetch(msg_id, '(RFC822)')
-                    if status != 'OK':
-                        continue
-                    
-                    # Parse email
-                    email_body = msg_data[0][1]
+            try:
+                # Stage two: bodies (or text parts) of candidates, batched by
+                # sequence set and processed as each message arrives
+                for fetch_item, batch in self._body_fetch_batches(candidates):
+                    with tracer.span('imap.fetch_bodies', messages=len(batch), item=fetch_item):
+                        async for segment in self.imap_client.fetch_stream(
+                            format_sequence_set(batch), f'(UID {fetch_item})', uid=True
+                        ):
+                            for item in parse_fetch_response(segment):
+                                uid = item.get('UID')
+                                if uid not in candidates or uid in handled:
+                                    continue
+                                with tracer.span('message', uid=uid, sender=candidates[uid]['sender']):
+                                    codes = self._process_message(item, candidates[uid])
+                                handled.add(uid)
+                                if codes:
+                                    mfa_codes.extend(codes)
+                                    seen_uids.append(uid)
+                
+                # Candidates the server did not return were expunged meanwhile
+                handled.update(candidates)
+                
+                if self.mark_seen and seen_uids:
+                    await self.imap_client.uid(
+                        'STORE', format_sequence_set(seen_uids), '+FLAGS.SILENT', '(\\Seen)'
+                    )
+            except BaseException:
+                # The codes found so far never reach the caller, so the
+                # checkpoint stops before their messages and they are
+                # examined again on the next check
+                self.last_uid = self._contiguous_watermark(all_uids, handled - set(seen_uids))
+                raise
+            
+            self.last_uid = self._contiguous_watermark(all_uids, handled)
+            return mfa_codes
+            
+        except IMAPAbort:
+            # Connection is unusable; let the caller reconnect
+            raise
+        except Exception as e:
+            self.logger.error(f"Error checking for MFA codes: {e}")
+            return []
+        finally:
+            if self.uidvalidity is not None:
+                self.sync_state.set(self.account_key, self.uidvalidity, self.last_uid)
+    
+    def _prefilter(self, headers: List[Dict]) -> Dict[int, Dict[str, Any]]:
+        """
+        Decide from headers alone which messages need their body downloaded.
+        
+        Args:
+            headers: Parsed stage-one FETCH items
+            
+        Returns:
+            Dict mapping candidate UID to its subject, sender, date and text
+            part (None unless BODYSTRUCTURE was fetched)
+        """
+        candidates = {}
+        for item in headers:
+            _, header_bytes = find_section(item, 'BODY[HEADER')
+            header_bytes = header_bytes or b''
+            size = item.get('RFC822.SIZE') or 0
+            header_message = email.message_from_bytes(header_bytes)
+            
+            subject = self._decode_header(header_message.get('Subject', ''))
+            sender = self._decode_header(header_message.get('From', ''))
+            
+            self.fetch_stats['messages_scanned'] += 1
+            self.fetch_stats['header_bytes'] += len(header_bytes)
+            self._header_bytes_metric.inc(len(header_bytes))
+            
+            if self._is_likely_mfa_email(subject, sender):
+                candidates[item['UID']] = {
+                    'subject': subject,
+                    'sender': sender,
+                    'date_received': header_message.get('Date', ''),
+                    'size': size,
+                    'part': find_text_part(item.get('BODYSTRUCTURE')),
+                }
+            else:
+                self.fetch_stats['bytes_saved'] += max(size - len(header_bytes), 0)
+        return candidates
+    
+    def _body_fetch_batches(self, candidates: Dict[int, Dict[str, Any]]) -> List[Tuple[str, List[int]]]:
+        """
+        Plan stage-two fetches as (FETCH item, UID batch) pairs.
+        
+        In text_part mode candidates are grouped by part section (messages
+        from one sender usually share a layout), so each group is a single
+        batched FETCH; messages without a usable text part get the full body.
+        """
+        groups: Dict[str, List[int]] = {}
+        for uid in sorted(candidates):
+            part = candidates[uid].get('part')
+            if part is None:
+                fetch_item = 'BODY.PEEK[]'
+            elif self.max_part_bytes and part.size > self.max_part_bytes:
+                fetch_item = f'BODY.PEEK[{part.section}]<0.{self.max_part_bytes}>'
+            else:
+                fetch_item = f'BODY.PEEK[{part.section}]'
+            groups.setdefault(fetch_item, []).append(uid)
+        return [
+            (fetch_item, uids[start:start + self.fetch_batch_size])
+            for fetch_item, uids in groups.items()
+            for start in range(0, len(uids), self.fetch_batch_size)
+        ]
+    
+    def _process_message(self, item: Dict, meta: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Extract MFA codes from one fetched message body.
+        
+        Args:
+            item: Parsed stage-two FETCH item containing BODY[] or BODY[section]
+            meta: Subject, sender, date and text part from the prefilter stage
+            
+        Returns:
+            List[Dict[str, str]]: Found MFA codes with metadata
+        """
+        try:
+            _, email_body = find_section(item, 'BODY[')
+            if not email_body:
+                return []
+            
+            self.fetch_stats['bodies_fetched'] += 1
+            self.fetch_stats['body_bytes'] += len(email_body)
+            self._body_bytes_metric.inc(len(email_body))
+            MESSAGE_BYTES.observe(len(email_body))
+            
+            tracer = get_tracer()
+            started = time.perf_counter()
+            part = meta.get('part')
+            with tracer.span('message.parse', bytes=len(email_body)):
+                if part is not None:
+                    # Only the text part was fetched: decode it directly, no MIME parse
+                    self.fetch_stats['text_parts_fetched'] += 1
+                    self.fetch_stats['bytes_saved'] += max(meta['size'] - len(email_body), 0)
+                    truncated = bool(self.max_part_bytes) and part.size > self.max_part_bytes
+                    email_content = decode_text_part(email_body, part, truncated)
+                    if part.subtype == 'html':
+                        email_content = self._html_to_text(email_content)
+                else:
                     email_message = email.message_from_bytes(email_body)
                     
-                    # Extract relevant info
-                    subject = email_message.get('Subject', '')
-                    sender = email_message.get('From', '')
-                    date_received = email_message.get('Date', '')
-                    
-                    # Quick pre-filter: check if email likely contains MFA code
-                    if not self._is_likely_mfa_email(subject, sender):
-                        # Mark as seen to avoid reprocessing
-                        self.imap_client.store(msg_id, '+FLAGS', '\\Seen')
-                        continue
-                    
                     # Extract email content
                     email_content = self._extract_email_content(email_message)
-                    if not email_content:
-                        # Mark as seen
-                        self.imap_client.store(msg_id, '+FLAGS', '\\Seen')
-                        continue
-                    
-                    # Look for MFA codes
-                    found_codes = self._extract_mfa_codes(email_content)
-                    
-                    if found_codes:
-                        for code in found_codes:
-                            mfa_codes.append({
-                                'code': code,
-                                'subject': subject,
-                                'sender': sender,
-                                'account': self.name,
-                                'timestamp': datetime.now().isoformat(),
-                                'date_received': date_received
-                            })
-                            
-                        self.logger.info(f"Found {len(found_codes)} MFA code(s) in email from {sender}")
-                    
-                    # Mark message as seen (processed)
-                    self.imap_client.store(msg_id, '+FLAGS', '\\Seen')
-                    
-                except Exception as e:
-                    self.logger.error(f"Error processing message {msg_id}: {e}")
-                    # Mark as seen even on error to avoid reprocessing
-                    try:
-                        self.imap_client.store(msg_id, '+FLAGS', '\\Seen')
-                    except:
-                        pass
-                    continue
+            parsed = time.perf_counter()
+            PARSE_SECONDS.observe(parsed - started)
+            if not email_content:
+                return []
             
-            return mfa_codes
+            # Look for MFA codes, keyword and service in one pass
+            with tracer.span('message.extract', chars=len(email_content)) as span:
+                result = self.extractor.extract(email_content, meta['subject'], meta['sender'])
+                span.set_attribute('codes', len(result.codes))
+            EXTRACTION_SECONDS.observe(time.perf_counter() - parsed)
+            if result.codes:
+                self.logger.info(f"Found {len(result.codes)} MFA code(s) in email from {meta['sender']}")
+            
+            return [{
+                'code': code,
+                'subject': meta['subject'],
+                'sender': meta['sender'],
+                'account': self.name,
+                'account_id': self.config.get('id'),
+                'user_id': self.user_id,
+                'project_id': self.config.get('project_id'),
+                'timestamp': datetime.now().isoformat(),
+                'date_received': meta['date_received'],
+                'service': result.service,
+                'keyword': result.keyword,
+                'trace': current_context()  # Parent for the relay and SMS spans
+            } for code in result.codes]
             
         except Exception as e:
-            self.logger.error(f"Error checking for MFA codes: {e}")
+            # Skip the message rather than retrying it on every poll
+            self.logger.error(f"Error processing message UID {item.get('UID')}: {e}")
             return []
     
+    def _contiguous_watermark(self, uids: List[int], handled: set) -> int:
+        """Highest UID such that it and every lower new UID has been handled."""
+        watermark = self.last_uid
+        for uid in uids:
+            if uid not in handled:
+                break
+            watermark = uid
+        return watermark
+    
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Connect, TLS resumption, standby and keepalive counters for this account."""
+        return dict(self.connection_stats, standby_ready=self._standby_client is not None)
+    
+    def get_fetch_stats(self) -> Dict[str, int]:
+        """
+        Get two-stage fetch counters for this account.
+        
+        Returns:
+            Dict[str, int]: Messages scanned, bodies fetched and bytes saved
+        """
+        return dict(self.fetch_stats)
+    
+    @staticmethod
+    def _decode_header(value) -> str:
+        """Decode an RFC 2047 encoded header value to text."""
+        if not value:
+            return ''
+        try:
+            return str(make_header(decode_header(str(value))))
+        except Exception:
+            return str(value)
+    
+    def _extract_email_content(self, email_message: Message) -> str:
+        """
+        Extract searchable text from an email, preferring text/plain parts.
+        
+        Args:
+            email_message: Parsed email message
+            
+        Returns:
+            str: Decoded text content (HTML reduced to text), or empty string
+        """
+        plain_parts = []
+        html_parts = []
+        
+        for part in email_message.walk():
+            if part.is_multipart() or part.get_content_disposition() == 'attachment':
+                continue
+            content_type = part.get_content_type()
+            if content_type not in ('text/plain', 'text/html'):
+                continue
+            
+            payload = part.get_payload(decode=True)
+            if not payload:
+                continue
+            charset = part.get_content_charset() or 'utf-8'
+            try:
+                text = payload.decode(charset, errors='replace')
+            except LookupError:
+                text = payload.decode('utf-8', errors='replace')
+            
+            if content_type == 'text/plain':
+                plain_parts.append(text)
+            else:
+                html_parts.append(text)
+        
+        if plain_parts:
+            return '\n'.join(plain_parts)
+        if html_parts:
+            return self._html_to_text('\n'.join(html_parts))
+        return ''
+    
+    @staticmethod
+    def _html_to_text(html: str) -> str:
+        """Reduce HTML to whitespace-separated text for code scanning."""
+        html = _SCRIPT_STYLE_RE.sub(' ', html)
+        text = _TAG_RE.sub(' ', html)
+        return _WHITESPACE_RE.sub(' ', unescape(text)).strip()
+    
+    def _extract_mfa_codes(self, content: str) -> List[str]:
+        """
+        Find MFA codes in email content.
+        
+        Args:
+            content: Email text content
+            
+        Returns:
+            List[str]: Unique codes in order of appearance
+        """
+        return self.extractor.extract_codes(content)
+    
     def _is_likely_mfa_email(self, subject: str, sender: str) -> bool:
         """
         Quick check to determine if email likely contains MFA code.
@@ -208,23 +749,4 @@ class EmailMonitor:
         Returns:
             bool: True if email likely contains MFA code
         """
-        # Convert to lowercase for case-insensitive matching
-        subject_lower = subject.lower()
-        sender_lower = sender.lower()
-        
-        # Check for MFA-related keywords in subject
-        for keyword in self.mfa_keywords:
-            if keyword in subject_lower:
-                return True
-        
-        # Check for common MFA sender patterns
-        mfa_sender_patterns = [
-            'noreply', 'no-reply', 'security', 'auth', 'verify',
-            'google', 'microsoft', 'github', 'aws', 'azure'
-        ]
-        
-        for pattern in mfa_sender_patterns:
-            if pattern in sender_lower:
-                return True
-        
-        return False
+        return self.extractor.is_likely_mfa(subject, sender)
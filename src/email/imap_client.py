@@ -0,0 +1,699 @@
+"""
+IMAP Clients for MFARelay
+Non-blocking asyncio IMAP client plus an imaplib adapter exposing the same async API.
+"""
+
+import asyncio
+import imaplib
+import logging
+import re
+import ssl
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+# A response is a list of segments in imaplib's shape: plain lines are bytes,
+# lines that announced a literal are (line, literal) tuples
+ResponseData = List[Union[bytes, Tuple[bytes, bytes]]]
+
+_LITERAL_RE = re.compile(rb'\{(\d+)\}\r\n$')
+_RESPONSE_CODE_RE = re.compile(rb'\[([A-Z-]+)(?: ([^\]]*))?\]')
+_ATOM_SPECIALS = re.compile(r'[\s(){}"\\%*\]]')
+
+
+class IMAPError(Exception):
+    """Raised when the server rejects a command."""
+
+
+class IMAPAbort(IMAPError):
+    """Raised when the connection is no longer usable."""
+
+
+def _quote(value: str) -> bytes:
+    """Quote a string argument when it contains IMAP atom specials."""
+    if value and not _ATOM_SPECIALS.search(value):
+        return value.encode('ascii')
+    return b'"' + value.replace('\\', '\\\\').replace('"', '\\"').encode('ascii') + b'"'
+
+
+class AsyncIMAPClient:
+    """
+    Minimal IMAP4rev1 client built on asyncio streams.
+
+    Return values mirror imaplib: every command returns a ``(typ, data)`` tuple
+    where ``data`` holds the untagged responses for that command, so parsing
+    code works unchanged against either client.
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True,
+                 ssl_context: Optional[ssl.SSLContext] = None, timeout: float = 30.0):
+        """
+        Initialize client settings; no connection is made until connect().
+
+        Args:
+            host: IMAP server hostname
+            port: IMAP server port
+            use_ssl: Whether to use implicit TLS
+            ssl_context: Optional SSL context (defaults to system trust store)
+            timeout: Per-command timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+
+        self.capabilities: Tuple[str, ...] = ()
+        self.untagged_responses: Dict[str, List[Any]] = {}
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+        self._tag_prefix = b'A'
+        self._tag_counter = 0
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def connected(self) -> bool:
+        """Whether the underlying stream is open."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def ssl_object(self) -> Optional[ssl.SSLObject]:
+        """The TLS object of the open connection, if any."""
+        return self._writer.get_extra_info('ssl_object') if self._writer else None
+
+    async def connect(self):
+        """Open the connection and consume the server greeting."""
+        ssl_context = None
+        if self.use_ssl:
+            ssl_context = self.ssl_context or ssl.create_default_context()
+
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host, self.port, ssl=ssl_context,
+                    server_hostname=self.host if ssl_context else None
+                ),
+                timeout=self.timeout
+            )
+            greeting = await asyncio.wait_for(self._read_response(), timeout=self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            self._abort()
+            raise IMAPAbort(f"Connection to {self.host}:{self.port} failed: {e}") from e
+
+        line = greeting[0] if isinstance(greeting[0], bytes) else greeting[0][0]
+        if not (line.startswith(b'* OK') or line.startswith(b'* PREAUTH')):
+            self._abort()
+            raise IMAPAbort(f"Unexpected greeting: {line!r}")
+
+        self._store_response_codes(line)
+        await self.capability()
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+
+    async def capability(self) -> Tuple[str, List[Any]]:
+        """Refresh and return server capabilities."""
+        typ, data = await self._simple_command('CAPABILITY', response_name='CAPABILITY')
+        if typ == 'OK' and data and data[-1]:
+            self.capabilities = tuple(data[-1].decode('ascii', 'replace').upper().split())
+        return typ, data
+
+    async def login(self, username: str, password: str) -> Tuple[str, List[Any]]:
+        """Authenticate with LOGIN; raises IMAPError on failure like imaplib."""
+        typ, data = await self._simple_command(
+            'LOGIN', self._string_arg(username), self._string_arg(password)
+        )
+        if typ != 'OK':
+            raise IMAPError(data[-1] if data else b'LOGIN failed')
+        return typ, data
+
+    async def select(self, mailbox: str = 'INBOX', readonly: bool = False) -> Tuple[str, List[Any]]:
+        """Select a mailbox and return its EXISTS count."""
+        self.untagged_responses = {}
+        name = 'EXAMINE' if readonly else 'SELECT'
+        return await self._simple_command(name, _quote(mailbox), response_name='EXISTS',
+                                          keep_untagged=True)
+
+    async def search(self, charset: Optional[str], *criteria: str) -> Tuple[str, List[Any]]:
+        """Run SEARCH with raw criteria strings."""
+        args = [b'CHARSET', charset.encode('ascii')] if charset else []
+        args.extend(c.encode('ascii') for c in criteria)
+        return await self._simple_command('SEARCH', *args, response_name='SEARCH')
+
+    async def fetch(self, message_set: str, message_parts: str) -> Tuple[str, List[Any]]:
+        """Fetch data items for a message set."""
+        return await self._simple_command(
+            'FETCH', message_set.encode('ascii'), message_parts.encode('ascii'),
+            response_name='FETCH'
+        )
+
+    async def store(self, message_set: str, command: str, flags: str) -> Tuple[str, List[Any]]:
+        """Alter message flags."""
+        return await self._simple_command(
+            'STORE', message_set.encode('ascii'), command.encode('ascii'), flags.encode('ascii'),
+            response_name='FETCH'
+        )
+
+    async def uid(self, command: str, *args: str) -> Tuple[str, List[Any]]:
+        """Run a UID-prefixed command (FETCH, SEARCH, STORE)."""
+        command = command.upper()
+        response_name = 'SEARCH' if command == 'SEARCH' else 'FETCH'
+        encoded = [command.encode('ascii')] + [a.encode('ascii') for a in args]
+        return await self._simple_command('UID', *encoded, response_name=response_name)
+
+    async def fetch_stream(self, message_set: str, message_parts: str,
+                           uid: bool = False) -> AsyncIterator[List[Any]]:
+        """
+        Fetch a message set, yielding each message's data as soon as it arrives.
+
+        Lets callers parse and act on early messages of a large batch while the
+        rest are still on the wire.
+
+        Args:
+            message_set: Sequence set, e.g. "101:140,150"
+            message_parts: Data items, e.g. "(UID BODY.PEEK[])"
+            uid: Whether the set contains UIDs (UID FETCH)
+
+        Yields:
+            imaplib-shaped FETCH data for one message
+        """
+        async with self._lock:
+            self.untagged_responses = {}
+            tag = self._new_tag()
+            command = b' UID FETCH ' if uid else b' FETCH '
+            await self._send(tag + command + message_set.encode('ascii') + b' '
+                             + message_parts.encode('ascii') + b'\r\n')
+
+            completed = False
+            try:
+                while True:
+                    response = await self._read_with_timeout(self.timeout)
+                    line = response[0] if isinstance(response[0], bytes) else response[0][0]
+                    if line.startswith(tag + b' '):
+                        completed = True
+                        typ, text = self._tagged_result(line, [])
+                        if typ != 'OK':
+                            raise IMAPError(f"FETCH failed: {text}")
+                        return
+                    if not line.startswith(b'* '):
+                        continue
+                    name, entries = self._untagged_entries(response)
+                    if name == 'FETCH':
+                        yield entries
+                    else:
+                        self.untagged_responses.setdefault(name, []).extend(entries)
+            finally:
+                if not completed:
+                    # Abandoned mid-response: the stream position is unknown
+                    self._abort()
+
+    async def noop(self) -> Tuple[str, List[Any]]:
+        """Send NOOP (keepalive / poll for untagged updates)."""
+        return await self._simple_command('NOOP')
+
+    async def close(self) -> Tuple[str, List[Any]]:
+        """Close the selected mailbox."""
+        return await self._simple_command('CLOSE')
+
+    async def logout(self) -> Tuple[str, List[Any]]:
+        """Log out and close the connection."""
+        try:
+            if not self.connected:
+                return 'BYE', []
+            return await self._simple_command('LOGOUT', response_name='BYE')
+        except IMAPError:
+            return 'BYE', []
+        finally:
+            self._abort()
+
+    async def response(self, code: str) -> Tuple[str, List[Any]]:
+        """Pop an untagged response or response code (e.g. UIDVALIDITY)."""
+        return code, self.untagged_responses.pop(code.upper(), [None])
+
+    async def idle(self, timeout: float, stop: Optional[asyncio.Event] = None) -> bool:
+        """
+        Run IDLE until the server reports new messages or the timeout expires.
+
+        Args:
+            timeout: Seconds to remain idle before sending DONE
+            stop: Event that ends IDLE early (DONE is sent, the session stays usable)
+
+        Returns:
+            bool: True if an EXISTS notification was received
+        """
+        if 'IDLE' not in self.capabilities:
+            raise IMAPError("Server does not support IDLE")
+
+        async with self._lock:
+            loop = asyncio.get_event_loop()
+            tag = self._new_tag()
+            await self._send(tag + b' IDLE\r\n')
+
+            response = await self._read_with_timeout(self.timeout)
+            first = response[0] if isinstance(response[0], bytes) else response[0][0]
+            if not first.startswith(b'+'):
+                raise IMAPError(f"IDLE rejected: {first.strip().decode(errors='replace')}")
+
+            state = {'done': False}
+
+            def end_idle():
+                if not state['done'] and self.connected:
+                    state['done'] = True
+                    self._writer.write(b'DONE\r\n')
+
+            deadline = loop.time() + timeout
+            timer = loop.call_at(deadline, end_idle)
+            stopper = asyncio.ensure_future(stop.wait()) if stop else None
+            if stopper:
+                stopper.add_done_callback(lambda waiter: waiter.cancelled() or end_idle())
+            new_mail = False
+            try:
+                while True:
+                    # Allow one command timeout of grace for the tagged reply
+                    limit = self.timeout if state['done'] else deadline - loop.time() + self.timeout
+                    response = await self._read_with_timeout(max(limit, 0.01))
+                    line = response[0] if isinstance(response[0], bytes) else response[0][0]
+                    if line.startswith(tag):
+                        break
+                    if line.startswith(b'* '):
+                        self._store_untagged(response)
+                        parts = line.split()
+                        if len(parts) >= 3 and parts[2].upper() == b'EXISTS':
+                            new_mail = True
+                            end_idle()
+            except asyncio.CancelledError:
+                end_idle()
+                self._abort()
+                raise
+            finally:
+                timer.cancel()
+                if stopper:
+                    stopper.cancel()
+
+            return new_mail
+
+    # ------------------------------------------------------------------
+    # Protocol plumbing
+    # ------------------------------------------------------------------
+
+    def _new_tag(self) -> bytes:
+        self._tag_counter += 1
+        return self._tag_prefix + str(self._tag_counter).encode('ascii')
+
+    def _string_arg(self, value: str) -> Union[bytes, Tuple[bytes]]:
+        """Encode a string argument, using a literal for non-ASCII values."""
+        try:
+            return _quote(value)
+        except UnicodeEncodeError:
+            return (value.encode('utf-8'),)
+
+    def _abort(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = None
+        self._writer = None
+
+    async def _send(self, data: bytes):
+        if not self.connected:
+            raise IMAPAbort("Not connected")
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def _read_line(self) -> bytes:
+        if self._reader is None:
+            raise IMAPAbort("Not connected")
+        line = await self._reader.readline()
+        if not line:
+            raise IMAPAbort("Connection closed by server")
+        return line
+
+    async def _read_response(self) -> ResponseData:
+        """Read one complete response, including any embedded literals."""
+        segments: ResponseData = []
+        line = await self._read_line()
+        while True:
+            match = _LITERAL_RE.search(line)
+            if not match:
+                segments.append(line.rstrip(b'\r\n'))
+                return segments
+            literal = await self._reader.readexactly(int(match.group(1)))
+            segments.append((line[:-2], literal))
+            line = await self._read_line()
+
+    async def _read_with_timeout(self, timeout: float) -> ResponseData:
+        try:
+            return await asyncio.wait_for(self._read_response(), timeout=timeout)
+        except asyncio.TimeoutError as e:
+            self._abort()
+            raise IMAPAbort(f"Timed out waiting for {self.host}") from e
+        except (OSError, asyncio.IncompleteReadError) as e:
+            self._abort()
+            raise IMAPAbort(str(e)) from e
+
+    def _store_response_codes(self, line: bytes):
+        match = _RESPONSE_CODE_RE.search(line)
+        if match:
+            self.untagged_responses.setdefault(match.group(1).decode('ascii'), []).append(match.group(2))
+
+    def _store_untagged(self, response: ResponseData):
+        """File an untagged response under its name, in imaplib's format."""
+        name, entries = self._untagged_entries(response)
+        self.untagged_responses.setdefault(name, []).extend(entries)
+
+    def _untagged_entries(self, response: ResponseData) -> Tuple[str, List[Any]]:
+        """Split an untagged response into its name and imaplib-style data entries."""
+        first = response[0]
+        line = first if isinstance(first, bytes) else first[0]
+        body = line[2:]
+        parts = body.split(b' ', 2)
+
+        if parts[0].isdigit() and len(parts) > 1:
+            # "* 12 FETCH (...)" / "* 5 EXISTS": name follows the number
+            name = parts[1].upper().decode('ascii', 'replace')
+            rest = parts[0] + (b' ' + parts[2] if len(parts) > 2 else b'')
+            if name == 'EXISTS' or name == 'RECENT' or name == 'EXPUNGE':
+                rest = parts[0]
+        else:
+            name = parts[0].upper().decode('ascii', 'replace')
+            rest = body[len(parts[0]) + 1:]
+            if name in ('OK', 'NO', 'BAD', 'BYE'):
+                self._store_response_codes(line)
+
+        if isinstance(first, tuple):
+            entries: List[Any] = [(rest, first[1])] + list(response[1:])
+        else:
+            entries = [rest]
+        return name, entries
+
+    async def _simple_command(self, name: str, *args: Union[bytes, Tuple[bytes]],
+                              response_name: Optional[str] = None,
+                              keep_untagged: bool = False) -> Tuple[str, List[Any]]:
+        """Send a tagged command and collect its response."""
+        async with self._lock:
+            if not keep_untagged:
+                self.untagged_responses = {}
+            try:
+                return await asyncio.wait_for(
+                    self._run_command(name, args, response_name), timeout=self.timeout
+                )
+            except asyncio.TimeoutError as e:
+                self._abort()
+                raise IMAPAbort(f"{name} timed out on {self.host}") from e
+            except (OSError, asyncio.IncompleteReadError) as e:
+                self._abort()
+                raise IMAPAbort(f"{name} failed on {self.host}: {e}") from e
+
+    async def _run_command(self, name: str, args, response_name: Optional[str]) -> Tuple[str, List[Any]]:
+        tag = self._new_tag()
+        buffer = tag + b' ' + name.encode('ascii')
+
+        for arg in args:
+            if isinstance(arg, tuple):
+                # Synchronizing literal: wait for the continuation before sending
+                literal = arg[0]
+                await self._send(buffer + b' {' + str(len(literal)).encode('ascii') + b'}\r\n')
+                while True:
+                    response = await self._read_response()
+                    line = response[0] if isinstance(response[0], bytes) else response[0][0]
+                    if line.startswith(b'+'):
+                        break
+                    if line.startswith(tag):
+                        return self._tagged_result(line, [])
+                    self._store_untagged(response)
+                buffer = literal
+            else:
+                buffer += b' ' + arg
+        await self._send(buffer + b'\r\n')
+
+        while True:
+            response = await self._read_response()
+            line = response[0] if isinstance(response[0], bytes) else response[0][0]
+            if line.startswith(tag + b' '):
+                typ, text = self._tagged_result(line, [])
+                if response_name:
+                    data = self.untagged_responses.pop(response_name, [None])
+                    if typ == 'OK' or data != [None]:
+                        return typ, data
+                return typ, text
+            if line.startswith(b'* '):
+                self._store_untagged(response)
+            elif line.startswith(b'+'):
+                continue
+            else:
+                self.logger.debug(f"Ignoring unexpected response: {line[:80]!r}")
+
+    def _tagged_result(self, line: bytes, default: List[Any]) -> Tuple[str, List[Any]]:
+        parts = line.split(b' ', 2)
+        typ = parts[1].upper().decode('ascii', 'replace') if len(parts) > 1 else 'BAD'
+        text = parts[2] if len(parts) > 2 else b''
+        self._store_response_codes(line)
+        if typ == 'BYE':
+            self._abort()
+        return typ, [text] if text else default
+
+
+class ImaplibClient:
+    """
+    Async adapter around blocking imaplib, run on the default executor.
+
+    Kept as the ``imaplib`` engine for servers or environments where the
+    native asyncio client is not wanted.
+    """
+
+    def __init__(self, host: str, port: int, use_ssl: bool = True,
+                 ssl_context: Optional[ssl.SSLContext] = None, timeout: float = 30.0):
+        """
+        Initialize client settings; no connection is made until connect().
+
+        Args:
+            host: IMAP server hostname
+            port: IMAP server port
+            use_ssl: Whether to use implicit TLS
+            ssl_context: Optional SSL context
+            timeout: Socket timeout in seconds
+        """
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+
+        self.imap: Optional[imaplib.IMAP4] = None
+        self._idle_lock = threading.Lock()
+        self._idle_tag: Optional[bytes] = None
+        self._idle_done_sent = False
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def capabilities(self) -> Tuple[str, ...]:
+        """Server capabilities as reported by imaplib."""
+        return tuple(self.imap.capabilities) if self.imap else ()
+
+    @property
+    def untagged_responses(self) -> Dict[str, List[Any]]:
+        """Pending untagged responses held by imaplib."""
+        return self.imap.untagged_responses if self.imap else {}
+
+    @property
+    def connected(self) -> bool:
+        """Whether an imaplib session is open."""
+        return self.imap is not None
+
+    @property
+    def ssl_object(self) -> Optional[ssl.SSLSocket]:
+        """The TLS socket of the open session, if any."""
+        sock = getattr(self.imap, 'sock', None)
+        return sock if isinstance(sock, ssl.SSLSocket) else None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(None, lambda: func(*args))
+        except imaplib.IMAP4.abort as e:
+            raise IMAPAbort(str(e)) from e
+        except imaplib.IMAP4.error as e:
+            raise IMAPError(str(e)) from e
+        except OSError as e:
+            raise IMAPAbort(str(e)) from e
+
+    async def connect(self):
+        """Open the connection in the executor."""
+        def _connect():
+            if self.use_ssl:
+                return imaplib.IMAP4_SSL(self.host, self.port, ssl_context=self.ssl_context,
+                                         timeout=self.timeout)
+            return imaplib.IMAP4(self.host, self.port, timeout=self.timeout)
+
+        self.imap = await self._run(_connect)
+
+    async def capability(self):
+        """Refresh capabilities after authentication."""
+        typ, data = await self._run(self.imap.capability)
+        if typ == 'OK' and data and data[-1]:
+            self.imap.capabilities = tuple(data[-1].decode('ascii', 'replace').upper().split())
+        return typ, data
+
+    async def login(self, username: str, password: str):
+        return await self._run(self.imap.login, username, password)
+
+    async def select(self, mailbox: str = 'INBOX', readonly: bool = False):
+        return await self._run(self.imap.select, mailbox, readonly)
+
+    async def search(self, charset: Optional[str], *criteria: str):
+        return await self._run(self.imap.search, charset, *criteria)
+
+    async def fetch(self, message_set: str, message_parts: str):
+        return await self._run(self.imap.fetch, message_set, message_parts)
+
+    async def store(self, message_set: str, command: str, flags: str):
+        return await self._run(self.imap.store, message_set, command, flags)
+
+    async def uid(self, command: str, *args: str):
+        return await self._run(self.imap.uid, command, *args)
+
+    async def fetch_stream(self, message_set: str, message_parts: str,
+                           uid: bool = False) -> AsyncIterator[List[Any]]:
+        """Fetch a message set; imaplib buffers the whole response, so it is yielded once."""
+        if uid:
+            typ, data = await self.uid('FETCH', message_set, message_parts)
+        else:
+            typ, data = await self.fetch(message_set, message_parts)
+        if typ != 'OK':
+            raise IMAPError(f"FETCH failed: {data}")
+        yield data
+
+    async def noop(self):
+        return await self._run(self.imap.noop)
+
+    async def close(self):
+        return await self._run(self.imap.close)
+
+    async def logout(self):
+        try:
+            return await self._run(self.imap.logout)
+        finally:
+            self.imap = None
+
+    async def response(self, code: str):
+        return self.imap.response(code)
+
+    async def idle(self, timeout: float, stop: Optional[asyncio.Event] = None) -> bool:
+        """
+        Run IDLE on an executor thread until new mail arrives or the timeout expires.
+
+        Args:
+            timeout: Seconds to remain idle before sending DONE
+            stop: Event that ends IDLE early (DONE is sent, the session stays usable)
+
+        Returns:
+            bool: True if an EXISTS notification was received
+        """
+        if 'IDLE' not in self.capabilities:
+            raise IMAPError("Server does not support IDLE")
+
+        with self._idle_lock:
+            self._idle_done_sent = False
+        idle_future = asyncio.ensure_future(self._run(self._idle_blocking))
+
+        stopper = asyncio.ensure_future(stop.wait()) if stop else None
+        try:
+            waiters = {idle_future, stopper} if stopper else {idle_future}
+            done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if idle_future not in done:
+                # Timed out or stopped: terminate IDLE and let the reader drain the tagged response
+                self._send_idle_done()
+            return await idle_future
+        except asyncio.CancelledError:
+            self._send_idle_done()
+            raise
+        finally:
+            if stopper:
+                stopper.cancel()
+
+    def _idle_blocking(self) -> bool:
+        client = self.imap
+        # IDLE reads may legitimately block for the whole idle window
+        client.sock.settimeout(None)
+        try:
+            return self._idle_command(client)
+        finally:
+            client.sock.settimeout(self.timeout)
+
+    def _idle_command(self, client: imaplib.IMAP4) -> bool:
+        tag = client._new_tag()
+        client.send(tag + b' IDLE\r\n')
+
+        line = client.readline()
+        if not line.startswith(b'+'):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip().decode(errors='replace')}")
+
+        with self._idle_lock:
+            self._idle_tag = tag
+            stop_requested = self._idle_done_sent
+            self._idle_done_sent = False
+        if stop_requested:
+            # The caller gave up before IDLE was established
+            self._send_idle_done()
+
+        new_mail = False
+        try:
+            while True:
+                line = client.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed during IDLE")
+                if line.startswith(tag):
+                    # Tagged completion after DONE
+                    break
+                parts = line.split()
+                if len(parts) >= 3 and parts[0] == b'*' and parts[2].upper() == b'EXISTS':
+                    new_mail = True
+                    self._send_idle_done()
+        finally:
+            with self._idle_lock:
+                self._idle_tag = None
+                self._idle_done_sent = False
+
+        return new_mail
+
+    def _send_idle_done(self):
+        """Send DONE to end an active IDLE command exactly once."""
+        with self._idle_lock:
+            if self._idle_done_sent or not self.imap:
+                return
+            self._idle_done_sent = True
+            if self._idle_tag is None:
+                # IDLE not established yet; the reader thread sends DONE itself
+                return
+            try:
+                self.imap.send(b'DONE\r\n')
+            except Exception as e:
+                self.logger.warning(f"Error ending IDLE: {e}")
+
+
+def create_imap_client(engine: str, host: str, port: int, use_ssl: bool = True,
+                       ssl_context: Optional[ssl.SSLContext] = None,
+                       timeout: float = 30.0):
+    """
+    Create an IMAP client for the configured engine.
+
+    Args:
+        engine: 'asyncio' (native, default) or 'imaplib' (threaded adapter)
+        host: IMAP server hostname
+        port: IMAP server port
+        use_ssl: Whether to use implicit TLS
+        ssl_context: Optional SSL context
+        timeout: Per-command timeout in seconds
+
+    Returns:
+        AsyncIMAPClient or ImaplibClient
+    """
+    if engine == 'imaplib':
+        return ImaplibClient(host, port, use_ssl, ssl_context, timeout)
+    if engine != 'asyncio':
+        raise ValueError(f"Unknown IMAP engine: {engine}")
+    return AsyncIMAPClient(host, port, use_ssl, ssl_context, timeout)
@@ -0,0 +1,336 @@
+"""
+IMAP Response Parser for MFARelay
+Parses imaplib-shaped FETCH responses into per-message dictionaries.
+"""
+
+import binascii
+import quopri
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+_MESSAGE_START_RE = re.compile(rb'^(\d+) \(')
+_LITERAL_MARKER_RE = re.compile(rb'\{(\d+)\}$')
+_NON_BASE64_RE = re.compile(rb'[^A-Za-z0-9+/=]')
+_PARTIAL_QP_ESCAPE_RE = re.compile(rb'=[0-9A-Fa-f]?$')
+
+
+class ParseError(ValueError):
+    """Raised when a server response cannot be parsed."""
+
+
+class _Literal(bytes):
+    """Marks literal data so it is never tokenized."""
+
+
+def iter_fetch_messages(data: List[Any]) -> Iterator[List[Union[bytes, _Literal]]]:
+    """
+    Group FETCH response segments by message.
+
+    imaplib (and AsyncIMAPClient) return FETCH data as a flat list where a
+    message without literals is a single bytes line, and a message with
+    literals is a run of ``(text, literal)`` tuples closed by a bytes line.
+
+    Args:
+        data: FETCH data as returned by the IMAP client
+
+    Yields:
+        List of text/literal chunks making up one message's response
+    """
+    current: List[Union[bytes, _Literal]] = []
+    for item in data:
+        if item is None:
+            continue
+        text, literal = (item[0], item[1]) if isinstance(item, tuple) else (item, None)
+        if _MESSAGE_START_RE.match(text) and current:
+            yield current
+            current = []
+        if literal is not None:
+            # Drop the {n} marker; the literal takes its place
+            current.append(_LITERAL_MARKER_RE.sub(b'', text))
+            current.append(_Literal(literal))
+        else:
+            current.append(text)
+    if current:
+        yield current
+
+
+class _Parser:
+    """Recursive-descent parser over text and literal chunks."""
+
+    def __init__(self, chunks: List[Union[bytes, _Literal]]):
+        self.chunks = chunks
+        self.index = 0
+        self.pos = 0
+
+    def _current(self) -> Optional[Union[bytes, _Literal]]:
+        while self.index < len(self.chunks):
+            chunk = self.chunks[self.index]
+            if isinstance(chunk, _Literal) or self.pos < len(chunk):
+                return chunk
+            self.index += 1
+            self.pos = 0
+        return None
+
+    def _skip_spaces(self):
+        while True:
+            chunk = self._current()
+            if chunk is None or isinstance(chunk, _Literal):
+                return
+            while self.pos < len(chunk) and chunk[self.pos:self.pos + 1] == b' ':
+                self.pos += 1
+            if self.pos < len(chunk):
+                return
+
+    def peek(self) -> Optional[bytes]:
+        self._skip_spaces()
+        chunk = self._current()
+        if chunk is None:
+            return None
+        if isinstance(chunk, _Literal):
+            return b'{'
+        return chunk[self.pos:self.pos + 1]
+
+    def expect(self, char: bytes):
+        if self.peek() != char:
+            raise ParseError(f"Expected {char!r}, got {self.peek()!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Parse one value: list, string, literal, number, NIL or atom."""
+        char = self.peek()
+        if char is None:
+            raise ParseError("Unexpected end of response")
+        if char == b'{':
+            literal = self._current()
+            self.index += 1
+            self.pos = 0
+            return bytes(literal)
+        if char == b'(':
+            self.pos += 1
+            items = []
+            while self.peek() != b')':
+                if self.peek() is None:
+                    raise ParseError("Unterminated list")
+                items.append(self.value())
+            self.pos += 1
+            return items
+        if char == b'"':
+            return self._quoted()
+        atom = self.atom()
+        if atom.isdigit():
+            return int(atom)
+        if atom.upper() == 'NIL':
+            return None
+        return atom
+
+    def _quoted(self) -> bytes:
+        chunk = self._current()
+        self.pos += 1
+        out = bytearray()
+        while self.pos < len(chunk):
+            char = chunk[self.pos:self.pos + 1]
+            if char == b'\\':
+                out += chunk[self.pos + 1:self.pos + 2]
+                self.pos += 2
+            elif char == b'"':
+                self.pos += 1
+                return bytes(out)
+            else:
+                out += char
+                self.pos += 1
+        raise ParseError("Unterminated quoted string")
+
+    def atom(self) -> str:
+        """Parse an atom, keeping bracketed sections like BODY[HEADER.FIELDS (A B)] whole."""
+        self._skip_spaces()
+        chunk = self._current()
+        if chunk is None or isinstance(chunk, _Literal):
+            raise ParseError("Expected atom")
+        start = self.pos
+        depth = 0
+        while self.pos < len(chunk):
+            char = chunk[self.pos:self.pos + 1]
+            if char == b'[':
+                depth += 1
+            elif char == b']':
+                depth -= 1
+            elif depth == 0 and char in (b' ', b'(', b')'):
+                break
+            self.pos += 1
+        if self.pos == start:
+            raise ParseError(f"Expected atom at {chunk[start:start + 20]!r}")
+        return chunk[start:self.pos].decode('ascii', 'replace')
+
+
+def parse_fetch_response(data: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Parse FETCH data into one dictionary per message.
+
+    Keys are upper-cased data item names (``UID``, ``RFC822.SIZE``,
+    ``BODY[HEADER.FIELDS (FROM SUBJECT)]``, ``BODYSTRUCTURE``...), plus
+    ``SEQ`` for the message sequence number. String values are bytes.
+
+    Args:
+        data: FETCH data as returned by the IMAP client
+
+    Returns:
+        List of per-message item dictionaries
+    """
+    messages = []
+    for chunks in iter_fetch_messages(data):
+        parser = _Parser(chunks)
+        seq = parser.value()
+        if not isinstance(seq, int):
+            raise ParseError(f"Expected message number, got {seq!r}")
+        items: Dict[str, Any] = {'SEQ': seq}
+        parser.expect(b'(')
+        while parser.peek() != b')':
+            if parser.peek() is None:
+                raise ParseError("Unterminated FETCH response")
+            name = parser.atom().upper()
+            items[name] = parser.value()
+        messages.append(items)
+    return messages
+
+
+def find_section(items: Dict[str, Any], prefix: str) -> Tuple[Optional[str], Any]:
+    """
+    Find a body section by name prefix, e.g. ``BODY[HEADER``.
+
+    Servers echo section names with their own spacing and without ``.PEEK``,
+    so lookups match on the prefix instead of the exact requested name.
+
+    Args:
+        items: Parsed message items
+        prefix: Upper-case key prefix
+
+    Returns:
+        (key, value) or (None, None) if absent
+    """
+    for key, value in items.items():
+        if key.startswith(prefix):
+            return key, value
+    return None, None
+
+
+def format_sequence_set(numbers) -> str:
+    """
+    Compress message numbers or UIDs into an IMAP sequence set.
+
+    Args:
+        numbers: Iterable of positive integers
+
+    Returns:
+        str: Sequence set such as "101:140,150"
+    """
+    ranges = []
+    for number in sorted(set(numbers)):
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ','.join(str(a) if a == b else f"{a}:{b}" for a, b in ranges)
+
+
+@dataclass
+class TextPart:
+    """A text body part located in a BODYSTRUCTURE."""
+    section: str        # Part specifier for BODY[...], e.g. "1" or "1.2"
+    subtype: str        # "plain" or "html"
+    encoding: str       # Content-Transfer-Encoding, lower-case
+    charset: str
+    size: int           # Encoded size in bytes
+
+
+def _lower(value: Any) -> str:
+    if isinstance(value, bytes):
+        value = value.decode('ascii', 'replace')
+    return value.lower() if isinstance(value, str) else ''
+
+
+def _params(value: Any) -> Dict[str, str]:
+    if not isinstance(value, list):
+        return {}
+    return {_lower(k): _lower(v) for k, v in zip(value[::2], value[1::2])}
+
+
+def _walk_structure(structure: list, section: str) -> Iterator[Tuple[str, list]]:
+    """Yield (section, body) for every non-multipart part, in MIME order."""
+    if structure and isinstance(structure[0], list):
+        # Multipart: child bodies come first, then the subtype and extensions
+        for number, child in enumerate(structure, 1):
+            if not isinstance(child, list):
+                break
+            yield from _walk_structure(child, f"{section}.{number}" if section else str(number))
+    else:
+        yield section or '1', structure
+
+
+def find_text_part(structure: Any) -> Optional[TextPart]:
+    """
+    Pick the part to download from a parsed BODYSTRUCTURE.
+
+    The first inline text/plain part is preferred, then the first text/html
+    part; attachments and encapsulated messages are skipped.
+
+    Args:
+        structure: BODYSTRUCTURE value from parse_fetch_response()
+
+    Returns:
+        TextPart, or None if the message has no usable text part
+    """
+    if not isinstance(structure, list) or not structure:
+        return None
+    found: Dict[str, TextPart] = {}
+    for section, body in _walk_structure(structure, ''):
+        if len(body) < 7 or _lower(body[0]) != 'text':
+            continue
+        subtype = _lower(body[1])
+        if subtype not in ('plain', 'html') or subtype in found:
+            continue
+        # Text parts: type subtype params id description encoding size lines [md5 disposition ...]
+        disposition = body[9] if len(body) > 9 else None
+        if isinstance(disposition, list) and disposition and _lower(disposition[0]) == 'attachment':
+            continue
+        found[subtype] = TextPart(
+            section=section,
+            subtype=subtype,
+            encoding=_lower(body[5]) or '7bit',
+            charset=_params(body[2]).get('charset') or 'utf-8',
+            size=body[6] if isinstance(body[6], int) else 0,
+        )
+    return found.get('plain') or found.get('html')
+
+
+def decode_text_part(data: bytes, part: TextPart, truncated: bool = False) -> str:
+    """
+    Decode a fetched body part by its transfer encoding and charset.
+
+    Args:
+        data: Part bytes as fetched with BODY[section] (possibly a partial range)
+        part: The part's BODYSTRUCTURE description
+        truncated: Whether data is only a prefix of the part, so a trailing
+            incomplete base64 quantum or quoted-printable escape is dropped
+
+    Returns:
+        str: Decoded text
+    """
+    if part.encoding == 'base64':
+        data = _NON_BASE64_RE.sub(b'', data)
+        if truncated:
+            data = data[:len(data) - len(data) % 4]
+        try:
+            payload = binascii.a2b_base64(data)
+        except binascii.Error:
+            payload = b''
+    elif part.encoding == 'quoted-printable':
+        if truncated:
+            data = _PARTIAL_QP_ESCAPE_RE.sub(b'', data)
+        payload = quopri.decodestring(data)
+    else:
+        payload = data
+    try:
+        return payload.decode(part.charset, errors='replace')
+    except LookupError:
+        return payload.decode('utf-8', errors='replace')
@@ -0,0 +1,245 @@
+"""
+MFA Code Extraction Engine for MFARelay
+Precompiled single-pass matching of MFA codes, keywords and services.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Subject keywords that indicate MFA emails
+MFA_KEYWORDS = (
+    'verification', 'authenticate', 'login code', 'security code',
+    'two-factor', '2fa', 'mfa', 'access code', 'signin code',
+)
+
+# Sender fragments common to MFA senders
+MFA_SENDER_PATTERNS = (
+    'noreply', 'no-reply', 'security', 'auth', 'verify',
+    'google', 'microsoft', 'github', 'aws', 'azure',
+)
+
+# Words preceding a code that make a match contextual (higher confidence)
+CODE_CONTEXT_WORDS = ('code', 'verification', 'authenticate', 'login')
+
+# Service aliases found in sender or subject text
+SERVICE_ALIASES: Dict[str, Tuple[str, ...]] = {
+    'google': ('google', 'gmail', 'accounts.google'),
+    'microsoft': ('microsoft', 'outlook', 'live.com', 'hotmail'),
+    'github': ('github', 'noreply@github'),
+    'aws': ('aws', 'amazon', 'no-reply@aws'),
+    'azure': ('azure',),
+    'apple': ('apple', 'icloud', 'appleid'),
+    'facebook': ('facebook', 'meta'),
+    'twitter': ('twitter', 'x.com'),
+    'linkedin': ('linkedin',),
+    'discord': ('discord',),
+    'slack': ('slack',),
+    'dropbox': ('dropbox',),
+    'spotify': ('spotify',),
+    'netflix': ('netflix',),
+    'paypal': ('paypal',),
+    'coinbase': ('coinbase',),
+    'binance': ('binance',),
+}
+
+# Display names for services whose title-cased id reads wrong
+SERVICE_DISPLAY_NAMES: Dict[str, str] = {
+    'github': 'GitHub',
+    'aws': 'AWS',
+    'linkedin': 'LinkedIn',
+    'paypal': 'PayPal',
+}
+
+
+def service_display_name(service: str) -> str:
+    """Return the user-facing name for a service id."""
+    return SERVICE_DISPLAY_NAMES.get(service, service.title())
+
+
+def trie_pattern(words: Iterable[str]) -> str:
+    """
+    Build a regex alternation that shares common prefixes (a trie).
+
+    The compiled pattern scans text once in C with prefix-shared branches,
+    which is the Aho-Corasick-style multi-keyword match Python can do fastest
+    without a native extension.
+
+    Args:
+        words: Literal keywords (matched case-sensitively as given)
+
+    Returns:
+        str: Regex source matching any of the words
+    """
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if optional else group
+
+    return build(trie)
+
+
+@dataclass
+class ExtractionResult:
+    """Result of scanning one message."""
+    codes: List[str] = field(default_factory=list)
+    keyword: Optional[str] = None
+    service: Optional[str] = None
+
+
+class MFAExtractor:
+    """
+    Compiled MFA extraction engine.
+
+    All patterns are compiled once; instances are immutable and safe to share
+    between monitors (see get_default_extractor()).
+    """
+
+    def __init__(self, keywords: Iterable[str] = MFA_KEYWORDS,
+                 sender_patterns: Iterable[str] = MFA_SENDER_PATTERNS,
+                 service_aliases: Optional[Dict[str, Iterable[str]]] = None,
+                 context_words: Iterable[str] = CODE_CONTEXT_WORDS):
+        """
+        Compile the matching engine.
+
+        Args:
+            keywords: Subject keywords indicating an MFA email
+            sender_patterns: Sender fragments indicating an MFA email
+            service_aliases: Service name to identifying fragments
+            context_words: Words that introduce a code ("code: 123456")
+        """
+        service_aliases = service_aliases or SERVICE_ALIASES
+
+        self._keyword_re = re.compile(trie_pattern(k.lower() for k in keywords))
+        self._sender_re = re.compile(trie_pattern(p.lower() for p in sender_patterns))
+
+        self._alias_to_service = {
+            alias.lower(): service
+            for service, aliases in service_aliases.items()
+            for alias in aliases
+        }
+        self._service_re = re.compile(trie_pattern(self._alias_to_service))
+
+        # One alternation, tried left to right at each position: contextual
+        # codes first so "CODE 123456" is not consumed as an alphanumeric token.
+        # The leading lookahead lets the scanner skip positions that cannot
+        # start any branch without entering the alternation.
+        context_words = [w.lower() for w in context_words]
+        first_chars = ''.join(sorted({w[0] for w in context_words if w}))
+        self._code_re = re.compile(
+            r'(?=[0-9A-Z' + re.escape(first_chars) + r'])(?:'
+            r'(?i:' + trie_pattern(context_words) + r')\s*:?\s*(?P<ctx>\d{4,8})'
+            r'|\b(?P<num>\d{4,8})\b'
+            r'|\b(?P<alnum>[A-Z0-9]{4,8})\b)'
+        )
+
+    def match_keyword(self, subject: str) -> Optional[str]:
+        """Return the first MFA keyword found in the subject, if any."""
+        match = self._keyword_re.search(subject.lower())
+        return match.group(0) if match else None
+
+    def match_sender(self, sender: str) -> Optional[str]:
+        """Return the first MFA sender pattern found in the sender, if any."""
+        match = self._sender_re.search(sender.lower())
+        return match.group(0) if match else None
+
+    def is_likely_mfa(self, subject: str, sender: str) -> bool:
+        """
+        Quick header-only check for whether an email likely carries a code.
+
+        Args:
+            subject: Email subject line
+            sender: Email sender address
+
+        Returns:
+            bool: True if the subject or sender matches
+        """
+        return bool(self._keyword_re.search(subject.lower()) or self._sender_re.search(sender.lower()))
+
+    def match_service(self, *texts: str) -> Optional[str]:
+        """Return the first service whose alias appears in the given texts."""
+        for text in texts:
+            match = self._service_re.search(text.lower())
+            if match:
+                return service_display_name(self._alias_to_service[match.group(0)])
+        return None
+
+    def extract_codes(self, text: str) -> List[str]:
+        """
+        Find codes in message text with a single regex pass.
+
+        Contextual codes ("verification code: 123456") win; otherwise the first
+        standalone numeric code is used, then the first alphanumeric token
+        containing a digit.
+
+        Args:
+            text: Decoded message text
+
+        Returns:
+            List[str]: Unique codes in order of appearance
+        """
+        contextual: List[str] = []
+        first_numeric: Optional[str] = None
+        first_alnum: Optional[str] = None
+
+        for match in self._code_re.finditer(text):
+            code = match.group('ctx')
+            if code is not None:
+                if code not in contextual:
+                    contextual.append(code)
+            elif match.group('num') is not None:
+                if first_numeric is None:
+                    first_numeric = match.group('num')
+            elif first_alnum is None and any(c.isdigit() for c in match.group('alnum')):
+                first_alnum = match.group('alnum')
+
+        if contextual:
+            return contextual
+        fallback = first_numeric or first_alnum
+        return [fallback] if fallback else []
+
+    def extract(self, text: str, subject: str = '', sender: str = '') -> ExtractionResult:
+        """
+        Extract codes, the matched MFA keyword and the service for one message.
+
+        Args:
+            text: Decoded message text
+            subject: Email subject line
+            sender: Email sender address
+
+        Returns:
+            ExtractionResult: Codes plus keyword/service context
+        """
+        return ExtractionResult(
+            codes=self.extract_codes(text),
+            keyword=self.match_keyword(subject) or self.match_sender(sender),
+            service=self.match_service(sender, subject),
+        )
+
+
+_default_extractor: Optional[MFAExtractor] = None
+
+
+def get_default_extractor() -> MFAExtractor:
+    """
+    Get the process-wide extractor, compiling it on first use.
+
+    Returns:
+        MFAExtractor: Shared engine built from the default tables
+    """
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = MFAExtractor()
+    return _default_extractor
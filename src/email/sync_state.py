@@ -0,0 +1,101 @@
+"""
+IMAP Sync State for MFARelay
+Persists per-account (UIDVALIDITY, last processed UID) checkpoints in a local SQLite file.
+"""
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+
+class SyncStateStore:
+    """Small SQLite-backed checkpoint store shared by all email monitors."""
+
+    def __init__(self, path: Optional[str] = "data/imap_state.db"):
+        """
+        Open (or create) the checkpoint store.
+
+        Args:
+            path: SQLite file path, or None to keep checkpoints in memory only
+        """
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[int, int]] = {}
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        else:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS imap_checkpoints (
+                account_key TEXT PRIMARY KEY,
+                uidvalidity INTEGER NOT NULL,
+                last_uid INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+
+    def get(self, account_key: str) -> Optional[Tuple[int, int]]:
+        """
+        Get the checkpoint for an account.
+
+        Args:
+            account_key: Stable account identifier (user@host/folder)
+
+        Returns:
+            (uidvalidity, last_uid) or None if the account has no checkpoint
+        """
+        with self._lock:
+            if account_key in self._cache:
+                return self._cache[account_key]
+            row = self._conn.execute(
+                "SELECT uidvalidity, last_uid FROM imap_checkpoints WHERE account_key = ?",
+                (account_key,)
+            ).fetchone()
+            if row:
+                self._cache[account_key] = (row[0], row[1])
+                return self._cache[account_key]
+            return None
+
+    def set(self, account_key: str, uidvalidity: int, last_uid: int):
+        """
+        Record the last processed UID for an account.
+
+        Args:
+            account_key: Stable account identifier (user@host/folder)
+            uidvalidity: Mailbox UIDVALIDITY the UID belongs to
+            last_uid: Highest UID that has been processed
+        """
+        with self._lock:
+            if self._cache.get(account_key) == (uidvalidity, last_uid):
+                return
+            self._conn.execute(
+                """
+                INSERT INTO imap_checkpoints (account_key, uidvalidity, last_uid, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(account_key) DO UPDATE SET
+                    uidvalidity = excluded.uidvalidity,
+                    last_uid = excluded.last_uid,
+                    updated_at = excluded.updated_at
+                """,
+                (account_key, uidvalidity, last_uid, datetime.now().isoformat())
+            )
+            self._cache[account_key] = (uidvalidity, last_uid)
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing sync state store: {e}")
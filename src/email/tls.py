@@ -0,0 +1,124 @@
+"""
+TLS Session Cache for MFARelay
+Shared client SSLContext that resumes TLS sessions per IMAP host.
+"""
+
+import ssl
+import threading
+from typing import Any, Dict, Optional, Union
+
+SSLConnection = Union[ssl.SSLObject, ssl.SSLSocket]
+
+
+class SessionCachingContext(ssl.SSLContext):
+    """
+    Client context that offers the last session seen for a host on every new
+    connection to it, turning reconnects into abbreviated handshakes.
+
+    Both engines go through this context: asyncio streams call ``wrap_bio``
+    and imaplib calls ``wrap_socket``. Sessions are recorded with
+    ``remember()`` once a connection has read from the server (TLS 1.3
+    tickets arrive after the handshake). A server that rejects a stale
+    session simply falls back to a full handshake.
+    """
+
+    def __new__(cls, protocol: int = ssl.PROTOCOL_TLS_CLIENT, *args, **kwargs):
+        return super().__new__(cls, protocol, *args, **kwargs)
+
+    def __init__(self, protocol: int = ssl.PROTOCOL_TLS_CLIENT):
+        super().__init__()
+        self._sessions: Dict[str, ssl.SSLSession] = {}
+        self._sessions_lock = threading.Lock()  # imaplib connects on executor threads
+        self.full_handshakes = 0
+        self.resumed_handshakes = 0
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self._cached(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                server_hostname=server_hostname, session=session)
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self._cached(server_hostname)
+        return super().wrap_socket(sock, server_side=server_side,
+                                   do_handshake_on_connect=do_handshake_on_connect,
+                                   suppress_ragged_eofs=suppress_ragged_eofs,
+                                   server_hostname=server_hostname, session=session)
+
+    def _cached(self, server_hostname: Optional[str]) -> Optional[ssl.SSLSession]:
+        with self._sessions_lock:
+            return self._sessions.get(server_hostname) if server_hostname else None
+
+    def remember(self, server_hostname: str, connection: SSLConnection, count: bool = True) -> bool:
+        """
+        Store the connection's session for the next connection to the host.
+
+        Args:
+            server_hostname: Host the connection was made to
+            connection: Established SSLObject or SSLSocket
+            count: Count this connection in the handshake statistics
+
+        Returns:
+            bool: Whether the connection itself was resumed
+        """
+        reused = bool(connection.session_reused)
+        if count:
+            if reused:
+                self.resumed_handshakes += 1
+            else:
+                self.full_handshakes += 1
+        session = connection.session
+        if session is not None:
+            with self._sessions_lock:
+                self._sessions[server_hostname] = session
+        return reused
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get session cache statistics.
+
+        Returns:
+            Dict[str, Any]: Cached hosts and full/resumed handshake counts
+        """
+        return {
+            "cached_hosts": len(self._sessions),
+            "full_handshakes": self.full_handshakes,
+            "resumed_handshakes": self.resumed_handshakes,
+        }
+
+
+_contexts: Dict[Optional[str], SessionCachingContext] = {}
+_contexts_lock = threading.Lock()
+
+
+def get_session_context(cafile: Optional[str] = None) -> SessionCachingContext:
+    """
+    Return the process-wide session-caching context for a trust store.
+
+    Args:
+        cafile: CA bundle to trust instead of the system store (e.g. a private mail server)
+
+    Returns:
+        SessionCachingContext: Context shared by every monitor using the same CA bundle
+    """
+    with _contexts_lock:
+        context = _contexts.get(cafile)
+        if context is None:
+            context = SessionCachingContext()
+            if cafile:
+                context.load_verify_locations(cafile=cafile)
+            else:
+                context.load_default_certs()
+            _contexts[cafile] = context
+        return context
+
+
+def get_session_stats() -> Dict[str, Any]:
+    """Combined statistics for every shared context in this process."""
+    stats = {"cached_hosts": 0, "full_handshakes": 0, "resumed_handshakes": 0}
+    for context in list(_contexts.values()):
+        for key, value in context.get_stats().items():
+            stats[key] += value
+    return stats
@@ -12,13 +12,21 @@ import logging
 import signal
 import sys
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
 
 from src.config.config_manager import ConfigManager
 from src.email.email_monitor import EmailMonitor
+from src.email.sync_state import SyncStateStore
+from src.sms.quota import create_sms_quota
 from src.sms.twilio_client import TwilioClient
-from src.utils.logger import setup_logger
+from src.utils.logger import setup_logger, shutdown_logging
+from src.core.account_source import create_account_source
+from src.core.control_server import create_control_server
 from src.core.mfa_relay import MFARelay
+from src.core.supervisor import ShardSupervisor, account_id
+from src.core.leases import LeaseCoordinator, LeaseManager
+from src.utils.db import Database
+from src.utils.tracing import configure_tracing, get_tracer
 
 
 class MFARelayApp:
@@ -30,7 +38,19 @@ class MFARelayApp:
         self.config_manager = None
         self.twilio_client = None
         self.email_monitors: List[EmailMonitor] = []
+        self.sync_state = None
         self.mfa_relay = None
+        self.lease_db = None
+        self.lease_coordinator = None
+        self.lease_task = None
+        self.accounts: Dict[str, Dict[str, Any]] = {}  # Applied account configs by account id
+        self.account_monitors: Dict[str, str] = {}  # Account id -> monitor account key
+        self.account_source = None
+        self.account_source_task = None
+        self.reload_task = None
+        self.control_server = None
+        self.reload_lock = asyncio.Lock()
+        self.config_mtime = None
         self.running = False
         
     async def initialize(self) -> bool:
@@ -49,17 +69,26 @@ class MFARelayApp:
             
             # Setup logging with configuration
             config = self.config_manager.get_config()
+            self.config_mtime = self.config_manager.get_mtime()
             log_config = config.get('logging', {})
             self.logger = setup_logger(
                 name='mfarelay',
                 level=log_config.get('level', 'INFO'),
                 log_file=log_config.get('file_path'),
                 max_bytes=log_config.get('max_bytes', 10485760),  # 10MB default
-                backup_count=log_config.get('backup_count', 5)
+                backup_count=log_config.get('backup_count', 5),
+                json_format=log_config.get('format', 'text') == 'json',
+                use_queue=log_config.get('queue', False),
+                queue_size=log_config.get('queue_size', 10000),
+                debug_rate_limit=log_config.get('debug_rate_limit', 0),
+                include=('src',)  # Module loggers (email monitors, SMS transport, quotas)
             )
             
             self.logger.info("Starting MFARelay application")
             
+            # Per-stage tracing (off unless tracing.enabled)
+            configure_tracing(config.get('tracing', {}))
+            
             # Initialize Twilio client
             twilio_config = config.get('twilio', {})
             if not twilio_config:
@@ -70,25 +99,105 @@ class MFARelayApp:
                 account_sid=twilio_config.get('account_sid'),
                 auth_token=twilio_config.get('auth_token'),
                 from_number=twilio_config.get('from_number'),
-                to_number=twilio_config.get('to_number')
+                to_number=twilio_config.get('to_number'),
+                transport=twilio_config.get('transport', 'async'),
+                base_url=twilio_config.get('base_url', 'https://api.twilio.com'),
+                timeout=twilio_config.get('timeout', 10),
+                pool_size=twilio_config.get('pool_size', 4),
+                send_rate=twilio_config.get('send_rate'),
+                send_burst=twilio_config.get('send_burst', 1),
+                quota=create_sms_quota(config.get('sms_quota', {}), self.logger)
             )
+            if self.twilio_client.quota:
+                await self.twilio_client.quota.start()
             
             # Test Twilio connection
             if not await self.twilio_client.test_connection():
                 self.logger.error("Failed to connect to Twilio")
                 return False
             
-            # Initialize email monitors
-            email_accounts = config.get('email_accounts', [])
-            if not email_accounts:
-                self.logger.error("No email accounts configured")
-                return False
+            # Initialize email monitors, from the config file or (multi-tenant) the database
+            self.account_source = create_account_source(config.get('account_source', {}), self.logger)
+            if self.account_source:
+                email_accounts = await asyncio.to_thread(self.account_source.load)
+            else:
+                email_accounts = config.get('email_accounts', [])
+                if not email_accounts:
+                    self.logger.error("No email accounts configured")
+                    return False
+            self.accounts = {account_id(account): account for account in email_accounts}
+            
+            # Supervisor mode: monitors run in sharded worker processes, which
+            # connect on their own; this process only dispatches SMS
+            monitoring_config = config.get('email_monitoring', {})
+            worker_processes = monitoring_config.get('worker_processes', 1)
+            lease_config = config.get('leases', {})
+            leases_enabled = lease_config.get('enabled', False)
+            if worker_processes > 1:
+                self.mfa_relay = ShardSupervisor(
+                    config=config,
+                    accounts=[] if leases_enabled else email_accounts,
+                    twilio_client=self.twilio_client,
+                    logger=self.logger,
+                    workers=worker_processes
+                )
+                if leases_enabled:
+                    self._setup_leases(
+                        lease_config, email_accounts,
+                        self.mfa_relay.add_account, self.mfa_relay.remove_account
+                    )
+                self.logger.info(
+                    f"MFARelay initialized in supervisor mode: {len(email_accounts)} accounts "
+                    f"across {worker_processes} worker processes"
+                )
+                return True
+            
+            # Shared UID checkpoint store for incremental sync
+            self.sync_state = SyncStateStore(monitoring_config.get('state_file', 'data/imap_state.db'))
+            
+            # Lease mode: accounts are started as this node claims them
+            if leases_enabled:
+                self.mfa_relay = MFARelay(
+                    config=config,
+                    email_monitors=[],
+                    twilio_client=self.twilio_client,
+                    logger=self.logger
+                )
+                self._setup_leases(
+                    lease_config, email_accounts,
+                    self._add_account, self._remove_account
+                )
+                self.logger.info(
+                    f"MFARelay initialized in lease mode: {len(email_accounts)} accounts shared "
+                    f"as node {self.lease_coordinator.manager.owner_id}"
+                )
+                return True
+            
+            # Database accounts: started concurrently, and kept even if not reachable
+            # yet (tenants' servers are retried by their checks)
+            if self.account_source:
+                self.mfa_relay = MFARelay(
+                    config=config,
+                    email_monitors=[],
+                    twilio_client=self.twilio_client,
+                    logger=self.logger
+                )
+                connect_slots = asyncio.Semaphore(monitoring_config.get('max_concurrent_connects', 20))
+                
+                async def add(account_config):
+                    async with connect_slots:
+                        await self._add_account(account_config)
+                
+                await asyncio.gather(*(add(account) for account in email_accounts))
+                self.logger.info(f"MFARelay initialized with {len(email_accounts)} database accounts")
+                return True
             
             for account_config in email_accounts:
                 try:
-                    monitor = EmailMonitor(config=account_config)
+                    monitor = EmailMonitor(config=account_config, sync_state=self.sync_state)
                     if await monitor.test_connection():
                         self.email_monitors.append(monitor)
+                        self.account_monitors[account_id(account_config)] = monitor.account_key
                         self.logger.info(f"Successfully initialized email monitor for {account_config.get('name', 'Unknown')}")
                     else:
                         self.logger.error(f"Failed to connect to email account: {account_config.get('name', 'Unknown')}")
@@ -100,6 +209,11 @@ class MFARelayApp:
                 self.logger.error("No email monitors successfully initialized")
                 return False
             
+            # Accounts that failed at startup count as not yet applied, so a
+            # reload starts them (and keeps them, retrying, if still unreachable)
+            self.accounts = {key: account for key, account in self.accounts.items()
+                             if key in self.account_monitors}
+            
             # Initialize MFA relay core
             self.mfa_relay = MFARelay(
                 config=config,
@@ -118,6 +232,142 @@ class MFARelayApp:
                 print(f"ERROR: Failed to initialize MFARelay: {e}")
             return False
     
+    def _setup_leases(self, lease_config: Dict[str, Any], email_accounts: List[Dict[str, Any]],
+                      add_account, remove_account):
+        """Create the lease coordinator that assigns accounts to this node."""
+        self.lease_db = Database(lease_config.get('database_url', 'sqlite:///data/leases.db'))
+        manager = LeaseManager(
+            self.lease_db,
+            owner_id=lease_config.get('node_id'),
+            lease_seconds=lease_config.get('lease_seconds', 15)
+        )
+        self.lease_coordinator = LeaseCoordinator(
+            manager,
+            email_accounts,
+            account_id=account_id,
+            add_account=add_account,
+            remove_account=remove_account,
+            heartbeat_interval=lease_config.get('heartbeat_interval', 5),
+            batch_size=lease_config.get('claim_batch_size', 100),
+            max_accounts=lease_config.get('max_accounts'),
+            logger=self.logger
+        )
+    
+    async def _add_account(self, account_config: Dict[str, Any]):
+        """Start monitoring an account this node just leased (or that was added or changed on reload)."""
+        monitor = EmailMonitor(
+            config=account_config, sync_state=self.sync_state,
+            credentials=self.account_source.password if self.account_source else None
+        )
+        # Database accounts connect on their first check, so their passwords
+        # are only read (and decrypted) once the account is actually polled
+        if not self.account_source and not await monitor.connect():
+            self.logger.warning(f"Account {monitor.name} not reachable yet, retrying on first check")
+        key = account_id(account_config)
+        previous_key = self.account_monitors.get(key)
+        if previous_key and previous_key != monitor.account_key:
+            # Changed username, host or folder: the old session is a different monitor
+            await self.mfa_relay.remove_monitor(previous_key)
+        self.account_monitors[key] = monitor.account_key
+        await self.mfa_relay.add_monitor(monitor)
+    
+    async def _remove_account(self, key: str):
+        """Stop monitoring an account whose lease this node no longer holds (or that was removed)."""
+        account_key = self.account_monitors.pop(key, None)
+        if account_key:
+            await self.mfa_relay.remove_monitor(account_key)
+    
+    async def reload_config(self) -> bool:
+        """
+        Re-read the configuration and apply account changes in place.
+        
+        Only added, removed and changed accounts are started, stopped or
+        reconnected; every other IMAP session, the dedup store and the SMS
+        queue stay live. Changes outside email_accounts need a restart.
+        
+        Returns:
+            bool: True if the new configuration was applied
+        """
+        async with self.reload_lock:
+            self.config_mtime = self.config_manager.get_mtime()
+            previous = self.config_manager.get_config()
+            if not await self.config_manager.reload_config():
+                self.logger.error("Configuration reload failed, keeping the running configuration")
+                return False
+            config = self.config_manager.get_config()
+            
+            for section in sorted(set(previous) | set(config)):
+                if section != 'email_accounts' and previous.get(section) != config.get(section):
+                    self.logger.warning(f"Configuration section '{section}' changed; restart to apply it")
+            
+            if self.account_source:
+                self.logger.info("Configuration reloaded (accounts follow the database)")
+                return True
+            
+            accounts = {account_id(account): account for account in config.get('email_accounts', [])}
+            removed = self.accounts.keys() - accounts.keys()
+            changed = [key for key, account in accounts.items() if self.accounts.get(key) != account]
+            if not removed and not changed:
+                self.logger.info("Configuration reloaded, accounts unchanged")
+                return True
+            
+            await self._apply_accounts(accounts, removed, changed)
+            self.accounts = accounts
+            self.logger.info(
+                f"Configuration reloaded: {len(removed)} accounts removed, "
+                f"{len(changed)} added or changed, {len(accounts) - len(changed)} untouched"
+            )
+            return True
+    
+    async def _apply_accounts(self, accounts: Dict[str, Dict[str, Any]], removed, changed: List[str]):
+        """Apply an account diff in the current run mode."""
+        if self.lease_coordinator:
+            # Unowned and removed accounts follow on the next heartbeat; owned
+            # accounts whose config changed are restarted now
+            self.lease_coordinator.set_accounts(list(accounts.values()))
+            for key in changed:
+                if key in self.lease_coordinator.owned:
+                    await self.lease_coordinator.add_account(accounts[key])
+        elif isinstance(self.mfa_relay, ShardSupervisor):
+            await self.mfa_relay.set_accounts(list(accounts.values()))
+        else:
+            for key in removed:
+                await self._remove_account(key)
+            await asyncio.gather(*(self._add_account(accounts[key]) for key in changed))
+    
+    async def _follow_account_source(self, interval: float):
+        """Apply database account changes as they appear (no full reloads)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                upserts, deleted = await asyncio.to_thread(self.account_source.changes)
+            except Exception as e:
+                self.logger.error(f"Failed to read account changes: {e}")
+                continue
+            if not upserts and not deleted:
+                continue
+            async with self.reload_lock:
+                accounts = dict(self.accounts)
+                removed = deleted & accounts.keys()
+                for key in removed:
+                    del accounts[key]
+                changed = [a['id'] for a in upserts if accounts.get(a['id']) != a]
+                accounts.update((a['id'], a) for a in upserts)
+                await self._apply_accounts(accounts, removed, changed)
+                self.accounts = accounts
+                self.logger.info(
+                    f"Account changes applied: {len(removed)} removed, {len(changed)} added or changed"
+                )
+    
+    async def _watch_config(self, interval: float):
+        """Reload the configuration whenever the file's modification time changes."""
+        while True:
+            await asyncio.sleep(interval)
+            mtime = self.config_manager.get_mtime()
+            if mtime is not None and mtime != self.config_mtime:
+                self.logger.info("Configuration file changed, reloading")
+                await self.reload_config()
+    
     async def start(self):
         """Start the MFARelay service."""
         if not self.mfa_relay:
@@ -128,6 +378,28 @@ class MFARelayApp:
             self.running = True
             self.logger.info("Starting MFARelay service")
             
+            if self.lease_coordinator:
+                self.lease_task = asyncio.create_task(self.lease_coordinator.run())
+            
+            if self.account_source:
+                self.account_source_task = asyncio.create_task(self._follow_account_source(
+                    self.config_manager.get_config().get('account_source', {}).get('poll_interval', 10)
+                ))
+            
+            reload_config = self.config_manager.get_config().get('config_reload', {})
+            if reload_config.get('watch', False):
+                self.reload_task = asyncio.create_task(
+                    self._watch_config(reload_config.get('interval', 5))
+                )
+            
+            # Metrics and relay commands, served from this process
+            self.control_server = create_control_server(
+                self.config_manager.get_config().get('control', {}), self.mfa_relay, self.logger
+            )
+            if self.control_server:
+                self.control_server.command('/relay/expect-code', self._expect_code)
+                await self.control_server.start()
+            
             # Start the main relay service
             await self.mfa_relay.start()
             
@@ -135,6 +407,21 @@ class MFARelayApp:
             self.logger.error(f"Error starting MFARelay service: {e}")
             raise
     
+    async def _expect_code(self, payload: Dict[str, Any]):
+        """Control route: burst mode for a user's accounts (forwarded by the API)."""
+        user_id = payload.get('user_id')
+        window = payload.get('window_seconds')
+        if user_id is not None and not isinstance(user_id, str):
+            return 400, {"detail": "user_id must be a string"}
+        if window is not None and (isinstance(window, bool) or not isinstance(window, (int, float)) or window <= 0):
+            return 400, {"detail": "window_seconds must be a positive number"}
+        accounts = self.mfa_relay.expect_code(user_id, window)
+        return 200, {
+            "user_id": user_id,
+            "accounts": accounts,
+            "window_seconds": min(window or self.mfa_relay.burst_window, self.mfa_relay.burst_max_window)
+        }
+    
     async def stop(self):
         """Stop the MFARelay service gracefully."""
         if not self.running:
@@ -144,23 +431,57 @@ class MFARelayApp:
         self.running = False
         
         try:
+            if self.control_server:
+                await self.control_server.stop()
+            
+            for task in (self.reload_task, self.account_source_task):
+                if task:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+            
             # Stop MFA relay core
             if self.mfa_relay:
                 await self.mfa_relay.stop()
             
+            # Release leases so other nodes take these accounts over immediately
+            if self.lease_task:
+                self.lease_task.cancel()
+                await asyncio.gather(self.lease_task, return_exceptions=True)
+            if self.lease_db:
+                self.lease_db.close()
+            if self.account_source:
+                self.account_source.db.close()
+            
+            if self.sync_state:
+                self.sync_state.close()
+
+            if self.twilio_client:
+                await self.twilio_client.close()
+            
+            get_tracer().close()
+            
             self.logger.info("MFARelay service stopped successfully")
             
         except Exception as e:
             self.logger.error(f"Error stopping MFARelay service: {e}")
+        finally:
+            # Flush queued log records
+            shutdown_logging()
     
     def setup_signal_handlers(self):
-        """Setup signal handlers for graceful shutdown."""
+        """Setup signal handlers for graceful shutdown and configuration reload."""
         def signal_handler(signum, frame):
             self.logger.info(f"Received signal {signum}, initiating graceful shutdown...")
             asyncio.create_task(self.stop())
         
+        def reload_handler(signum, frame):
+            self.logger.info("Received SIGHUP, reloading configuration...")
+            asyncio.create_task(self.reload_config())
+        
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, reload_handler)
 
 
 async def main():
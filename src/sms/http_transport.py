@@ -0,0 +1,396 @@
+"""
+Async HTTP Transport for MFARelay
+Keep-alive HTTP/1.1 connection pool on asyncio streams, plus a Twilio Messages API client.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import ssl
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_TWILIO_BASE_URL = "https://api.twilio.com"
+TWILIO_API_VERSION = "2010-04-01"
+
+
+class HTTPError(Exception):
+    """Raised when a request fails at the transport level."""
+
+
+class TwilioAPIError(Exception):
+    """Raised when the Twilio API returns an error response."""
+
+    def __init__(self, status: int, message: str, code: Optional[int] = None):
+        super().__init__(f"HTTP {status}: {message}" + (f" (code {code})" if code else ""))
+        self.status = status
+        self.code = code
+
+
+# Requests that may be replayed when the response is lost
+_IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class _StaleConnection(ConnectionError):
+    """A reused connection failed in a way that makes resending the request safe."""
+
+
+class HTTPResponse:
+    """A fully read HTTP response."""
+
+    def __init__(self, status: int, reason: str, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        """Decode the body as JSON."""
+        return json.loads(self.body.decode('utf-8')) if self.body else None
+
+
+class _Connection:
+    """One pooled keep-alive connection."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    @property
+    def usable(self) -> bool:
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncHTTPPool:
+    """
+    Pool of persistent HTTP/1.1 connections to a single origin.
+
+    Idle connections are reused so only the first request (per pool slot)
+    pays for TCP and TLS setup. At most ``pool_size`` requests are in flight;
+    further requests wait for a free slot.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 4, timeout: float = 10.0,
+                 idle_timeout: float = 60.0, ssl_context: Optional[ssl.SSLContext] = None,
+                 headers: Optional[Dict[str, str]] = None, keep_alive: bool = True):
+        """
+        Initialize pool settings; connections are opened on demand.
+
+        Args:
+            base_url: Origin such as "https://api.twilio.com"
+            pool_size: Maximum concurrent connections
+            timeout: Default per-request timeout in seconds (connect + response)
+            idle_timeout: Close pooled connections idle longer than this
+            ssl_context: Optional SSL context (defaults to system trust store)
+            headers: Headers sent with every request
+            keep_alive: Reuse connections between requests
+        """
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Unsupported base URL: {base_url}")
+
+        self.use_ssl = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.use_ssl else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.host_header = parts.netloc
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.keep_alive = keep_alive
+        self.headers = dict(headers or {})
+        self.ssl_context = (ssl_context or ssl.create_default_context()) if self.use_ssl else None
+
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self.logger = logging.getLogger(__name__)
+
+        # Metrics
+        self.connections_opened = 0
+        self.requests_sent = 0
+        self.connections_reused = 0
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None,
+                      headers: Optional[Dict[str, str]] = None,
+                      timeout: Optional[float] = None) -> HTTPResponse:
+        """
+        Send a request and read the full response.
+
+        Args:
+            method: HTTP method
+            path: Path (and query) relative to the base URL
+            body: Request body
+            headers: Extra request headers
+            timeout: Per-request timeout in seconds (defaults to the pool timeout)
+
+        Returns:
+            HTTPResponse: Status, headers and body
+
+        Raises:
+            HTTPError: On connection failure, timeout or malformed response
+        """
+        timeout = self.timeout if timeout is None else timeout
+        async with self._slots:
+            try:
+                return await asyncio.wait_for(self._request(method, path, body, headers), timeout)
+            except asyncio.TimeoutError:
+                raise HTTPError(f"{method} {path} timed out after {timeout}s")
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                raise HTTPError(f"{method} {path} failed: {e}") from e
+
+    async def _request(self, method: str, path: str, body: Optional[bytes],
+                       headers: Optional[Dict[str, str]]) -> HTTPResponse:
+        request = self._encode_request(method, path, body, headers)
+        conn, reused = await self._acquire()
+        try:
+            try:
+                response = await self._exchange(conn, request, method)
+            except _StaleConnection:
+                if not reused:
+                    raise
+                # The server had closed the idle connection (or the request
+                # is idempotent), so resending cannot duplicate its effect
+                conn.close()
+                conn, reused = await self._open(), False
+                response = await self._exchange(conn, request, method)
+        except BaseException:
+            conn.close()
+            raise
+
+        if reused:
+            self.connections_reused += 1
+        self._release(conn, response)
+        return response
+
+    def _encode_request(self, method: str, path: str, body: Optional[bytes],
+                        headers: Optional[Dict[str, str]]) -> bytes:
+        all_headers = {
+            'Host': self.host_header,
+            'Connection': 'keep-alive' if self.keep_alive else 'close',
+            'Accept': 'application/json',
+            **self.headers,
+            **(headers or {}),
+        }
+        if body is not None or method in ('POST', 'PUT', 'PATCH'):
+            all_headers['Content-Length'] = str(len(body or b''))
+        head = f"{method} {self.base_path}{path} HTTP/1.1\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in all_headers.items())
+        return (head + "\r\n").encode('latin-1') + (body or b'')
+
+    async def _exchange(self, conn: _Connection, request: bytes, method: str) -> HTTPResponse:
+        try:
+            conn.writer.write(request)
+            await conn.writer.drain()
+        except ConnectionError as e:
+            # Writing failed: the server was no longer reading this connection
+            raise _StaleConnection(str(e)) from e
+
+        # Once the request is written the server may have acted on it (a
+        # Messages POST may already be sent), so a lost response is only
+        # retried for idempotent methods; otherwise the caller decides
+        retry = _StaleConnection if method in _IDEMPOTENT_METHODS else ConnectionError
+        try:
+            status_line = await conn.reader.readline()
+        except ConnectionError as e:
+            raise retry(f"Connection lost before response: {e}") from e
+        if not status_line:
+            raise retry("Connection closed before response")
+        self.requests_sent += 1
+        conn.requests += 1
+        return await self._read_response(conn.reader, status_line, method)
+
+    async def _acquire(self) -> Tuple[_Connection, bool]:
+        """Return an idle connection if one is still usable, else open a new one."""
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if conn.usable and now - conn.last_used < self.idle_timeout:
+                return conn, True
+            conn.close()
+        return await self._open(), False
+
+    async def _open(self) -> _Connection:
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port,
+            ssl=self.ssl_context,
+            server_hostname=self.host if self.use_ssl else None
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    def _release(self, conn: _Connection, response: HTTPResponse):
+        """Return a connection to the pool unless either side asked to close it."""
+        if self.keep_alive and response.headers.get('connection', '').lower() != 'close' and conn.usable:
+            conn.last_used = time.monotonic()
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader, status_line: bytes,
+                             method: str) -> HTTPResponse:
+        parts = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ValueError(f"Malformed status line: {status_line!r}")
+        status = int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ''
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0].strip(), 16)
+                if size == 0:
+                    # Skip trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            headers['connection'] = 'close'
+
+        return HTTPResponse(status, reason, headers, body)
+
+    async def close(self):
+        """Close all idle connections."""
+        while self._idle:
+            self._idle.pop().close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get connection reuse statistics.
+
+        Returns:
+            Dict[str, int]: Connections opened, requests sent, reuses and idle connections
+        """
+        return {
+            "connections_opened": self.connections_opened,
+            "requests_sent": self.requests_sent,
+            "connections_reused": self.connections_reused,
+            "idle_connections": len(self._idle),
+        }
+
+
+class TwilioMessagesTransport:
+    """Async client for the Twilio REST endpoints MFARelay uses, over a keep-alive pool."""
+
+    def __init__(self, account_sid: str, auth_token: str, base_url: str = DEFAULT_TWILIO_BASE_URL,
+                 pool_size: int = 4, timeout: float = 10.0,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        """
+        Initialize the transport.
+
+        Args:
+            account_sid: Twilio Account SID
+            auth_token: Twilio Auth Token
+            base_url: API origin (point at a local stub for testing)
+            pool_size: Maximum concurrent connections
+            timeout: Per-request timeout in seconds
+            ssl_context: Optional SSL context
+        """
+        self.account_sid = account_sid
+        credentials = base64.b64encode(f"{account_sid}:{auth_token}".encode('utf-8')).decode('ascii')
+        self.pool = AsyncHTTPPool(
+            base_url,
+            pool_size=pool_size,
+            timeout=timeout,
+            ssl_context=ssl_context,
+            headers={
+                'Authorization': f"Basic {credentials}",
+                'User-Agent': 'MFARelay/1.0',
+            }
+        )
+        self._account_path = f"/{TWILIO_API_VERSION}/Accounts/{account_sid}"
+
+    async def send_message(self, body: str, from_: str, to: str,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Create an SMS via the Messages API.
+
+        Args:
+            body: Message text
+            from_: Sender phone number
+            to: Destination phone number
+            timeout: Optional per-request timeout override
+
+        Returns:
+            Dict[str, Any]: Created message resource (includes "sid")
+        """
+        form = urlencode({'Body': body, 'From': from_, 'To': to}).encode('utf-8')
+        return await self._call(
+            'POST', f"{self._account_path}/Messages.json", form,
+            {'Content-Type': 'application/x-www-form-urlencoded'}, timeout
+        )
+
+    async def fetch_account(self) -> Dict[str, Any]:
+        """
+        Fetch the account resource (also validates credentials).
+
+        Returns:
+            Dict[str, Any]: Account resource
+        """
+        return await self._call('GET', f"{self._account_path}.json")
+
+    async def list_usage_records(self, category: str, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        """
+        List usage records for a category and date range.
+
+        Args:
+            category: Usage category such as "sms"
+            start_date: ISO start date
+            end_date: ISO end date
+
+        Returns:
+            List[Dict[str, Any]]: Usage record resources
+        """
+        query = urlencode({'Category': category, 'StartDate': start_date, 'EndDate': end_date})
+        result = await self._call('GET', f"{self._account_path}/Usage/Records.json?{query}")
+        return result.get('usage_records', [])
+
+    async def _call(self, method: str, path: str, body: Optional[bytes] = None,
+                    headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> Dict[str, Any]:
+        response = await self.pool.request(method, path, body, headers, timeout)
+        try:
+            payload = response.json() or {}
+        except ValueError:
+            payload = {}
+        if response.status >= 400:
+            raise TwilioAPIError(
+                response.status,
+                payload.get('message') or response.reason,
+                payload.get('code')
+            )
+        return payload
+
+    async def close(self):
+        """Close pooled connections."""
+        await self.pool.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get connection pool statistics."""
+        return self.pool.get_stats()
@@ -0,0 +1,314 @@
+"""
+SMS Quotas for MFARelay
+Monthly per-user SMS limits and per-number send rates, enforced in memory.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.db import Database
+from src.utils.metrics import REGISTRY
+
+QUOTA_REJECTED = REGISTRY.counter(
+    'mfarelay_sms_quota_rejected_total', 'SMS not sent because the user reached the monthly limit'
+)
+THROTTLE_SECONDS = REGISTRY.histogram(
+    'mfarelay_sms_throttle_seconds', 'Time an SMS waited for its sender number\'s rate limit'
+)
+
+# Local stand-in for the Supabase table (database/schema.sql)
+_SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS mfa_sms_config (
+        id TEXT PRIMARY KEY,
+        project_id TEXT,
+        user_id TEXT,
+        twilio_account_sid_encrypted TEXT,
+        twilio_auth_token_encrypted TEXT,
+        twilio_from_number TEXT,
+        twilio_to_number TEXT,
+        monthly_sms_limit INTEGER DEFAULT 100,
+        current_month_usage INTEGER DEFAULT 0,
+        last_reset_date TEXT DEFAULT (date('now')),
+        is_active BOOLEAN DEFAULT 1,
+        created_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+        updated_at TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+        UNIQUE (project_id, user_id)
+    )
+"""
+
+
+class SMSQuotaExceeded(Exception):
+    """Raised instead of sending when a user has used up this month's SMS."""
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take a token, borrowing against the refill if none is left.
+
+        Returns:
+            float: Seconds until the taken token is covered (0 if available now)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class SendRateLimiter:
+    """
+    Paces sends per sender number to the provider's message rate.
+
+    Concurrent senders each reserve the next free slot, so a burst of codes
+    is spread out at ``rate`` per second instead of triggering a storm of
+    429 responses and retries.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Messages per second allowed from one number
+            burst: Messages one number may send back to back
+        """
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    async def acquire(self, number: str):
+        """Wait until ``number`` may send another message."""
+        bucket = self._buckets.get(number)
+        if bucket is None:
+            bucket = self._buckets[number] = TokenBucket(self.rate, self.burst)
+        delay = bucket.take()
+        THROTTLE_SECONDS.observe(delay)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class _Usage:
+    """One user's monthly allowance as seen by this process."""
+    limit: Optional[int]
+    used: int = 0
+    unsynced: int = 0  # Sends counted here but not yet added to current_month_usage
+
+
+class SMSQuota:
+    """
+    Monthly SMS limits from mfa_sms_config, checked in memory.
+
+    Each user's limit and usage are loaded once, then every send is checked
+    and counted against the in-memory copy without touching the database.
+    A background task periodically adds the counted sends to
+    ``current_month_usage`` in one batch and re-reads the table, which picks
+    up limit changes and sends made by other relays. A row whose
+    ``last_reset_date`` is before the current month is reset to zero, in
+    memory and in the database, when the month turns over.
+    """
+
+    def __init__(self, db: Database, sync_interval: float = 30.0, default_limit: Optional[int] = None,
+                 project_id: Optional[str] = None, logger: Optional[logging.Logger] = None):
+        """
+        Initialize the quota.
+
+        Args:
+            db: Database holding mfa_sms_config
+            sync_interval: Seconds between usage writes and re-reads
+            default_limit: Monthly limit for users without an SMS config row (unlimited if None)
+            project_id: Project of codes from accounts without one; only this
+                project's rows are loaded when set
+            logger: Logger instance
+        """
+        self.db = db
+        self.sync_interval = sync_interval
+        self.default_limit = default_limit
+        self.project_id = project_id
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._usage: Dict[Tuple[Optional[str], Optional[str]], _Usage] = {}
+        self._configured = set()  # Keys loaded from mfa_sms_config rows
+        self._month = date.today().replace(day=1)
+        self._task: Optional[asyncio.Task] = None
+        self._sync_lock = asyncio.Lock()
+
+        self.rejected = 0
+        self.syncs = 0
+        self.failed_syncs = 0
+
+        if db.dialect == 'sqlite':
+            db.execute(_SQLITE_SCHEMA)
+
+    def try_acquire(self, user_id: Optional[str], project_id: Optional[str] = None) -> bool:
+        """
+        Count one SMS against the user's monthly limit.
+
+        Returns:
+            bool: False if the limit is reached (nothing is counted)
+        """
+        self._roll_month()
+        key = (project_id or self.project_id, user_id)
+        usage = self._usage.get(key)
+        if usage is None:
+            if self.default_limit is None:
+                return True
+            usage = self._usage[key] = _Usage(self.default_limit)
+        if usage.limit is not None and usage.used >= usage.limit:
+            self.rejected += 1
+            QUOTA_REJECTED.inc()
+            return False
+        usage.used += 1
+        usage.unsynced += 1
+        return True
+
+    def release(self, user_id: Optional[str], project_id: Optional[str] = None):
+        """Give back an SMS counted by try_acquire() that was not sent."""
+        usage = self._usage.get((project_id or self.project_id, user_id))
+        if usage is not None and usage.used > 0:
+            usage.used -= 1
+            usage.unsynced -= 1
+
+    def limit(self, user_id: Optional[str], project_id: Optional[str] = None) -> Optional[int]:
+        """The user's monthly limit (None if unlimited)."""
+        usage = self._usage.get((project_id or self.project_id, user_id))
+        return usage.limit if usage else self.default_limit
+
+    def _roll_month(self):
+        month = date.today().replace(day=1)
+        if month != self._month:
+            # Sends of the old month not yet written are not carried over
+            self._month = month
+            for usage in self._usage.values():
+                usage.used = usage.unsynced = 0
+
+    async def start(self):
+        """Load limits and usage, then start the background sync."""
+        self._apply(await asyncio.to_thread(self._read))
+        self.logger.info(f"Loaded SMS quotas for {len(self._usage)} users")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background sync and write the remaining usage."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.sync()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    async def sync(self):
+        """Add counted sends to current_month_usage and re-read the table."""
+        async with self._sync_lock:
+            self._roll_month()
+            deltas = {key: usage.unsynced for key, usage in self._usage.items() if usage.unsynced}
+            for key in deltas:
+                self._usage[key].unsynced = 0
+            try:
+                await asyncio.to_thread(self._write, deltas)
+                rows = await asyncio.to_thread(self._read)
+                self.syncs += 1
+            except Exception as e:
+                self.failed_syncs += 1
+                self.logger.error(f"Failed to sync SMS usage: {e}")
+                for key, delta in deltas.items():
+                    self._usage[key].unsynced += delta
+                return
+            self._apply(rows)
+
+    def _date(self, value: date) -> Any:
+        return value.isoformat() if self.db.dialect == 'sqlite' else value
+
+    def _write(self, deltas: Dict[Tuple[Optional[str], Optional[str]], int]):
+        month_start = self._date(self._month)
+        with self.db.transaction():
+            self.db.execute(
+                "UPDATE mfa_sms_config SET current_month_usage = 0, last_reset_date = ? "
+                "WHERE last_reset_date IS NULL OR last_reset_date < ?",
+                [self._date(date.today()), month_start]
+            )
+            if deltas:
+                self.db.executemany(
+                    "UPDATE mfa_sms_config SET current_month_usage = current_month_usage + ? "
+                    "WHERE project_id = ? AND user_id = ?",
+                    [(delta, project_id, user_id) for (project_id, user_id), delta in deltas.items()]
+                )
+
+    def _read(self) -> List[Tuple[Any, ...]]:
+        where, params = ("project_id = ? AND is_active", [self.project_id]) if self.project_id else ("is_active", [])
+        return self.db.fetchall(
+            f"SELECT project_id, user_id, monthly_sms_limit, current_month_usage, last_reset_date "
+            f"FROM mfa_sms_config WHERE {where}", params
+        )
+
+    def _apply(self, rows: List[Tuple[Any, ...]]):
+        """Take limits and usage from _read() rows (on the event loop, like try_acquire())."""
+        month_start = self._month.isoformat()
+        configured = set()
+        for project_id, user_id, limit, used, last_reset in rows:
+            key = (str(project_id), str(user_id))
+            if last_reset is None or str(last_reset)[:10] < month_start:
+                used = 0  # Not reset yet this month
+            usage = self._usage.setdefault(key, _Usage(limit))
+            usage.limit = limit
+            usage.used = int(used or 0) + usage.unsynced
+            configured.add(key)
+
+        # Users whose row was deleted or deactivated fall back to the default limit
+        for key in self._configured - configured:
+            if self.default_limit is None:
+                self._usage.pop(key, None)
+            elif key in self._usage:
+                self._usage[key].limit = self.default_limit
+        self._configured = configured
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get quota statistics.
+
+        Returns:
+            Dict[str, Any]: Tracked users, rejected sends, unsynced sends and syncs
+        """
+        return {
+            "users": len(self._usage),
+            "rejected": self.rejected,
+            "unsynced": sum(usage.unsynced for usage in self._usage.values()),
+            "syncs": self.syncs,
+            "failed_syncs": self.failed_syncs,
+        }
+
+
+def create_sms_quota(config: Dict[str, Any], logger: Optional[logging.Logger] = None) -> Optional[SMSQuota]:
+    """
+    Create the SMS quota from the ``sms_quota`` config section.
+
+    Returns:
+        SMSQuota, or None when quotas are disabled
+    """
+    if not config.get('enabled', False):
+        return None
+    return SMSQuota(
+        Database(config.get('database_url', 'sqlite:///data/sms.db')),
+        sync_interval=config.get('sync_interval', 30),
+        default_limit=config.get('default_monthly_limit'),
+        project_id=config.get('project_id'),
+        logger=logger
+    )
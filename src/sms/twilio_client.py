@@ -5,15 +5,31 @@ Handles SMS sending via Twilio API with rate limiting and error handling.
 
 import logging
 import asyncio
+from datetime import date
 from typing import Optional, Dict, Any
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
+
+from src.sms.http_transport import (
+    DEFAULT_TWILIO_BASE_URL, HTTPError, TwilioAPIError, TwilioMessagesTransport
+)
+from src.sms.quota import SendRateLimiter, SMSQuota, SMSQuotaExceeded
+
+try:
+    from twilio.rest import Client
+    from twilio.base.exceptions import TwilioRestException
+except ImportError:  # The SDK is only needed for transport: "sdk"
+    Client = None
+
+    class TwilioRestException(Exception):
+        """Placeholder so SDK error handling works without the SDK installed."""
 
 
 class TwilioClient:
     """Lightweight Twilio SMS client with async support."""
 
-    def __init__(self, account_sid: str, auth_token: str, from_number: str, to_number: str):
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, to_number: str,
+                 transport: str = 'async', base_url: str = DEFAULT_TWILIO_BASE_URL,
+                 timeout: float = 10.0, pool_size: int = 4, send_rate: Optional[float] = None,
+                 send_burst: float = 1.0, quota: Optional[SMSQuota] = None):
         """
         Initialize Twilio client.
 
@@ -22,22 +38,47 @@ class TwilioClient:
             auth_token: Twilio Auth Token
             from_number: Twilio phone number (sender)
             to_number: Destination phone number
+            transport: "async" (pooled keep-alive HTTP) or "sdk" (Twilio SDK in a thread pool)
+            base_url: Twilio API origin (async transport only)
+            timeout: Per-request timeout in seconds (async transport only)
+            pool_size: Maximum pooled connections (async transport only)
+            send_rate: Messages per second allowed from the sender number (unthrottled if None)
+            send_burst: Messages the sender number may send back to back
+            quota: Monthly per-user SMS limits checked by send_mfa_code()
         """
         self.account_sid = account_sid
         self.auth_token = auth_token
         self.from_number = from_number
         self.to_number = to_number
+        self.quota = quota
+        self.rate_limiter = SendRateLimiter(send_rate, send_burst) if send_rate else None
 
         self.client: Optional[Client] = None
+        self.transport: Optional[TwilioMessagesTransport] = None
         self.logger = logging.getLogger(__name__)
 
         # Initialize client if credentials provided
         if account_sid and auth_token:
             try:
-                self.client = Client(account_sid, auth_token)
+                if transport == 'sdk':
+                    if Client is None:
+                        raise RuntimeError("twilio package is not installed")
+                    self.client = Client(account_sid, auth_token)
+                else:
+                    self.transport = TwilioMessagesTransport(
+                        account_sid, auth_token,
+                        base_url=base_url,
+                        pool_size=pool_size,
+                        timeout=timeout
+                    )
             except Exception as e:
                 self.logger.error(f"Failed to initialize Twilio client: {e}")
 
+    @property
+    def initialized(self) -> bool:
+        """Whether either transport is ready to use."""
+        return self.transport is not None or self.client is not None
+
     async def test_connection(self) -> bool:
         """
         Test Twilio connection and credentials.
@@ -45,22 +86,27 @@ class TwilioClient:
         Returns:
             bool: True if connection successful, False otherwise
         """
-        if not self.client:
+        if not self.initialized:
             self.logger.error("Twilio client not initialized")
             return False
 
         try:
             # Test by fetching account info
-            loop = asyncio.get_event_loop()
-            account = await loop.run_in_executor(
-                None,
-                lambda: self.client.api.accounts(self.account_sid).fetch()
-            )
+            if self.transport:
+                account = await self.transport.fetch_account()
+                friendly_name = account.get('friendly_name')
+            else:
+                loop = asyncio.get_event_loop()
+                account = await loop.run_in_executor(
+                    None,
+                    lambda: self.client.api.accounts(self.account_sid).fetch()
+                )
+                friendly_name = account.friendly_name
 
-            self.logger.info(f"Twilio connection successful. Account: {account.friendly_name}")
+            self.logger.info(f"Twilio connection successful. Account: {friendly_name}")
             return True
 
-        except TwilioRestException as e:
+        except (TwilioRestException, TwilioAPIError, HTTPError) as e:
             self.logger.error(f"Twilio connection failed: {e}")
             return False
         except Exception as e:
@@ -78,7 +124,7 @@ class TwilioClient:
         Returns:
             bool: True if SMS sent successfully, False otherwise
         """
-        if not self.client:
+        if not self.initialized:
             self.logger.error("Twilio client not initialized")
             return False
 
@@ -89,44 +135,65 @@ class TwilioClient:
             return False
 
         try:
-            # Send SMS in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            sms = await loop.run_in_executor(
-                None,
-                lambda: self.client.messages.create(
-                    body=message,
-                    from_=self.from_number,
-                    to=to_number
+            if self.rate_limiter:
+                await self.rate_limiter.acquire(self.from_number)
+            if self.transport:
+                sms = await self.transport.send_message(message, self.from_number, to_number)
+                sid = sms.get('sid')
+            else:
+                # Send SMS in executor to avoid blocking
+                loop = asyncio.get_event_loop()
+                sms = await loop.run_in_executor(
+                    None,
+                    lambda: self.client.messages.create(
+                        body=message,
+                        from_=self.from_number,
+                        to=to_number
+                    )
                 )
-            )
+                sid = sms.sid
 
-            self.logger.info(f"SMS sent successfully. SID: {sms.sid}")
+            self.logger.info(f"SMS sent successfully. SID: {sid}")
             return True
 
-        except TwilioRestException as e:
+        except (TwilioRestException, TwilioAPIError, HTTPError) as e:
             self.logger.error(f"Twilio SMS failed: {e}")
             return False
         except Exception as e:
             self.logger.error(f"Unexpected error sending SMS: {e}")
             return False
 
-    async def send_mfa_code(self, code: str, service_name: Optional[str] = None) -> bool:
+    async def send_mfa_code(self, code: str, service_name: Optional[str] = None,
+                            user_id: Optional[str] = None, project_id: Optional[str] = None) -> bool:
         """
         Send MFA code via SMS with formatted message.
 
         Args:
             code: MFA code to send
             service_name: Optional service name for context
+            user_id: User the code belongs to, for the monthly SMS limit
+            project_id: Project of that user
 
         Returns:
             bool: True if SMS sent successfully, False otherwise
+
+        Raises:
+            SMSQuotaExceeded: If the user has reached this month's SMS limit
         """
+        if self.quota and not self.quota.try_acquire(user_id, project_id):
+            raise SMSQuotaExceeded(
+                f"Monthly SMS limit of {self.quota.limit(user_id, project_id)} reached for user {user_id}"
+            )
+
         if service_name:
             message = f"MFA Code for {service_name}: {code}"
         else:
             message = f"MFA Code: {code}"
 
-        return await self.send_sms(message)
+        sent = await self.send_sms(message)
+        if not sent and self.quota:
+            self.quota.release(user_id, project_id)
+        return sent
 
     async def get_account_info(self) -> Dict[str, Any]:
         """
@@ -135,10 +202,19 @@ class TwilioClient:
         Returns:
             Dict containing account info or empty dict on error
         """
-        if not self.client:
+        if not self.initialized:
             return {}
 
         try:
+            if self.transport:
+                account = await self.transport.fetch_account()
+                return {
+                    "account_sid": account.get('sid'),
+                    "friendly_name": account.get('friendly_name'),
+                    "status": account.get('status'),
+                    "type": account.get('type')
+                }
+
             loop = asyncio.get_event_loop()
             account = await loop.run_in_executor(
                 None,
@@ -163,25 +239,31 @@ class TwilioClient:
         Returns:
             Dict containing usage stats or empty dict on error
         """
-        if not self.client:
+        if not self.initialized:
             return {}
 
         try:
-            from datetime import datetime, date
-
             # Get current month usage
-            loop = asyncio.get_event_loop()
-            usage_records = await loop.run_in_executor(
-                None,
-                lambda: list(self.client.usage.records.list(
-                    category='sms',
-                    start_date=date.today().replace(day=1),
-                    end_date=date.today()
-                ))
-            )
-
-            total_sent = sum(int(record.count) for record in usage_records)
-            total_cost = sum(float(record.price) for record in usage_records)
+            start_date = date.today().replace(day=1)
+            end_date = date.today()
+            if self.transport:
+                usage_records = await self.transport.list_usage_records(
+                    'sms', start_date.isoformat(), end_date.isoformat()
+                )
+                total_sent = sum(int(record.get('count') or 0) for record in usage_records)
+                total_cost = sum(float(record.get('price') or 0) for record in usage_records)
+            else:
+                loop = asyncio.get_event_loop()
+                usage_records = await loop.run_in_executor(
+                    None,
+                    lambda: list(self.client.usage.records.list(
+                        category='sms',
+                        start_date=start_date,
+                        end_date=end_date
+                    ))
+                )
+                total_sent = sum(int(record.count) for record in usage_records)
+                total_cost = sum(float(record.price) for record in usage_records)
 
             return {
                 "messages_sent": total_sent,
@@ -192,4 +274,20 @@ class TwilioClient:
 
         except Exception as e:
             self.logger.error(f"Error fetching usage stats: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    def get_transport_stats(self) -> Dict[str, Any]:
+        """
+        Get HTTP connection pool statistics.
+
+        Returns:
+            Dict containing pool stats, or empty dict for the SDK transport
+        """
+        return self.transport.get_stats() if self.transport else {}
+
+    async def close(self):
+        """Write outstanding SMS usage and close pooled HTTP connections."""
+        if self.quota:
+            await self.quota.stop()
+        if self.transport:
+            await self.transport.close()
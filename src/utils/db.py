@@ -0,0 +1,111 @@
+"""
+Database utilities for MFARelay
+Thin synchronous wrapper over SQLite or PostgreSQL (psycopg) for relay-side tables.
+"""
+
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import psycopg
+except ImportError:  # Only needed for postgresql:// URLs
+    psycopg = None
+
+
+class Database:
+    """
+    One connection to SQLite or PostgreSQL with a shared query dialect.
+
+    SQL is written with ``?`` placeholders and translated for psycopg. Calls
+    are synchronous and serialized by a lock; async callers run them with
+    ``asyncio.to_thread`` (or an executor).
+    """
+
+    def __init__(self, url: str):
+        """
+        Open the database.
+
+        Args:
+            url: "sqlite:///relative/file.db", "sqlite:////absolute/file.db",
+                 "sqlite://" (in memory) or "postgresql://..."
+        """
+        self.url = url
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+
+        if url.startswith('sqlite://'):
+            self.dialect = 'sqlite'
+            # sqlite:///relative.db, sqlite:////absolute.db, sqlite:// (in memory)
+            path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else ''
+            path = path or ':memory:'
+            if path != ':memory:':
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+        elif url.startswith(('postgres://', 'postgresql://')):
+            if psycopg is None:
+                raise RuntimeError("psycopg is required for PostgreSQL URLs (pip install 'psycopg[binary]')")
+            self.dialect = 'postgres'
+            self._conn = psycopg.connect(url, autocommit=True)
+        else:
+            raise ValueError(f"Unsupported database URL: {url}")
+
+    def _sql(self, sql: str) -> str:
+        return sql.replace('?', '%s') if self.dialect == 'postgres' else sql
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """
+        Execute a statement.
+
+        Returns:
+            int: Number of affected rows
+        """
+        with self._lock:
+            cursor = self._conn.execute(self._sql(sql), tuple(params))
+            return cursor.rowcount
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]):
+        """Execute a statement once per parameter row."""
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.executemany(self._sql(sql), [tuple(row) for row in rows])
+
+    def fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        """Run a query and return all rows."""
+        with self._lock:
+            return list(self._conn.execute(self._sql(sql), tuple(params)).fetchall())
+
+    def fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Tuple]:
+        """Run a query and return the first row, if any."""
+        with self._lock:
+            return self._conn.execute(self._sql(sql), tuple(params)).fetchone()
+
+    @contextmanager
+    def transaction(self) -> Iterator['Database']:
+        """Run the enclosed statements atomically (holding the connection lock)."""
+        with self._lock:
+            if self.dialect == 'postgres':
+                with self._conn.transaction():
+                    yield self
+            else:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._conn.execute("COMMIT")
+
+    def close(self):
+        """Close the connection."""
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                self.logger.warning(f"Error closing database: {e}")
@@ -3,18 +3,155 @@ Logger utilities for MFARelay
 Provides structured logging setup with rotation and formatting.
 """
 
+import atexit
+import json
 import logging
 import logging.handlers
+import queue
 import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from src.utils.tracing import current_context
+
+# Correlation fields (e.g. account) added to records logged inside log_context()
+_log_fields: ContextVar[Dict[str, Any]] = ContextVar('mfarelay_log_fields', default={})
+
+# Background listeners by logger name, stopped by shutdown_logging()
+_listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+# Standard LogRecord attributes; anything else was passed with extra= and goes into JSON output
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """
+    Attach correlation fields to every record logged in this block,
+    including from coroutines it awaits.
+    """
+    token = _log_fields.set({**_log_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_fields.reset(token)
+
+
+class _ContextFilter(logging.Filter):
+    """
+    Copies log_context() fields and the active trace id onto the record.
+
+    Runs on the caller's thread, before a record is queued, so context
+    variables are read where the record was created.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_fields.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        if not hasattr(record, 'trace_id'):
+            context = current_context()
+            record.trace_id = context[0] if context else None
+        return True
+
+
+class _DebugRateLimitFilter(logging.Filter):
+    """
+    Token bucket per call site for DEBUG records.
+
+    A busy debug line is cut to ``rate`` records per second; the next one
+    let through reports how many were suppressed in between.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._buckets: Dict[Tuple[str, int], list] = {}  # site -> [tokens, updated, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        # The same record reaches each handler; decide once
+        allowed = getattr(record, '_rate_allowed', None)
+        if allowed is None:
+            allowed = record._rate_allowed = self._take(record)
+        return allowed
+
+    def _take(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault((record.pathname, record.lineno), [self.burst, now, 0])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One compact JSON object per record, with correlation and extra= fields."""
+
+    def __init__(self, fields: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            fields: Static fields added to every record (e.g. the shard number)
+        """
+        super().__init__()
+        self.fields = fields or {}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **self.fields,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_') and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
 
 def setup_logger(name: str, 
                 level: str = 'INFO', 
                 log_file: Optional[str] = None,
                 max_bytes: int = 10485760,  # 10MB
-                backup_count: int = 5) -> logging.Logger:
+                backup_count: int = 5,
+                json_format: bool = False,
+                use_queue: bool = False,
+                queue_size: int = 10000,
+                debug_rate_limit: float = 0.0,
+                fmt: str = '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                fields: Optional[Dict[str, Any]] = None,
+                include: Tuple[str, ...] = ()) -> logging.Logger:
     """
     Setup structured logger with console and optional file output.
     
@@ -24,7 +161,17 @@ def setup_logger(name: str,
         log_file: Optional file path for log output
         max_bytes: Maximum bytes per log file before rotation
         backup_count: Number of backup files to keep
-        
+        json_format: Write compact JSON lines instead of text
+        use_queue: Hand records to a background thread that formats and
+            writes them (including file rotation), so logging never blocks the
+            event loop; records are dropped if queue_size are pending
+        queue_size: Pending records held for the background thread
+        debug_rate_limit: DEBUG records per second allowed from each call site (0 for no limit)
+        fmt: Text format (ignored with json_format)
+        fields: Static fields added to every JSON record
+        include: Other logger hierarchies (e.g. the module loggers under
+            'src') that write through the same handlers and filters
+    
     Returns:
         logging.Logger: Configured logger instance
     """
@@ -32,24 +179,28 @@ def setup_logger(name: str,
     
     # Clear any existing handlers to avoid duplicates
     logger.handlers.clear()
+    listener = _listeners.pop(name, None)
+    if listener is not None:
+        listener.stop()
     
     # Set logging level
     log_level = getattr(logging, level.upper(), logging.INFO)
     logger.setLevel(log_level)
     
     # Create formatter
-    formatter = logging.Formatter(
-        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if json_format:
+        formatter = JSONFormatter(fields)
+    else:
+        formatter = logging.Formatter(fmt=fmt, datefmt='%Y-%m-%d %H:%M:%S')
     
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(log_level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # File handler (optional)
+    file_error = None
     if log_file:
         try:
             # Ensure log directory exists
@@ -65,13 +216,53 @@ def setup_logger(name: str,
             )
             file_handler.setLevel(log_level)
             file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
-            
+            handlers.append(file_handler)
+        
         except Exception as e:
-            # Log to console if file handler setup fails
-            logger.warning(f"Failed to setup file logging: {e}")
+            file_error = e
+    
+    # Filters run on the caller's thread (on the queue handler when use_queue is
+    # set): correlation fields live in contextvars and must be read there, and
+    # rate-limited records are dropped before they are queued or formatted
+    filters = [_ContextFilter()]
+    if debug_rate_limit > 0:
+        filters.insert(0, _DebugRateLimitFilter(debug_rate_limit))
+    
+    if use_queue:
+        queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+        handlers = [queue_handler]
+    
+    for handler in handlers:
+        for log_filter in filters:
+            handler.addFilter(log_filter)
+        logger.addHandler(handler)
+    
+    if file_error is not None:
+        # Log to console if file handler setup fails
+        logger.warning(f"Failed to setup file logging: {file_error}")
     
     # Prevent propagation to root logger
     logger.propagate = False
     
+    for other_name in include:
+        other = logging.getLogger(other_name)
+        other.handlers.clear()
+        other.setLevel(log_level)
+        for handler in handlers:
+            other.addHandler(handler)
+        other.propagate = False
+    
     return logger
+
+
+def shutdown_logging():
+    """Flush and stop background logging threads (safe to call more than once)."""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,389 @@
+"""
+Tracing for MFARelay
+Lightweight spans across the monitor -> extract -> send pipeline, with a JSON-lines
+exporter by default and OTLP/HTTP export as an option.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# (trace_id, span_id) of a span, carried across queues and processes
+SpanContext = Tuple[str, str]
+
+_current_span: ContextVar[Optional[Any]] = ContextVar('mfarelay_current_span', default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Span:
+    """
+    One timed stage. Used as a context manager, it becomes the parent of
+    spans opened inside it (including in awaited coroutines).
+    """
+
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'start', 'end',
+                 'attributes', 'error', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, trace_id: str, parent_id: Optional[str],
+                 start: Optional[float] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.end: Optional[float] = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        self._token = None
+
+    @property
+    def context(self) -> SpanContext:
+        """Identifiers to pass to a span started elsewhere (another task or process)."""
+        return self.trace_id, self.span_id
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def finish(self, end: Optional[float] = None):
+        if self.end is None:
+            self.end = time.time() if end is None else end
+            self.tracer.exporter.export(self)
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.finish()
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round((self.end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is off or the trace is not sampled."""
+
+    __slots__ = ()
+    context = None
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def finish(self, end: Optional[float] = None):
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledSpan(_NoopSpan):
+    """Root of an unsampled trace: keeps its children unsampled too."""
+
+    __slots__ = ('_token',)
+
+    def __enter__(self) -> '_UnsampledSpan':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+class SpanExporter:
+    """Receives finished spans; the base class discards them."""
+
+    def export(self, span: Span):
+        pass
+
+    def close(self):
+        pass
+
+
+class JSONLinesExporter(SpanExporter):
+    """
+    Appends one JSON object per span to a file.
+
+    Lines are buffered and written with a single append per flush, so
+    several worker processes can share one file without interleaving.
+    """
+
+    def __init__(self, path: str = 'logs/traces.jsonl', flush_spans: int = 64, flush_interval: float = 1.0):
+        """
+        Args:
+            path: Output file
+            flush_spans: Write once this many spans are buffered
+            flush_interval: ...or once the oldest buffered span is this many seconds old
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.flush_spans = flush_spans
+        self.flush_interval = flush_interval
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._buffer: List[str] = []
+        self._buffered_at = 0.0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str, separators=(',', ':')) + '\n'
+        with self._lock:
+            if not self._buffer:
+                self._buffered_at = time.monotonic()
+            self._buffer.append(line)
+            # Root spans end a poll or a delivery; flush so traces are complete on disk
+            if (span.parent_id is None or len(self._buffer) >= self.flush_spans
+                    or time.monotonic() - self._buffered_at >= self.flush_interval):
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer or self._fd is None:
+            return
+        data = ''.join(self._buffer).encode('utf-8')
+        self._buffer.clear()
+        try:
+            os.write(self._fd, data)
+        except OSError as e:
+            self.logger.warning(f"Failed to write traces to {self.path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+class OTLPExporter(SpanExporter):
+    """
+    Sends spans to an OpenTelemetry collector with OTLP/HTTP JSON.
+
+    Export runs on a background thread in batches, so the pipeline never
+    waits on the collector; spans are dropped if its queue fills up.
+    """
+
+    def __init__(self, endpoint: str = 'http://localhost:4318/v1/traces', service_name: str = 'mfarelay',
+                 headers: Optional[Dict[str, str]] = None, batch_size: int = 256,
+                 interval: float = 2.0, max_queue: int = 10000, timeout: float = 5.0):
+        """
+        Args:
+            endpoint: Collector traces URL
+            service_name: service.name resource attribute
+            headers: Extra HTTP headers (e.g. authentication)
+            batch_size: Maximum spans per request
+            interval: Seconds between exports
+            max_queue: Spans held while the collector is slow or down
+            timeout: HTTP timeout in seconds
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self.logger = logging.getLogger(__name__)
+        self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._send(batch)
+
+    def _send(self, spans: List[Span]):
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "mfarelay"},
+                    "spans": [_otlp_span(span) for span in spans],
+                }],
+            }]
+        }).encode('utf-8')
+        request = urllib.request.Request(self.endpoint, data=body, headers=self.headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except Exception as e:
+            self.dropped += len(spans)
+            self.logger.warning(f"OTLP export of {len(spans)} spans failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.timeout + 1)
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    encoded = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(int(span.start * 1e9)),
+        "endTimeUnixNano": str(int(span.end * 1e9)),
+        "attributes": [_otlp_attribute(k, v) for k, v in span.attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporter.
+
+    Sampling is decided per trace at its root span; unsampled traces and a
+    disabled tracer cost one context-variable lookup per span.
+    """
+
+    def __init__(self, exporter: Optional[SpanExporter] = None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, parent: Optional[SpanContext] = None, start: Optional[float] = None,
+             **attributes: Any):
+        """
+        Start a span (finished when its ``with`` block exits).
+
+        Args:
+            name: Stage name
+            parent: Explicit parent context; defaults to the current span, and
+                a span with neither starts a new (possibly unsampled) trace
+            start: Start time (Unix seconds) if the stage began earlier
+            **attributes: Span attributes
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+        if parent is None:
+            current = _current_span.get()
+            if current is not None:
+                if current.context is None:
+                    return NOOP_SPAN
+                parent = current.context
+        if parent is not None:
+            return Span(self, name, parent[0], parent[1], start, attributes)
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return _UnsampledSpan()
+        return Span(self, name, _new_id(128), None, start, attributes)
+
+    def record(self, name: str, start: float, end: float, parent: Optional[SpanContext] = None,
+               **attributes: Any):
+        """Export a span for a stage measured elsewhere (e.g. time spent in a queue)."""
+        span = self.span(name, parent, start, **attributes)
+        span.finish(end)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer (disabled until configure_tracing() enables it)."""
+    return _tracer
+
+
+def current_context() -> Optional[SpanContext]:
+    """Context of the active span, to attach to work handed to another task or process."""
+    span = _current_span.get()
+    return span.context if span is not None else None
+
+
+def configure_tracing(config: Dict[str, Any]) -> Tracer:
+    """
+    Configure the process-wide tracer from the ``tracing`` config section.
+
+    Args:
+        config: enabled, exporter ("jsonl" or "otlp"), path, otlp_endpoint,
+            otlp_headers, sample_rate
+
+    Returns:
+        Tracer: The configured tracer
+    """
+    _tracer.close()
+    _tracer.exporter = None
+    _tracer.sample_rate = float(config.get('sample_rate', 1.0))
+    if not config.get('enabled', False):
+        return _tracer
+
+    exporter = config.get('exporter', 'jsonl')
+    if exporter == 'jsonl':
+        _tracer.exporter = JSONLinesExporter(config.get('path', 'logs/traces.jsonl'))
+    elif exporter == 'otlp':
+        _tracer.exporter = OTLPExporter(
+            endpoint=config.get('otlp_endpoint', 'http://localhost:4318/v1/traces'),
+            headers=config.get('otlp_headers')
+        )
+    else:
+        raise ValueError(f"Unknown tracing exporter: {exporter}")
+    return _tracer